@@ -0,0 +1,67 @@
+"""Synthetic utilities directories and build trees for the benchmarks."""
+
+from pathlib import Path
+import os
+
+__all__ = ["make_utils_dir", "make_build_tree", "make_script"]
+
+SCRIPT = "#!/bin/sh\necho {name}\n"
+
+NESTED_EVERY = 50
+"""Every n-th utility is placed in a nested directory."""
+
+SYMLINK_EVERY = 20
+"""Every n-th utility is a symlink to a script outside the utilities directory."""
+
+
+def make_script(path: Path, name: str) -> Path:
+    """Write a small executable shell script."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(SCRIPT.format(name=name))
+    path.chmod(0o755)
+    return path
+
+
+def make_utils_dir(utils_dir: Path, count: int) -> list[Path]:
+    """Fill utils_dir with count utilities.
+
+    Most entries are plain scripts. Every SYMLINK_EVERY-th entry is a
+    symlink into a sibling 'targets' directory and every NESTED_EVERY-th
+    entry lives one or two directories deep, like hand-organised trees.
+    """
+    targets = utils_dir.parent / "targets"
+    utils_dir.mkdir(parents=True, exist_ok=True)
+    made: list[Path] = []
+    for i in range(count):
+        name = f"tool-{i:06d}"
+        if i % NESTED_EVERY == NESTED_EVERY - 1:
+            group = utils_dir / f"group-{i % 7}"
+            path = group / f"sub-{i % 3}" / name if i % 2 else group / name
+            made.append(make_script(path, name))
+        elif i % SYMLINK_EVERY == SYMLINK_EVERY - 1:
+            target = make_script(targets / name, name)
+            path = utils_dir / name
+            os.symlink(target, path)
+            made.append(path)
+        else:
+            made.append(make_script(utils_dir / name, name))
+    return made
+
+
+def make_build_tree(root: Path, count: int, stem: str = "app") -> Path:
+    """Lay out a cargo-like build tree of about count files under root.
+
+    Only the final binary and a handful of build scripts are executable, so
+    output discovery has to tell them apart. Returns the final binary.
+    """
+    release = root / "release"
+    layout = ("deps", ".fingerprint", "incremental", "build")
+    for i in range(count):
+        kind = layout[i % len(layout)]
+        directory = release / kind / f"crate-{i % 97:02d}-{i % 13:x}"
+        directory.mkdir(parents=True, exist_ok=True)
+        if kind == "build" and i % 101 == 3:
+            make_script(directory / "build-script-build", "build")
+        else:
+            (directory / f"obj-{i:06d}.o").write_bytes(b"\0" * 64)
+    return make_script(release / stem, stem)
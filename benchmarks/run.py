@@ -0,0 +1,285 @@
+"""Benchmark the CLI hot paths against synthetic utilities directories.
+
+Every fixture size runs in its own worker process with a throwaway HOME,
+because the utilities directory is derived from HOME when 'utils' is
+imported. Results are written as JSON and compared against a baseline.
+
+    python benchmarks/run.py                       # run and compare
+    python benchmarks/run.py --save-baseline       # record a new baseline
+    python benchmarks/run.py --sizes 10,1000 -r 3  # quick run
+    python benchmarks/run.py --full                # include 100k utilities
+"""
+
+from pathlib import Path
+from typing import Callable, Optional
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = Path(__file__).resolve().parent
+RESULTS_DIR = HERE / "results"
+DEFAULT_SIZES = (10, 1_000, 10_000)
+FULL_SIZES = (*DEFAULT_SIZES, 100_000)
+DEFAULT_THRESHOLD = 1.25
+"""A benchmark regressed when its best run is this many times the baseline's."""
+NOISE_FLOOR = 0.002
+"""Slowdowns smaller than this many seconds are never reported as regressions."""
+
+
+def summarize(samples: list[float]) -> dict:
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "runs": len(samples),
+    }
+
+
+def measure(
+    fn: Callable[[], object],
+    repeat: int,
+    setup: Optional[Callable[[], object]] = None,
+) -> dict:
+    """Time fn repeat times, running setup untimed before each call."""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def startup_benchmarks(repeat: int) -> dict:
+    """Cold import and '--help' timings, each in a fresh interpreter."""
+    cases = {
+        "startup.import_utils": "import utils",
+        "startup.import_cmds": "import utils.cmds",
+        "startup.help": (
+            "import sys; from utils import utils; "
+            "sys.argv = ['utils', '--help']; utils()"
+        ),
+    }
+    results = {}
+    for name, code in cases.items():
+        results[name] = measure(
+            lambda: subprocess.run(
+                [sys.executable, "-c", code],
+                stdout=subprocess.DEVNULL,
+                check=True,
+            ),
+            repeat,
+        )
+    return results
+
+
+def worker(size: int, repeat: int, output: Path) -> None:
+    """Run the per-size benchmarks. HOME must already point at a scratch dir."""
+    from click.testing import CliRunner
+
+    sys.path.insert(0, str(HERE))
+    from fixtures import make_build_tree, make_script, make_utils_dir
+    from utils import utils
+    from utils.cmds import find_compiled_output
+    from utils.dir import UTILS_DIR
+    from utils.manifest import MANIFEST_NAME, reindex
+
+    scratch = Path(os.environ["HOME"])
+    make_utils_dir(UTILS_DIR, size)
+    build_root = scratch / "build-tree"
+    make_build_tree(build_root, size)
+    source = make_script(scratch / "src" / "bench-tool", "bench-tool")
+    runner = CliRunner()
+
+    def invoke(*args: str) -> None:
+        result = runner.invoke(utils, list(args), catch_exceptions=False)
+        if result.exit_code != 0:
+            raise RuntimeError(f"utils {' '.join(args)} failed:\n{result.output}")
+
+    def drop_manifest() -> None:
+        (UTILS_DIR / MANIFEST_NAME).unlink(missing_ok=True)
+
+    results = {
+        f"reindex.cold[{size}]": measure(
+            lambda: reindex(UTILS_DIR), repeat, setup=drop_manifest
+        ),
+        f"reindex.warm[{size}]": measure(lambda: reindex(UTILS_DIR), repeat),
+        f"cli.list[{size}]": measure(lambda: invoke("list"), repeat),
+        f"cli.add[{size}]": measure(
+            lambda: invoke("add", "--copy", "--force", str(source)), repeat
+        ),
+        f"cli.remove[{size}]": measure(
+            lambda: invoke("remove", "--yes", "bench-tool"),
+            repeat,
+            setup=lambda: invoke("add", "--copy", "--force", str(source)),
+        ),
+        f"find_compiled_output[{size}]": measure(
+            lambda: find_compiled_output(build_root, "app"), repeat
+        ),
+    }
+    output.write_text(json.dumps(results))
+
+
+def run_worker(size: int, repeat: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix=f"utils-bench-{size}-") as tmp:
+        home = Path(tmp)
+        utils_dir = home / ".local" / "share" / "utils" / "bin"
+        output = home / "results.json"
+        env = {
+            **os.environ,
+            "HOME": str(home),
+            "XDG_CACHE_HOME": str(home / ".cache"),
+            "XDG_CONFIG_HOME": str(home / ".config"),
+            "SHELL": "/bin/sh",
+            "PATH": f"{os.environ.get('PATH', '')}:{utils_dir}",
+        }
+        env.pop("UTILS_TRACE", None)
+        subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--worker",
+                str(size),
+                "--repeat",
+                str(repeat),
+                "--output",
+                str(output),
+            ],
+            env=env,
+            check=True,
+        )
+        return json.loads(output.read_text())
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=HERE,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Print current against baseline timings and return the regressions.
+
+    The fastest run is compared, as it is the least affected by noise.
+    """
+    regressions = []
+    width = max(map(len, results), default=0)
+    print(f"{'benchmark':<{width}}  {'baseline':>10}  {'current':>10}  ratio")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<{width}}  {'-':>10}  {current['min'] * 1000:8.2f}ms  new")
+            continue
+        ratio = current["min"] / base["min"] if base["min"] else 1.0
+        flag = ""
+        if ratio > threshold and current["min"] - base["min"] > NOISE_FLOOR:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:<{width}}  {base['min'] * 1000:8.2f}ms  "
+            f"{current['min'] * 1000:8.2f}ms  {ratio:5.2f}x{flag}"
+        )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(map(str, DEFAULT_SIZES)),
+        help="Comma separated fixture sizes (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help=f"Run every fixture size: {', '.join(map(str, FULL_SIZES))}.",
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=RESULTS_DIR / "latest.json",
+        help="Where to write the results (default: %(default)s).",
+    )
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        type=Path,
+        default=RESULTS_DIR / "baseline.json",
+        help="Results to compare against (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Ratio of the best run over the baseline that counts as a regression.",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Also store the results as the new baseline.",
+    )
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        worker(args.worker, args.repeat, args.output)
+        return 0
+
+    sizes = FULL_SIZES if args.full else [int(s) for s in args.sizes.split(",") if s]
+    results = startup_benchmarks(args.repeat)
+    for size in sizes:
+        print(f"Running benchmarks with {size} utilities...", file=sys.stderr)
+        results.update(run_worker(size, args.repeat))
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.time(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    regressions: list[str] = []
+    if args.baseline.is_file() and args.baseline != args.output:
+        baseline = json.loads(args.baseline.read_text())
+        print(
+            f"Comparing against {args.baseline} "
+            f"(revision {baseline['meta'].get('revision') or 'unknown'})"
+        )
+        regressions = compare(results, baseline["results"], args.threshold)
+    else:
+        compare(results, {}, args.threshold)
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+    if regressions:
+        print(f"{len(regressions)} benchmarks regressed.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,156 +1,84 @@
-from .cmds import (
-    list_cmd,
-    add_utility,
-    remove_utility,
-    UtilityType,
-    add_compiled_utility,
-)
-from .click import click
+from .click import click, LazyGroup
 from .log import get_level, LOG_FORMAT
 
-from pathlib import Path
 import logging
-from typing import Optional
+from typing import Any
 
 logging.basicConfig(level=get_level(), format=LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
-
-@click.group(no_args_is_help=True, invoke_without_command=False)
-def utils() -> None:
+# Subcommands are imported on demand. Keep the implementation modules (and
+# their dependencies such as requests, halo and distro) out of this file so
+# that `utils --help` and `utils list` start quickly.
+COMMANDS: dict[str, str] = {
+    "list": "utils.commands.list:list_",
+    "ls": "utils.commands.list:ls",
+    "add": "utils.commands.add:add",
+    "install": "utils.commands.add:install",
+    "remove": "utils.commands.remove:remove",
+    "rm": "utils.commands.remove:rm",
+    "uninstall": "utils.commands.remove:uninstall",
+    "reindex": "utils.commands.reindex:reindex",
+    "cache": "utils.commands.cache:cache",
+    "rebuild": "utils.commands.rebuild:rebuild",
+    "toolchains": "utils.commands.toolchains:toolchains",
+    "doctor": "utils.commands.doctor:doctor",
+    "completion": "utils.commands.completion:completion",
+    "publish": "utils.commands.artifacts:publish",
+    "fetch": "utils.commands.artifacts:fetch",
+    "export": "utils.commands.bundle:export",
+    "import": "utils.commands.bundle:import_",
+    "gc": "utils.commands.usage:gc",
+    "du": "utils.commands.usage:du",
+}
+
+# Names that used to be imported eagerly from `utils.cmds`.
+_LAZY_ATTRS: dict[str, str] = {
+    "list_cmd": "utils.cmds",
+    "add_utility": "utils.cmds",
+    "remove_utility": "utils.cmds",
+    "add_compiled_utility": "utils.cmds",
+    "UtilityType": "utils.types",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_ATTRS:
+        from importlib import import_module
+
+        return getattr(import_module(_LAZY_ATTRS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@click.group(
+    cls=LazyGroup,
+    lazy_subcommands=COMMANDS,
+    no_args_is_help=True,
+    invoke_without_command=False,
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Print a timing tree of the command's phases to stderr.",
+)
+@click.option(
+    "--trace",
+    "trace_file",
+    type=click.Path(dir_okay=False, writable=True),
+    envvar="UTILS_TRACE_FILE",
+    help="Write a Chrome trace (chrome://tracing, Perfetto) of the command to a file.",
+)
+@click.pass_context
+def utils(ctx: click.Context, profile: bool, trace_file: str | None) -> None:
     """Manage user maintenance utilities.
 
     This script provides commands to manage custom user utilities.
     These utilities can be any executable script or program. This
     utility simply provides a standardized way to manage these
     custiom utilities.
-    """
-    pass
-
 
-@utils.command()
-def list() -> None:
-    """List all available utilities"""
-    logger.debug("Executing 'list' command.")
-    list_cmd()
-
-
-@utils.command(hidden=True)
-def ls() -> None:
-    """Alias for 'list' command."""
-    logger.debug("Executing 'list' command.")
-    list_cmd()
-
-
-@utils.command(no_args_is_help=True)
-@click.argument(
-    "utility",
-    type=click.Path(
-        exists=True,
-        dir_okay=False,
-        file_okay=True,
-        readable=True,
-        writable=False,
-        executable=False,
-        path_type=Path,
-        resolve_path=True,
-        allow_dash=False,
-    ),
-)
-@click.option(
-    "--compile",
-    type=click.Choice(
-        UtilityType.ls(),
-        case_sensitive=False,
-    ),
-    help="Optional. The type of utility to compile.",
-)
-@click.option(
-    "--force", "-f", is_flag=True, help="Force overwrite if utility already exists."
-)
-@click.option("--copy", "-c", is_flag=True, help="Copy the file instead of move it.")
-def add(
-    utility: Path,
-    compile: Optional[str] = None,
-    force: bool = False,
-    copy: bool = False,
-) -> None:
-    """Installs the specified utility to the user's utilities directory.
-
-    This command will move the specified utility to the user's utilities
-    directory, removing the file extension is any exist, replacing any
-    underscores with dashes, make the name lowercase, and ensuring the
-    file is executable.
+    Set 'UTILS_TRACE=1' to profile every command, or 'UTILS_TRACE=<file>'
+    to write Chrome traces.
     """
-    logger.debug("Executing 'add' command.")
-    if compile is not None:
-        logger.debug(f"Compiling utility of type: {compile}")
-        try:
-            compile = UtilityType(compile.strip().lower())
-        except ValueError as e:
-            logger.error(f"Invalid utility type: {compile}. Error: {e}")
-            raise click.BadParameter(f"Invalid utility type: {compile}.") from e
-        add_compiled_utility(utility, compile)
-    else:
-        add_utility(utility, copy, update=force)
-
-
-@utils.command(hidden=True, no_args_is_help=True)
-@click.argument(
-    "utility",
-    type=click.Path(
-        exists=True,
-        dir_okay=False,
-        file_okay=True,
-        readable=True,
-        writable=False,
-        executable=False,
-        path_type=Path,
-        resolve_path=True,
-        allow_dash=False,
-    ),
-)
-@click.option(
-    "--force", "-f", is_flag=True, help="Force overwrite if utility already exists."
-)
-@click.option("--copy", "-c", is_flag=True, help="Copy the file instead of move it.")
-def install(utility: Path, force: bool = False, copy: bool = False) -> None:
-    """Alias for 'add'."""
-    logger.debug("Executing 'add' command.")
-    add_utility(utility, copy, update=force)
-
-
-@utils.command(no_args_is_help=True)
-@click.argument(
-    "utility",
-    type=str,
-)
-@click.confirmation_option()
-def remove(utility: str) -> None:
-    """Remove the specified utility from the user's utilities directory."""
-    logger.debug("Executing 'remove' command.")
-    remove_utility(utility)
-
-
-@utils.command(hidden=True, no_args_is_help=True)
-@click.argument(
-    "utility",
-    type=str,
-)
-@click.confirmation_option()
-def rm(utility: str) -> None:
-    """Alias for 'remove' command."""
-    logger.debug("Executing 'remove' command.")
-    remove_utility(utility)
-
-
-@utils.command(hidden=True, no_args_is_help=True)
-@click.argument(
-    "utility",
-    type=str,
-)
-@click.confirmation_option()
-def uninstall(utility: str) -> None:
-    """Alias for 'remove' command."""
-    logger.debug("Executing 'remove' command.")
-    remove_utility(utility)
+    # The tracing options are applied by LazyGroup.resolve_command, before
+    # the subcommand is imported.
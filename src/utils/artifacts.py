@@ -0,0 +1,313 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.download import DownloadError, download, get_session
+from utils.dir import get_cache_dir
+from utils.fastcopy import copy_file
+from pathlib import Path
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from typing import Optional
+import glob
+import hashlib
+import json
+import os
+import platform
+import time
+import logging
+
+__all__ = [
+    "ArtifactMeta",
+    "ArtifactStore",
+    "LocalStore",
+    "HttpStore",
+    "open_store",
+    "platform_id",
+    "artifact_key",
+]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+META_NAME = "meta.json"
+
+
+def detect_libc() -> str:
+    """Name and version of the C library binaries are linked against."""
+    name, version = platform.libc_ver()
+    if name:
+        return f"{name}-{version}" if version else name
+    if glob.glob("/lib/ld-musl-*"):
+        return "musl"
+    return "unknown"
+
+
+def cpu_id() -> str:
+    """Identify the CPU model and its features, which native builds depend on."""
+    model, flags = "", ""
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key in ("model name", "CPU part") and not model:
+                    model = value.strip()
+                elif key in ("flags", "Features") and not flags:
+                    flags = " ".join(sorted(value.split()))
+                if model and flags:
+                    break
+    except OSError:
+        return platform.processor()
+    return f"{model} {hashlib.sha256(flags.encode()).hexdigest()[:12]}".strip()
+
+
+def platform_id(distro: str, profile: str = "release") -> dict[str, str]:
+    """Everything about the host that decides whether a binary runs on it.
+
+    Native builds only run on the same CPU, so they are also keyed by it.
+    """
+    return {
+        "arch": platform.machine().lower(),
+        "distro": distro,
+        "libc": detect_libc(),
+        "cpu": cpu_id() if profile == "native" else "",
+    }
+
+
+def artifact_key(
+    source_hash: str, util_type: str, host: dict[str, str], profile: str = "release"
+) -> str:
+    """Key a prebuilt binary by its sources, type, profile and target platform."""
+    parts = {
+        "source": source_hash,
+        "type": str(util_type),
+        "profile": str(profile),
+        **host,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+@dataclass
+class ArtifactMeta:
+    """Description of a published binary, stored next to it."""
+
+    name: str
+    key: str
+    type: str
+    source: str
+    arch: str
+    distro: str
+    libc: str
+    sha256: str
+    size: int
+    created: float
+    compiler: str = ""
+    profile: str = "release"
+    cpu: str = ""
+
+    @classmethod
+    def for_binary(
+        cls,
+        name: str,
+        binary: Path,
+        source: str,
+        util_type: str,
+        distro: str,
+        compiler: str = "",
+        profile: str = "release",
+    ) -> "ArtifactMeta":
+        host = platform_id(distro, profile)
+        with open(binary, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        return cls(
+            name=name,
+            key=artifact_key(source, util_type, host, profile),
+            type=str(util_type),
+            source=source,
+            sha256=digest,
+            size=binary.stat().st_size,
+            created=time.time(),
+            compiler=compiler,
+            profile=str(profile),
+            **host,
+        )
+
+
+class ArtifactStore(ABC):
+    """A place where prebuilt utilities are published and fetched from.
+
+    Artifacts are laid out as ``<name>/<key>/meta.json`` and
+    ``<name>/<key>/<name>``, so any static file server can serve a store
+    that was published to a local directory.
+    """
+
+    @property
+    @abstractmethod
+    def location(self) -> str: ...
+
+    def _relative(self, name: str, key: str, file: str) -> str:
+        return f"{name}/{key}/{file}"
+
+    @abstractmethod
+    def get_meta(self, name: str, key: str) -> Optional[ArtifactMeta]: ...
+
+    @abstractmethod
+    def fetch(self, meta: ArtifactMeta) -> Path:
+        """Return a local path of the artifact's binary, verified against its hash.
+
+        The file is named after the utility, so it can be installed as is.
+        """
+
+    @abstractmethod
+    def publish(self, binary: Path, meta: ArtifactMeta) -> None: ...
+
+
+def _parse_meta(data: dict) -> Optional[ArtifactMeta]:
+    try:
+        return ArtifactMeta(**data)
+    except TypeError as e:
+        log.debug("Ignoring invalid artifact metadata: %s", e)
+        return None
+
+
+def _verify(path: Path, meta: ArtifactMeta) -> None:
+    try:
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+    except OSError as e:
+        raise DownloadError(f"Failed to read artifact {meta.name}: {e}") from e
+    if digest != meta.sha256:
+        raise DownloadError(
+            f"Checksum mismatch for artifact {meta.name}: expected {meta.sha256}, got {digest}."
+        )
+
+
+@dataclass
+class LocalStore(ArtifactStore):
+    """An artifact store in a directory, e.g. on a shared mount."""
+
+    root: Path
+
+    @property
+    def location(self) -> str:
+        return str(self.root)
+
+    def get_meta(self, name: str, key: str) -> Optional[ArtifactMeta]:
+        path = self.root / self._relative(name, key, META_NAME)
+        try:
+            with open(path, "r") as f:
+                return _parse_meta(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable artifact metadata %s: %s", path, e)
+            return None
+
+    def fetch(self, meta: ArtifactMeta) -> Path:
+        path = self.root / self._relative(meta.name, meta.key, meta.name)
+        _verify(path, meta)
+        return path
+
+    def publish(self, binary: Path, meta: ArtifactMeta) -> None:
+        target_dir = self.root / meta.name / meta.key
+        target_dir.mkdir(parents=True, exist_ok=True)
+        tmp = target_dir / f".{meta.name}.{os.getpid()}.tmp"
+        tmp.unlink(missing_ok=True)
+        copy_file(binary, tmp)
+        os.replace(tmp, target_dir / meta.name)
+        # The metadata goes last, so readers never see it without the binary.
+        tmp_meta = target_dir / f".{META_NAME}.{os.getpid()}.tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump(asdict(meta), f, indent=2)
+        os.replace(tmp_meta, target_dir / META_NAME)
+
+
+@dataclass
+class HttpStore(ArtifactStore):
+    """An artifact store behind an HTTP server.
+
+    Fetching needs nothing but GET, so a plain static file server works.
+    Publishing uses PUT, as supported by WebDAV servers and most object
+    stores. 'UTILS_ARTIFACT_TOKEN' is sent as a bearer token if set.
+    """
+
+    url: str
+
+    @property
+    def location(self) -> str:
+        return self.url
+
+    def _url(self, name: str, key: str, file: str) -> str:
+        return f"{self.url.rstrip('/')}/{self._relative(name, key, file)}"
+
+    def _headers(self) -> dict[str, str]:
+        token = os.environ.get("UTILS_ARTIFACT_TOKEN", "")
+        return {"Authorization": f"Bearer {token}"} if token else {}
+
+    def get_meta(self, name: str, key: str) -> Optional[ArtifactMeta]:
+        import requests
+
+        url = self._url(name, key, META_NAME)
+        try:
+            response = get_session().get(url, headers=self._headers(), timeout=(10, 30))
+        except requests.RequestException as e:
+            log.warning("Failed to reach the artifact store at %s: %s", self.url, e)
+            return None
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            log.warning("Artifact store returned HTTP %s for %s", response.status_code, url)
+            return None
+        try:
+            return _parse_meta(response.json())
+        except ValueError as e:
+            log.warning("Ignoring unreadable artifact metadata %s: %s", url, e)
+            return None
+
+    def fetch(self, meta: ArtifactMeta) -> Path:
+        # The download layer caches, resumes and checks the hash, but names
+        # files after their URL, so link the result under the utility's name.
+        downloaded = download(self._url(meta.name, meta.key, meta.name), sha256=meta.sha256)
+        target = get_cache_dir() / "artifacts" / self._relative(meta.name, meta.key, meta.name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        tmp.unlink(missing_ok=True)
+        copy_file(downloaded, tmp, allow_hardlink=True)
+        os.replace(tmp, target)
+        return target
+
+    def publish(self, binary: Path, meta: ArtifactMeta) -> None:
+        import requests
+
+        session = get_session()
+        try:
+            with open(binary, "rb") as f:
+                response = session.put(
+                    self._url(meta.name, meta.key, meta.name),
+                    data=f,
+                    headers=self._headers(),
+                    timeout=(10, 300),
+                )
+                response.raise_for_status()
+            response = session.put(
+                self._url(meta.name, meta.key, META_NAME),
+                data=json.dumps(asdict(meta), indent=2).encode(),
+                headers={**self._headers(), "Content-Type": "application/json"},
+                timeout=(10, 60),
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise DownloadError(f"Failed to publish {meta.name} to {self.url}: {e}") from e
+
+
+def open_store(location: Optional[str] = None) -> Optional[ArtifactStore]:
+    """Open the artifact store at location, or at 'UTILS_ARTIFACT_STORE'.
+
+    Returns None when no store is configured.
+    """
+    location = location or os.environ.get("UTILS_ARTIFACT_STORE", "")
+    if not location:
+        return None
+    if location.startswith(("http://", "https://")):
+        return HttpStore(url=location)
+    if location.startswith("file://"):
+        location = location[len("file://") :]
+    return LocalStore(root=Path(location).expanduser())
@@ -0,0 +1,133 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.dir import get_cache_dir
+from pathlib import Path
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+import logging
+
+__all__ = ["BuildLog", "LiveTail"]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 16 * 1024**2
+DEFAULT_BACKUPS = 5
+TAIL_LINES = 6
+"""Lines of build output shown under the spinner."""
+
+
+class BuildLog:
+    """Full on-disk log of a build plus a bounded in-memory tail.
+
+    Every build of a utility starts a new ``<name>.log`` in the logs
+    directory; the logs of earlier builds are rotated to ``<name>.log.1``,
+    ``<name>.log.2`` and so on. Very chatty builds are also rotated once the
+    file grows over ``max_bytes``, so neither memory nor disk use is
+    unbounded.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        root: Optional[Path] = None,
+        tail: int = 20,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backups: int = DEFAULT_BACKUPS,
+    ) -> None:
+        self.root = root if root is not None else get_cache_dir() / "logs"
+        self.path = self.root / f"{name}.log"
+        self.tail: deque[str] = deque(maxlen=tail)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._handler: Optional[RotatingFileHandler] = None
+        self._logger = logging.getLogger(f"{__name__}.{name}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+
+    def __enter__(self) -> "BuildLog":
+        self.root.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            self.path,
+            maxBytes=self.max_bytes,
+            backupCount=self.backups,
+            encoding="utf-8",
+            delay=True,
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        if self.path.exists() and self.path.stat().st_size > 0:
+            handler.doRollover()
+        self._handler = handler
+        self._logger.addHandler(handler)
+        log.debug("Writing build log to %s", self.path)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._handler is not None:
+            self._logger.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
+
+    def write(self, line: str) -> None:
+        """Record one line of build output."""
+        line = line.rstrip("\n")
+        self.tail.append(line)
+        self._logger.info(line)
+
+    def section(self, title: str) -> None:
+        """Mark the start of a build step in the log."""
+        self._logger.info("==> %s", title)
+
+
+class LiveTail:
+    """A spinner with the last lines of a running build step under it.
+
+    Lines go into a bounded deque and are only rendered when the display
+    refreshes, so a chatty build costs no more than the appends. Nothing is
+    drawn when stdout is not a terminal, and the display is cleared when
+    the step ends, leaving room for its result.
+    """
+
+    def __init__(self, label: str, lines: int = TAIL_LINES) -> None:
+        from rich.spinner import Spinner
+        from rich.text import Text
+
+        self.lines: deque[str] = deque(maxlen=lines)
+        self._spinner = Spinner("dots", text=Text.from_ansi(label), style="green")
+        self._live = None
+
+    def __enter__(self) -> "LiveTail":
+        from rich.console import Console
+        from rich.live import Live
+
+        self._live = Live(
+            self, console=Console(), refresh_per_second=10, transient=True
+        )
+        self._live.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+
+    def write(self, line: str) -> None:
+        """Add one line of build output to the tail."""
+        line = line.rstrip()
+        if line:
+            self.lines.append(line)
+
+    def __rich__(self):
+        from rich.console import Group
+        from rich.text import Text
+
+        # The display refreshes from its own thread; copying the deque is
+        # atomic, iterating it while lines are appended is not.
+        lines = self.lines.copy()
+        return Group(
+            self._spinner,
+            *(
+                Text(f"  {line}", style="dim", no_wrap=True, overflow="ellipsis")
+                for line in lines
+            ),
+        )
@@ -0,0 +1,126 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.dir import get_cache_dir
+from utils.cache import source_files
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Optional
+import hashlib
+import json
+import os
+import time
+import logging
+
+__all__ = ["BuildStep", "Checkpoints"]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+CHECKPOINTS_VERSION = 1
+
+
+@dataclass
+class BuildStep:
+    """A named build command with the files it reads and writes.
+
+    Relative inputs and outputs are resolved against the directory the
+    step runs in. A directory input stands for every source file below it.
+    env holds variables the command needs on top of the build environment.
+    """
+
+    name: str
+    command: list[str]
+    inputs: list[Path] = field(default_factory=list)
+    outputs: list[Path] = field(default_factory=list)
+    env: dict[str, str] = field(default_factory=dict)
+
+    def fingerprint(self, cwd: Path) -> str:
+        """Hash the command, its env and the size and mtime of every input file."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps([str(cwd), self.command, self.env], sort_keys=True).encode())
+        for input_path in self.inputs:
+            for file in sorted(set(source_files(cwd / input_path))):
+                try:
+                    st = file.stat()
+                except OSError:
+                    digest.update(f"{file}\0missing\n".encode())
+                    continue
+                digest.update(f"{file}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+        return digest.hexdigest()
+
+    def outputs_exist(self, cwd: Path) -> bool:
+        return all((cwd / output).exists() for output in self.outputs)
+
+
+@dataclass
+class Checkpoints:
+    """Persisted record of the build steps of a utility that succeeded.
+
+    Checkpoints live in ``$XDG_CACHE_HOME/utils/checkpoints/<name>.json``.
+    A step is complete while its fingerprint matches and its declared
+    outputs still exist.
+    """
+
+    path: Path
+    steps: dict[str, str] = field(default_factory=dict)
+    failed: Optional[str] = None
+
+    @classmethod
+    def load(cls, name: str, root: Optional[Path] = None) -> "Checkpoints":
+        root = root if root is not None else get_cache_dir() / "checkpoints"
+        checkpoints = cls(path=root / f"{name}.json")
+        try:
+            with open(checkpoints.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return checkpoints
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable build checkpoints: %s", e)
+            return checkpoints
+        if data.get("version") != CHECKPOINTS_VERSION:
+            return checkpoints
+        checkpoints.steps = dict(data.get("steps", {}))
+        checkpoints.failed = data.get("failed")
+        return checkpoints
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": CHECKPOINTS_VERSION,
+            "updated": time.time(),
+            "steps": self.steps,
+            "failed": self.failed,
+        }
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def is_complete(self, step: BuildStep, cwd: Path) -> bool:
+        recorded = self.steps.get(step.name)
+        if recorded is None:
+            return False
+        if recorded != step.fingerprint(cwd):
+            log.debug("Inputs of build step %s changed since its checkpoint.", step.name)
+            return False
+        if not step.outputs_exist(cwd):
+            log.debug("Outputs of build step %s are missing.", step.name)
+            return False
+        return True
+
+    def invalidate(self, steps: list[BuildStep]) -> None:
+        """Forget the given steps, e.g. every step after one that reran."""
+        for step in steps:
+            self.steps.pop(step.name, None)
+
+    def complete(self, step: BuildStep, cwd: Path) -> None:
+        # Fingerprint after the step ran, so in-tree builds that write next
+        # to their sources still match on the next attempt.
+        self.steps[step.name] = step.fingerprint(cwd)
+        if self.failed == step.name:
+            self.failed = None
+        self.save()
+
+    def fail(self, step: BuildStep) -> None:
+        self.steps.pop(step.name, None)
+        self.failed = step.name
+        self.save()
@@ -0,0 +1,295 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.manifest import Manifest, ManifestEntry, reindex
+from utils.trace import span
+from pathlib import Path
+from dataclasses import dataclass, asdict, field
+from typing import BinaryIO, Optional
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import hashlib
+import io
+import json
+import lzma
+import os
+import tarfile
+import time
+import logging
+
+__all__ = [
+    "FORMATS",
+    "BundleError",
+    "BundleStats",
+    "ImportResult",
+    "default_format",
+    "export_bundle",
+    "import_bundle",
+]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+BUNDLE_VERSION = 1
+INDEX_NAME = "index.json"
+OBJECTS_DIR = "objects"
+
+FORMATS = ("zstd", "xz")
+
+MAX_PENDING_BYTES = 256 * 1024**2
+"""Upper bound on file contents read from a bundle but not yet written."""
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_XZ_MAGIC = b"\xfd7zXZ\x00"
+
+
+class BundleError(Exception):
+    """Raised when a bundle can't be written or read."""
+
+
+@dataclass
+class BundleStats:
+    """What went into an exported bundle."""
+
+    utilities: int
+    objects: int
+    size: int
+
+
+@dataclass
+class ImportResult:
+    """Names of the utilities an import added, replaced or left alone."""
+
+    added: list[str] = field(default_factory=list)
+    updated: list[str] = field(default_factory=list)
+    unchanged: list[str] = field(default_factory=list)
+
+
+def _zstd():
+    """The zstd implementation, if any: the stdlib's on 3.14+, else zstandard."""
+    try:
+        from compression import zstd  # type: ignore[import-not-found]
+
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard  # type: ignore[import-not-found]
+
+        return zstandard
+    except ImportError:
+        return None
+
+
+def default_format(path: Optional[Path] = None) -> str:
+    """Pick the format from the file suffix, preferring zstd when available."""
+    if path is not None:
+        if path.suffix in (".zst", ".zstd"):
+            return "zstd"
+        if path.suffix == ".xz":
+            return "xz"
+    return "zstd" if _zstd() is not None else "xz"
+
+
+def _compressor(fileobj: BinaryIO, fmt: str, level: Optional[int]) -> BinaryIO:
+    if fmt == "xz":
+        if level is not None and not 0 <= level <= 9:
+            raise BundleError(f"Invalid xz compression level: {level}. Use 0 to 9.")
+        return lzma.LZMAFile(fileobj, "wb", preset=6 if level is None else level)
+    zstd = _zstd()
+    if zstd is None:
+        raise BundleError(
+            "zstd compression needs Python 3.14 or the zstandard package. Use --format xz."
+        )
+    level = 10 if level is None else level
+    if hasattr(zstd, "ZstdFile"):
+        return zstd.ZstdFile(fileobj, "wb", level=level)
+    # zstandard compresses on every core with threads=-1.
+    return zstd.ZstdCompressor(level=level, threads=-1).stream_writer(
+        fileobj, closefd=False
+    )
+
+
+def _decompressor(fileobj: io.BufferedReader) -> BinaryIO:
+    magic = fileobj.peek(len(_XZ_MAGIC))[: len(_XZ_MAGIC)]
+    if magic.startswith(_XZ_MAGIC):
+        return lzma.LZMAFile(fileobj, "rb")
+    if magic.startswith(_ZSTD_MAGIC):
+        zstd = _zstd()
+        if zstd is None:
+            raise BundleError(
+                "This bundle is zstd compressed, which needs Python 3.14 or the zstandard package."
+            )
+        if hasattr(zstd, "ZstdFile"):
+            return zstd.ZstdFile(fileobj, "rb")
+        return zstd.ZstdDecompressor().stream_reader(fileobj, closefd=False)
+    raise BundleError("Not a utilities bundle: unknown compression.")
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = 0o644
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+def export_bundle(
+    utils_dir: Path,
+    fileobj: BinaryIO,
+    fmt: str,
+    level: Optional[int] = None,
+) -> BundleStats:
+    """Stream the utilities directory and its manifest into a bundle.
+
+    A bundle is a compressed tar stream holding an index of every utility
+    followed by one member per distinct file content, named by its hash.
+    Symlinked utilities are stored as the files they point to, since their
+    targets usually don't exist on the host the bundle is restored on.
+    """
+    with span("reindex"):
+        manifest, _ = reindex(utils_dir)
+    utilities: dict[str, dict] = {}
+    objects: dict[str, Path] = {}
+    for entry in manifest:
+        path = utils_dir / entry.name
+        try:
+            mode = path.stat().st_mode & 0o777
+        except OSError as e:
+            log.warning("Skipping %s: %s", path, e)
+            continue
+        utilities[entry.name] = {**asdict(entry), "mode": mode}
+        objects.setdefault(entry.hash, path)
+    index = {
+        "version": BUNDLE_VERSION,
+        "created": time.time(),
+        "utilities": utilities,
+    }
+    size = 0
+    stream = _compressor(fileobj, fmt, level)
+    try:
+        with tarfile.open(fileobj=stream, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+            _add_bytes(tar, INDEX_NAME, json.dumps(index, indent=2).encode())
+            for digest, path in objects.items():
+                with span("add object", name=path.name), open(path, "rb") as f:
+                    info = tar.gettarinfo(fileobj=f, arcname=f"{OBJECTS_DIR}/{digest}")
+                    info.uname = info.gname = ""
+                    tar.addfile(info, f)
+                size += info.size
+    finally:
+        stream.close()
+    return BundleStats(utilities=len(utilities), objects=len(objects), size=size)
+
+
+def _check_name(name: str) -> None:
+    path = Path(name)
+    if path.is_absolute() or ".." in path.parts or not path.parts:
+        raise BundleError(f"Refusing to import a utility outside the utilities directory: {name}")
+
+
+def _place(data: bytes, digest: str, targets: list[tuple[Path, int]]) -> None:
+    """Verify one file's contents and atomically write it to every target."""
+    actual = hashlib.sha256(data).hexdigest()
+    if actual != digest:
+        raise BundleError(f"Checksum mismatch in bundle: expected {digest}, got {actual}.")
+    for target, mode in targets:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, mode)
+        os.replace(tmp, target)
+
+
+def import_bundle(
+    fileobj: io.BufferedReader,
+    utils_dir: Path,
+    update: bool = False,
+    jobs: Optional[int] = None,
+) -> ImportResult:
+    """Restore a bundle into the utilities directory.
+
+    Decompression is sequential, but files are verified and written by a
+    pool of jobs threads while the stream is read. Every file is written
+    to a temporary name and renamed into place with its recorded mode.
+    Utilities that already exist with other contents are only replaced
+    when update is set; nothing is written if any would be refused.
+
+    Sources, build directories and PGO data are paths on the exporting
+    host, so imported utilities are recorded without them.
+    """
+    result = ImportResult()
+    stream = _decompressor(fileobj)
+    try:
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            member = tar.next()
+            if member is None or member.name != INDEX_NAME:
+                raise BundleError("Not a utilities bundle: the index is missing.")
+            try:
+                index = json.load(tar.extractfile(member))
+            except ValueError as e:
+                raise BundleError(f"Unreadable bundle index: {e}") from e
+            if index.get("version") != BUNDLE_VERSION:
+                raise BundleError(f"Unsupported bundle version: {index.get('version')}")
+            utilities: dict[str, dict] = index.get("utilities", {})
+            with span("reindex"):
+                manifest, _ = reindex(utils_dir)
+            wanted: dict[str, list[tuple[Path, int]]] = {}
+            conflicts = []
+            for name, data in sorted(utilities.items()):
+                _check_name(name)
+                existing = manifest.entries.get(name)
+                if existing is not None and existing.hash == data["hash"]:
+                    result.unchanged.append(name)
+                    continue
+                if existing is not None and not update:
+                    conflicts.append(name)
+                    continue
+                (result.updated if existing is not None else result.added).append(name)
+                wanted.setdefault(data["hash"], []).append(
+                    (utils_dir / name, data.get("mode", 0o755) & 0o777)
+                )
+            if conflicts:
+                raise BundleError(
+                    f"{len(conflicts)} utilities already exist with other contents: "
+                    f"{', '.join(conflicts)}. Use --force to replace them."
+                )
+            pending: dict[Future, int] = {}
+            pending_bytes = 0
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                for member in tar:
+                    digest = member.name.removeprefix(f"{OBJECTS_DIR}/")
+                    targets = wanted.pop(digest, None)
+                    if targets is None or not member.isfile():
+                        continue
+                    data = tar.extractfile(member).read()
+                    future = pool.submit(_place, data, digest, targets)
+                    pending[future] = len(data)
+                    pending_bytes += len(data)
+                    while pending_bytes > MAX_PENDING_BYTES:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            pending_bytes -= pending.pop(future)
+                            future.result()
+                for future in pending:
+                    future.result()
+            if wanted:
+                raise BundleError(
+                    f"The bundle is incomplete: {sum(map(len, wanted.values()))} files are missing."
+                )
+    except (tarfile.TarError, lzma.LZMAError, EOFError) as e:
+        raise BundleError(f"Corrupt bundle: {e}") from e
+    finally:
+        stream.close()
+    with span("update manifest"):
+        with Manifest.locked(utils_dir) as manifest:
+            for name in (*result.added, *result.updated):
+                data = dict(utilities[name])
+                data.pop("mode", None)
+                st = (utils_dir / name).stat()
+                entry = ManifestEntry.from_dict(data)
+                entry.size = st.st_size
+                entry.mtime = st.st_mtime
+                # 'remove' would delete the build_dir and 'rebuild' would look
+                # for the origin, neither of which is this host's.
+                entry.origin = entry.build_dir = entry.pgo = None
+                manifest.add(entry)
+            manifest.save()
+    return result
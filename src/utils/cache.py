@@ -0,0 +1,347 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.dir import get_builds_dir, get_cache_dir
+from utils.trace import traced
+from utils.fastcopy import copy_file
+from utils.lock import file_lock
+from pathlib import Path
+from dataclasses import dataclass, asdict, field
+from typing import Iterator, Optional, Iterable
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import logging
+
+__all__ = [
+    "SKIP_DIRS",
+    "CacheEntry",
+    "BuildCache",
+    "hash_source_tree",
+    "source_digests",
+    "source_files",
+    "record_generated",
+    "build_cache_key",
+    "parse_size",
+    "format_size",
+]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 2 * 1024**3
+"""Default size limit of the build cache (2 GiB), see ``UTILS_CACHE_SIZE``."""
+
+SKIP_DIRS = frozenset({".git", ".hg", ".svn"})
+"""VCS metadata directories at the top of a source tree, which aren't sources."""
+
+HEADER_SUFFIXES = frozenset({".h", ".hh", ".hpp", ".hxx", ".inc", ".inl", ".mod"})
+
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(size: str) -> int:
+    """Parse a human readable size such as ``500M`` or ``2G`` into bytes."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", size.upper())
+    if match is None:
+        raise ValueError(f"Invalid size: {size!r}")
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit])
+
+
+def format_size(size: int) -> str:
+    """Format a byte count for humans."""
+    value = float(size)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024:
+            return f"{value:.1f} {unit}" if unit != "B" else f"{int(value)} B"
+        value /= 1024
+    return f"{value:.1f} TiB"
+
+
+def source_files(path: Path) -> Iterable[Path]:
+    """Yield the files that make up the sources of a utility."""
+    if path.is_file():
+        yield path
+        for sibling in path.parent.iterdir():
+            if sibling.suffix in HEADER_SUFFIXES and sibling.is_file():
+                yield sibling
+        return
+    # Only the top level is pruned by name: a nested 'build' or 'target'
+    # directory may well hold sources. The managed build directories are
+    # skipped wherever they are, in case they live inside a source tree.
+    builds_dir = get_builds_dir()
+    for root, dirs, files in os.walk(path):
+        top = root == str(path)
+        dirs[:] = sorted(
+            d
+            for d in dirs
+            if not (top and d in SKIP_DIRS) and Path(root, d) != builds_dir
+        )
+        for name in sorted(files):
+            yield Path(root) / name
+
+
+def source_digests(path: Path) -> dict[str, str]:
+    """Digest the mode and contents of every source file by relative path."""
+    base = path.parent if path.is_file() else path
+    digests: dict[str, str] = {}
+    for file in sorted(set(source_files(path))):
+        try:
+            st = file.stat()
+            with open(file, "rb") as f:
+                digest = hashlib.file_digest(f, "sha256")
+        except OSError as e:
+            log.debug("Skipping unreadable source file %s: %s", file, e)
+            continue
+        digest.update(str(st.st_mode & 0o111).encode())
+        digests[file.relative_to(base).as_posix()] = digest.hexdigest()
+    return digests
+
+
+def _generated_path(path: Path) -> Path:
+    key = hashlib.sha256(str(path.resolve()).encode()).hexdigest()
+    return get_cache_dir() / "sources" / f"{key}.json"
+
+
+def _load_generated(path: Path) -> dict[str, str]:
+    try:
+        with open(_generated_path(path), "r") as f:
+            return {str(k): str(v) for k, v in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, AttributeError) as e:
+        log.debug("Ignoring unreadable list of generated files: %s", e)
+        return {}
+
+
+def record_generated(path: Path, before: dict[str, str]) -> None:
+    """Remember the files a build wrote into its source tree.
+
+    before are the source digests taken before the build. Files that are
+    new or changed afterwards are build products, such as in-tree objects,
+    binaries or a fresh Cargo.lock. hash_source_tree leaves them out for as
+    long as their contents stay what the build made them.
+    """
+    old = _load_generated(path)
+    generated = {
+        name: digest
+        for name, digest in source_digests(path).items()
+        if before.get(name) != digest or old.get(name) == digest
+    }
+    target = _generated_path(path)
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(generated, f, indent=2)
+        os.replace(tmp, target)
+    except OSError as e:
+        log.debug("Failed to save the list of generated files: %s", e)
+
+
+@traced("hash sources")
+def hash_source_tree(path: Path, digests: Optional[dict[str, str]] = None) -> str:
+    """Hash the relative paths, modes and contents of a source tree.
+
+    Files an earlier build generated in the tree are not part of the hash,
+    see record_generated. Pass digests when they were already taken.
+    """
+    log.debug("Hashing source tree: %s", path)
+    if digests is None:
+        digests = source_digests(path)
+    generated = _load_generated(path)
+    digest = hashlib.sha256()
+    for name, file_digest in sorted(digests.items()):
+        if generated.get(name) == file_digest:
+            continue
+        digest.update(name.encode())
+        digest.update(b"\0")
+        digest.update(file_digest.encode())
+    return digest.hexdigest()
+
+
+def build_cache_key(
+    source_hash: str,
+    util_type: str,
+    compiler_version: str,
+    command: list[list[str]],
+    distro_id: str,
+    profile: str = "release",
+    pgo: str = "",
+) -> str:
+    """Combine everything that influences a build into a single cache key.
+
+    pgo is the digest of the profile data applied to the build, if any.
+    """
+    parts = {
+        "source": source_hash,
+        "type": str(util_type),
+        "compiler": compiler_version,
+        "command": command,
+        "distro": distro_id,
+        "profile": str(profile),
+        "pgo": pgo,
+    }
+    blob = json.dumps(parts, sort_keys=True).encode()
+    return hashlib.sha256(blob).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    """A cached build artifact."""
+
+    key: str
+    name: str
+    size: int
+    created: float
+    last_used: float
+
+
+@dataclass
+class BuildCache:
+    """Content-addressed, size-bounded store of compiled utilities.
+
+    Artifacts are stored under ``<root>/<key[:2]>/<key>/<name>`` and tracked
+    in an ``index.json`` file. When the cache grows over ``max_size`` the
+    least recently used artifacts are evicted. Updates of the index hold an
+    ``flock`` on ``index.lock``, so concurrent builds don't lose entries.
+    """
+
+    root: Path = field(default_factory=lambda: get_cache_dir() / "build")
+    max_size: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if self.max_size is None:
+            env_size = os.environ.get("UTILS_CACHE_SIZE", "")
+            try:
+                self.max_size = parse_size(env_size) if env_size else DEFAULT_MAX_SIZE
+            except ValueError:
+                log.warning("Ignoring invalid UTILS_CACHE_SIZE: %s", env_size)
+                self.max_size = DEFAULT_MAX_SIZE
+
+    @property
+    def index_path(self) -> Path:
+        return self.root / "index.json"
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the index lock for a read-modify-write of the index."""
+        with file_lock(self.root / "index.lock"):
+            yield
+
+    def _load(self) -> dict[str, CacheEntry]:
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable build cache index: %s", e)
+            return {}
+        return {key: CacheEntry(**entry) for key, entry in data.items()}
+
+    def _save(self, entries: dict[str, CacheEntry]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_name(f"index.json.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({k: asdict(v) for k, v in entries.items()}, f, indent=2)
+        os.replace(tmp, self.index_path)
+
+    def _artifact_dir(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def get(self, key: str) -> Optional[Path]:
+        """Return the cached artifact for key, or None on a miss."""
+        if key not in self._load():
+            log.debug("Build cache miss: %s", key)
+            return None
+        with self._locked():
+            entries = self._load()
+            entry = entries.get(key)
+            if entry is None:
+                log.debug("Build cache miss: %s", key)
+                return None
+            artifact = self._artifact_dir(key) / entry.name
+            if not artifact.is_file():
+                log.debug("Build cache entry without artifact, dropping it: %s", key)
+                del entries[key]
+                self._save(entries)
+                return None
+            log.debug("Build cache hit: %s", key)
+            entry.last_used = time.time()
+            self._save(entries)
+        return artifact
+
+    def put(self, key: str, artifact: Path) -> Path:
+        """Copy an artifact into the cache and evict old entries if needed."""
+        log.debug("Storing %s in the build cache under %s", artifact, key)
+        target_dir = self._artifact_dir(key)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        target = target_dir / artifact.name
+        tmp = target.with_name(f"{artifact.name}.{os.getpid()}.tmp")
+        tmp.unlink(missing_ok=True)
+        copy_file(artifact, tmp)
+        os.replace(tmp, target)
+        now = time.time()
+        with self._locked():
+            entries = self._load()
+            entries[key] = CacheEntry(
+                key=key,
+                name=artifact.name,
+                size=target.stat().st_size,
+                created=now,
+                last_used=now,
+            )
+            self._evict(entries, self.max_size)
+            self._save(entries)
+        return target
+
+    def _evict(self, entries: dict[str, CacheEntry], max_size: int) -> list[CacheEntry]:
+        """Drop least recently used entries until the cache fits in max_size."""
+        evicted: list[CacheEntry] = []
+        total = sum(e.size for e in entries.values())
+        for entry in sorted(entries.values(), key=lambda e: e.last_used):
+            if total <= max_size:
+                break
+            log.debug("Evicting %s (%s) from the build cache", entry.key, entry.name)
+            shutil.rmtree(self._artifact_dir(entry.key), ignore_errors=True)
+            del entries[entry.key]
+            total -= entry.size
+            evicted.append(entry)
+        return evicted
+
+    def prune(self, max_size: Optional[int] = None) -> list[CacheEntry]:
+        """Evict entries until the cache is at most max_size bytes."""
+        with self._locked():
+            entries = self._load()
+            evicted = self._evict(
+                entries, self.max_size if max_size is None else max_size
+            )
+            self._save(entries)
+        return evicted
+
+    def remove(self, keys: Iterable[str]) -> list[CacheEntry]:
+        """Drop the given entries and their artifacts."""
+        removed: list[CacheEntry] = []
+        with self._locked():
+            entries = self._load()
+            for key in keys:
+                entry = entries.pop(key, None)
+                if entry is None:
+                    continue
+                log.debug("Removing %s (%s) from the build cache", entry.key, entry.name)
+                shutil.rmtree(self._artifact_dir(entry.key), ignore_errors=True)
+                removed.append(entry)
+            if removed:
+                self._save(entries)
+        return removed
+
+    def entries(self) -> list[CacheEntry]:
+        """All cache entries, most recently used first."""
+        return sorted(self._load().values(), key=lambda e: e.last_used, reverse=True)
+
+    def size(self) -> int:
+        return sum(e.size for e in self._load().values())
@@ -1,4 +1,6 @@
 import rich_click as click
+from utils import trace
+from utils.trace import span
 
 click.rich_click.STYLE_OPTION = "bold cyan"
 click.rich_click.STYLE_ARGUMENT = "bold cyan"
@@ -15,3 +17,53 @@ click.rich_click.STYLE_REQUIRED_SHORT = "red"
 click.rich_click.STYLE_REQUIRED_LONG = "dim red"
 click.rich_click.STYLE_OPTIONS_PANEL_BORDER = "dim"
 click.rich_click.STYLE_COMMANDS_PANEL_BORDER = "dim"
+
+
+class LazyGroup(click.RichGroup):
+    """A command group that only imports its subcommands when they are needed.
+
+    Subcommands are registered as ``name -> "module:attribute"`` import paths
+    so that ``utils --help`` or ``utils list`` never pay for the imports of
+    commands that are not being run.
+    """
+
+    def __init__(
+        self, *args, lazy_subcommands: dict[str, str] | None = None, **kwargs
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        base = super().list_commands(ctx)
+        lazy = sorted(self.lazy_subcommands.keys())
+        return base + lazy
+
+    def resolve_command(
+        self, ctx: click.Context, args: list[str]
+    ) -> tuple[str | None, click.Command | None, list[str]]:
+        # The subcommand is imported while it is resolved, so tracing has to
+        # be turned on before that for the import to show up in the profile.
+        if ctx.params.get("profile") or ctx.params.get("trace_file") is not None:
+            trace.enable(ctx.params.get("trace_file"))
+        if trace.is_enabled() and ctx.parent is None and args:
+            ctx.with_resource(span(f"{ctx.info_name} {args[0]}"))
+        return super().resolve_command(ctx, args)
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command | None:
+        if cmd_name in self.lazy_subcommands:
+            return self._lazy_load(cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def _lazy_load(self, cmd_name: str) -> click.Command:
+        from importlib import import_module
+
+        import_path = self.lazy_subcommands[cmd_name]
+        modname, cmd_object_name = import_path.rsplit(":", 1)
+        with span("import", module=modname):
+            mod = import_module(modname)
+        cmd_object = getattr(mod, cmd_object_name)
+        if not isinstance(cmd_object, click.Command):
+            raise ValueError(
+                f"Lazy loading of {import_path} failed by returning a non-command object"
+            )
+        return cmd_object
@@ -1,39 +1,224 @@
 import os
+import glob
 import shutil
 from pathlib import Path
-from typing import Optional
-from utils.dir import get_utils_dir
+from typing import Optional, Iterable, Sequence
+from utils.dir import get_utils_dir, get_builds_dir
+from utils.manifest import (
+    Manifest,
+    ManifestEntry,
+    entry_for,
+    hash_file,
+    reindex,
+    walk_utilities,
+)
+from utils.cache import (
+    BuildCache,
+    build_cache_key,
+    hash_source_tree,
+    record_generated,
+    source_digests,
+    format_size,
+)
 from utils.click import click
 from utils.log import get_level, LOG_FORMAT
 import logging
 import subprocess
 from dataclasses import dataclass
-from enum import EnumType, StrEnum
-from halo import Halo
-import distro
-import requests
+from utils.types import BuildProfile, UtilityType, Compilers
+from utils.jobserver import Jobserver
+from utils.buildlog import BuildLog, LiveTail
+from utils.buildplan import BuildStep, Checkpoints
+from utils.objcache import CompilerCache, get_compiler_cache
+from utils.pgo import PGO_TYPES, PgoData, PgoError
+from utils.usage import BuildUsage, collect, disk_usage, gc_quota
+from utils.discover import discover_outputs, scan_executables
+from utils.artifacts import ArtifactMeta, ArtifactStore, artifact_key, open_store, platform_id
+from utils.download import DownloadError
+from utils.fastcopy import Strategy, copy_file, move_file
+from utils.toolchains import get_inventory, required_compilers
+from utils.trace import span
 
-__all__ = ["list_cmd", "error", "add_utility", "remove_utility"]
+__all__ = [
+    "list_cmd",
+    "reindex_cmd",
+    "error",
+    "add_utility",
+    "add_utilities",
+    "remove_utility",
+    "add_compiled_utility",
+    "rebuild_utilities",
+    "toolchains_cmd",
+    "install_toolchains",
+    "doctor_cmd",
+    "cache_stats_cmd",
+    "cache_prune_cmd",
+    "publish_cmd",
+    "fetch_cmd",
+    "export_cmd",
+    "import_cmd",
+    "gc_cmd",
+    "du_cmd",
+]
 
 logging.basicConfig(level=get_level(), format=LOG_FORMAT)
 log = logging.getLogger(__name__)
 
 
-def list_cmd() -> None:
-    """'list' or 'ls' command implementation."""
+LIST_BATCH = 512
+"""Lines written to stdout at once by 'list'."""
+
+
+def _describe(manifest: Manifest, name: str, entry: os.DirEntry) -> Optional[dict]:
+    """Size, mtime, type, build profile and origin of a listed utility."""
+    try:
+        st = entry.stat()
+        link = os.readlink(entry.path) if entry.is_symlink() else None
+    except OSError as e:
+        log.debug("Skipping %s: %s", entry.path, e)
+        return None
+    recorded = manifest.entries.get(name)
+    if recorded is not None and recorded.type is not None:
+        util_type = recorded.type
+    else:
+        util_type = "symlink" if link is not None else "file"
+    origin = recorded.origin if recorded is not None else None
+    return {
+        "name": name,
+        "path": entry.path,
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "type": util_type,
+        "profile": recorded.profile if recorded is not None else None,
+        "origin": origin if origin is not None else link,
+    }
+
+
+def _bounded_map(pool, fn, items: Iterable, chunk: int, window: int) -> Iterable:
+    """Like pool.starmap in order, with at most window chunks in flight."""
+    from collections import deque
+    from itertools import batched
+
+    def run(batch: tuple) -> list:
+        return [fn(*item) for item in batch]
+
+    pending = deque()
+    for batch in batched(items, chunk):
+        pending.append(pool.submit(run, batch))
+        if len(pending) >= window:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
+def list_cmd(fmt: str = "text", long: bool = False) -> None:
+    """'list' or 'ls' command implementation.
+
+    Utilities are streamed from a walk of the utilities directory to stdout
+    in batches. The details shown by long, json and ndjson are stat'ed on
+    a thread pool, a bounded window ahead of the output.
+    """
+    import json
+    import sys
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from functools import partial
+
     log.debug("Getting utilities directory.")
     utils_path = get_utils_dir()
-    log.debug("Iterating over the utilities directory.")
-    for item in utils_path.glob("**/*", recurse_symlinks=True):
-        log.debug(f"Checking item: {item}")
-        if item.is_file(follow_symlinks=True) and os.access(
-            item, mode=os.X_OK | os.R_OK, follow_symlinks=True
-        ):
-            click.echo(
-                click.style(
-                    click.format_filename(item, shorten=True), fg="cyan", bold=True
-                )
+    details = long or fmt != "text"
+    out = click.get_text_stream("stdout")
+    color = fmt == "text" and out.isatty()
+
+    def text(info: dict) -> str:
+        name = click.style(info["name"], fg="cyan", bold=True) if color else info["name"]
+        if not long:
+            return f"{name}\n"
+        mtime = time.strftime("%Y-%m-%d %H:%M", time.localtime(info["mtime"]))
+        line = f"{format_size(info['size']):>10}  {mtime}  {info['type']:<9} {name}"
+        if info["origin"] is not None:
+            origin = f"<- {info['origin']}"
+            line += f"  {click.style(origin, dim=True) if color else origin}"
+        return f"{line}\n"
+
+    match fmt:
+        case "json":
+            first = True
+
+            def render(info: dict) -> str:
+                nonlocal first
+                sep, first = ("[\n  " if first else ",\n  "), False
+                return sep + json.dumps(info)
+
+        case "ndjson":
+
+            def render(info: dict) -> str:
+                return json.dumps(info) + "\n"
+
+        case _:
+            render = text
+
+    count = 0
+    with span("print") as s, ThreadPoolExecutor() as pool:
+        entries = walk_utilities(utils_path)
+        if details:
+            # Only the details need the origins and types from the manifest.
+            manifest = Manifest.load(utils_path)
+            infos = _bounded_map(
+                pool,
+                partial(_describe, manifest),
+                entries,
+                chunk=LIST_BATCH,
+                window=(os.cpu_count() or 1) + 1,
             )
+        else:
+            infos = ({"name": name} for name, _ in entries)
+        batch: list[str] = []
+        try:
+            for info in infos:
+                if info is None:
+                    continue
+                batch.append(render(info))
+                count += 1
+                if len(batch) >= LIST_BATCH:
+                    out.write("".join(batch))
+                    out.flush()
+                    batch.clear()
+            if fmt == "json":
+                batch.append("[]\n" if count == 0 else "\n]\n")
+            elif fmt == "text":
+                batch.append("\n")
+            out.write("".join(batch))
+            out.flush()
+        except BrokenPipeError:
+            # The reader went away, e.g. 'utils list | head'. Point stdout at
+            # devnull so the interpreter doesn't complain when it exits.
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+            raise SystemExit(0)
+        finally:
+            s.set(entries=count)
+
+
+def reindex_cmd() -> None:
+    """'reindex' command implementation."""
+    log.debug("Getting utilities directory.")
+    utils_path = get_utils_dir()
+    with span("reindex"):
+        manifest, drift = reindex(utils_path)
+    for kind, color in (("added", "green"), ("updated", "yellow"), ("removed", "red")):
+        for name in drift[kind]:
+            echo = click.style(f"{kind.capitalize()}: ", fg=color, bold=True)
+            echo += click.style(name, fg="cyan")
+            click.echo(echo)
+    echo = click.style("Indexed ", fg="cyan")
+    echo += click.style(str(len(manifest)), fg="magenta", bold=True)
+    echo += click.style(" utilities in ", fg="cyan")
+    echo += click.style(
+        click.format_filename(manifest.path), fg="magenta", bold=True
+    )
+    echo += click.style(".", fg="cyan")
+    click.echo(echo)
     click.echo()
 
 
@@ -42,56 +227,304 @@ def error(message: str) -> str:
     return f"{click.style('ERROR:', fg='red', bold=True)} {message}"
 
 
-def add_utility(utility: Path, copy: bool, update: bool) -> None:
-    """'add' and 'install' command implementation."""
-    log.debug(f"Adding utility: {utility}")
-    log.debug("Getting utilities directory.")
-    utils_path = get_utils_dir()
-    new_name = utility.stem.replace("_", "-").lower()
+def utility_name(utility: Path) -> str:
+    """Get the name a utility is installed under."""
+    return utility.stem.replace("_", "-").lower()
+
+
+def install_file(
+    utils_path: Path,
+    utility: Path,
+    copy: bool,
+    update: bool,
+    origin: Optional[Path] = None,
+    util_type: Optional[UtilityType] = None,
+    build_dir: Optional[Path] = None,
+    allow_hardlink: bool = False,
+    profile: Optional[BuildProfile] = None,
+    pgo: Optional[str] = None,
+    source: Optional[str] = None,
+) -> tuple[ManifestEntry, Strategy]:
+    """Copy or move a single utility into the utilities directory.
+
+    This does the file work only; callers are responsible for recording the
+    returned manifest entry and for any output. Also returns the strategy
+    that was used to place the file.
+
+    An existing utility is only replaced when update is set. If its contents
+    already match, it is left alone. Otherwise the new file is written next
+    to it and renamed over it, so running scripts never find it missing.
+    """
+    new_name = utility_name(utility)
     new_path = utils_path / new_name
-    log.debug(f"New utility path: {new_path}")
-    if new_path.exists():
-        log.debug(f"Utility already exists: {new_path}")
-        if update:
-            os.remove(new_path)
-        else:
+    log.debug("New utility path: %s", new_path)
+    replace = new_path.exists()
+    if replace:
+        log.debug("Utility already exists: %s", new_path)
+        if not update:
             raise click.ClickException(
                 error(
                     f"{click.format_filename(new_name, shorten=True)} already exists in the utilities directory.",
                 )
             )
     utility = utility.resolve()
-    log.debug(f"Resolved utility path: {utility}")
-    log.debug(f"{'Copying' if copy else 'Moving'} utility {utility} to {new_path}")
-    if copy:
-        shutil.copy2(utility, new_path)
+    log.debug("Resolved utility path: %s", utility)
+    digest = None
+    if replace:
+        with span("compare file", name=new_name) as s:
+            digest = _matching_digest(utility, new_path)
+            s.set(identical=digest is not None)
+    if digest is not None:
+        log.debug("%s is identical to the installed utility.", utility)
+        strategy = Strategy.UNCHANGED
+        if not copy and utility != new_path.resolve():
+            os.unlink(utility)
     else:
-        utility = utility.replace(new_path)
-    utility.chmod(0o755)
+        target = new_path.with_name(f".{new_name}.{os.getpid()}.tmp") if replace else new_path
+        log.debug(
+            "%s utility %s to %s", "Copying" if copy else "Moving", utility, target
+        )
+        try:
+            with span("place file", name=new_name) as s:
+                if copy:
+                    strategy = copy_file(utility, target, allow_hardlink=allow_hardlink)
+                else:
+                    strategy = move_file(utility, target)
+                s.set(strategy=strategy)
+            if target.stat().st_mode & 0o777 != 0o755:
+                target.chmod(0o755)
+            if replace:
+                os.replace(target, new_path)
+        finally:
+            if replace:
+                target.unlink(missing_ok=True)
+        log.debug("Placed %s using %s", new_path, strategy)
+    if new_path.stat().st_mode & 0o777 != 0o755:
+        new_path.chmod(0o755)
+    with span("hash file", name=new_name):
+        entry = entry_for(
+            utils_path,
+            new_path,
+            origin=origin if origin is not None else utility,
+            util_type=util_type,
+            build_dir=build_dir,
+            digest=digest,
+            profile=profile,
+            pgo=pgo,
+            source=source,
+        )
+    return entry, strategy
+
+
+def _matching_digest(utility: Path, installed: Path) -> Optional[str]:
+    """Return the hash of utility if installed has the same contents."""
+    if utility.stat().st_size != installed.stat().st_size:
+        return None
+    digest = hash_file(utility)
+    return digest if hash_file(installed) == digest else None
+
+
+def add_utility(
+    utility: Path,
+    copy: bool,
+    update: bool,
+    origin: Optional[Path] = None,
+    util_type: Optional[UtilityType] = None,
+    build_dir: Optional[Path] = None,
+    allow_hardlink: bool = False,
+    profile: Optional[BuildProfile] = None,
+    pgo: Optional[str] = None,
+    source: Optional[str] = None,
+) -> None:
+    """'add' and 'install' command implementation."""
+    log.debug("Adding utility: %s", utility)
+    log.debug("Getting utilities directory.")
+    utils_path = get_utils_dir()
+    entry, strategy = install_file(
+        utils_path,
+        utility,
+        copy,
+        update,
+        origin,
+        util_type,
+        build_dir,
+        allow_hardlink,
+        profile,
+        pgo,
+        source,
+    )
+    with span("update manifest"):
+        with Manifest.locked(utils_path) as manifest:
+            manifest.add(entry)
+            manifest.save()
+    new_path = utils_path / entry.name
+    if strategy == Strategy.UNCHANGED:
+        echo = click.style("Utility ", fg="cyan")
+        echo += click.style(
+            click.format_filename(new_path, shorten=True), fg="magenta", bold=True
+        )
+        echo += click.style(" is already up to date.", fg="cyan")
+        click.echo(echo)
+        click.echo()
+        return
     echo = click.style(
         "Added utility ",
         fg="cyan",
     )
     echo += click.style(
-        click.format_filename(utility, shorten=True), fg="magenta", bold=True
+        click.format_filename(new_path, shorten=True), fg="magenta", bold=True
     )
-    echo += click.style(" to the utilities directory.", fg="cyan")
+    echo += click.style(" to the utilities directory", fg="cyan")
+    echo += click.style(f" ({strategy})", dim=True)
+    echo += click.style(".", fg="cyan")
     click.echo(echo)
-    cmd = click.style(click.format_filename(utility, shorten=True), fg="cyan")
+    cmd = click.style(click.format_filename(new_path, shorten=True), fg="cyan")
     click.echo(
         f"You can now run it with: '{cmd} {click.style('...args', fg='yellow')}'"
     )
     click.echo()
 
 
+def expand_utilities(paths: Iterable[Path | str]) -> list[Path]:
+    """Expand files, glob patterns and directory trees into a list of files."""
+    files: list[Path] = []
+    missing: list[str] = []
+    for raw in paths:
+        path = Path(raw).expanduser()
+        if path.is_dir():
+            log.debug("Expanding directory: %s", path)
+            for root, dirs, names in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                files.extend(
+                    Path(root) / name for name in sorted(names) if not name.startswith(".")
+                )
+        elif path.is_file():
+            files.append(path)
+        elif glob.has_magic(str(raw)):
+            log.debug("Expanding glob pattern: %s", raw)
+            matches = sorted(glob.glob(str(path), recursive=True))
+            if not matches:
+                missing.append(str(raw))
+            files.extend(Path(m) for m in matches if Path(m).is_file())
+        else:
+            missing.append(str(raw))
+    if missing:
+        raise click.ClickException(
+            error(
+                "No such file, directory or matching glob: "
+                + ", ".join(click.format_filename(m) for m in missing)
+            )
+        )
+    # The same file may be reached through several arguments.
+    return [Path(p) for p in dict.fromkeys(f.resolve() for f in files)]
+
+
+def add_utilities(paths: Iterable[Path | str], copy: bool, update: bool) -> None:
+    """'add' and 'install' command implementation for several utilities.
+
+    All paths are expanded and validated up front, then installed on a
+    thread pool. A single summary table is printed at the end.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from rich.console import Console
+    from rich.table import Table
+
+    with span("expand paths") as s:
+        files = expand_utilities(paths)
+        s.set(files=len(files))
+    log.debug("Adding %s utilities.", len(files))
+    if not files:
+        raise click.ClickException(error("No utilities to add."))
+    utils_path = get_utils_dir()
+
+    by_name: dict[str, list[Path]] = {}
+    for file in files:
+        by_name.setdefault(utility_name(file), []).append(file)
+    problems: list[str] = []
+    for name, sources in by_name.items():
+        if len(sources) > 1:
+            problems.append(
+                f"{name} would be installed from several files: "
+                + ", ".join(click.format_filename(s) for s in sources)
+            )
+        elif not update and (utils_path / name).exists():
+            problems.append(f"{name} already exists in the utilities directory.")
+        elif not os.access(sources[0], os.R_OK):
+            problems.append(f"{click.format_filename(sources[0])} is not readable.")
+    if problems:
+        raise click.ClickException(error("\n".join(problems)))
+
+    def install(file: Path) -> tuple[Path, Optional[ManifestEntry], str]:
+        try:
+            with span("install file"):
+                entry, strategy = install_file(utils_path, file, copy, update)
+            return file, entry, str(strategy)
+        except (OSError, click.ClickException) as e:
+            log.debug("Failed to install %s: %s", file, e)
+            message = e.format_message() if isinstance(e, click.ClickException) else str(e)
+            return file, None, message
+
+    with span("install files", files=len(files)):
+        with ThreadPoolExecutor() as pool:
+            results = list(pool.map(install, files))
+
+    with span("update manifest"):
+        with Manifest.locked(utils_path) as manifest:
+            for _, entry, _ in results:
+                if entry is not None:
+                    manifest.add(entry)
+            manifest.save()
+
+    table = Table(title="Added utilities", title_justify="left")
+    table.add_column("Utility", style="bold cyan")
+    table.add_column("Source", style="magenta")
+    table.add_column("Status")
+    table.add_column("Method", style="dim")
+    failed = 0
+    for file, entry, message in results:
+        if entry is not None and message == Strategy.UNCHANGED:
+            table.add_row(entry.name, str(file), "[dim]unchanged[/dim]", "")
+        elif entry is not None:
+            table.add_row(entry.name, str(file), "[green]added[/green]", message)
+        else:
+            failed += 1
+            table.add_row(utility_name(file), str(file), f"[red]{message}[/red]")
+    Console().print(table)
+    if failed:
+        raise click.ClickException(
+            error(f"{failed} of {len(results)} utilities could not be added.")
+        )
+
+
 def remove_utility(utility: str) -> None:
     """'remove', 'rm', or 'uninstall' command implementation."""
-    log.debug(f"Removing utility: {utility}")
+    log.debug("Removing utility: %s", utility)
     log.debug("Getting utilities directory.")
     utils_path = get_utils_dir()
-    utility_path = utils_path / utility.replace("-", "_").lower()
-    log.debug(f"Removing utility at path: {utility_path}")
-    os.remove(utility_path)
+    name = utility.replace("_", "-").lower()
+    utility_path = utils_path / name
+    log.debug("Removing utility at path: %s", utility_path)
+    try:
+        os.remove(utility_path)
+    except FileNotFoundError as e:
+        raise click.ClickException(
+            error(
+                f"{click.format_filename(name, shorten=True)} does not exist in the utilities directory."
+            )
+        ) from e
+    with span("update manifest"):
+        with Manifest.locked(utils_path) as manifest:
+            entry = manifest.remove(name)
+            if entry is not None:
+                manifest.save()
+    if entry is not None and entry.build_dir is not None:
+        log.debug("Removing build directory: %s", entry.build_dir)
+        with span("remove build dir", path=entry.build_dir):
+            shutil.rmtree(entry.build_dir, ignore_errors=True)
+            with BuildUsage.locked() as usage:
+                usage.forget(name)
+    if entry is not None and entry.pgo is not None and entry.origin is not None:
+        PgoData(utility_name(Path(entry.origin)), UtilityType(entry.type)).remove()
     echo = click.style(
         "Removed utility ",
         fg="cyan",
@@ -104,61 +537,30 @@ def remove_utility(utility: str) -> None:
     click.echo()
 
 
-class Meta(EnumType):
-    def __repr__(cls):
-        return ", ".join(cls.ls())
-
-    def __str__(cls):
-        return ", ".join(cls.ls())
-
-    def ls(cls) -> list[str]:
-        """List all members of the enumeration."""
-        return [str(member) for member in cls.__members__.values()]
-
-
-class StrEnumUtil(StrEnum, metaclass=Meta):
-    """Base class for string enumerations with custom __repr__ and __str__ methods."""
-
-
-class UtilityType(StrEnumUtil):
-    """Enumeration for utility types."""
-
-    RUST = "rust"
-    GO = "go"
-    C = "c"
-    CPP = "cpp"
-    FORTRAN = "fortran"
-    MAKE = "make"
-    CMAKE = "cmake"
-    AUTOCONF = "autoconf"
-
-
-class Compilers(StrEnumUtil):
-    """Enumeration for compiler types."""
-
-    GCC = "gcc"
-    GPP = "g++"
-    GFORTRAN = "gfortran"
-    MAKE = "make"
-    CMAKE = "cmake"
-    RUST = "cargo"
-    GO = "go"
-    CONF = "autoconf"
-
-
 @dataclass
 class CompilerCommand:
-    """TypedDict for compiler command structure."""
+    """The build plan of a compiled utility: its named steps and output."""
 
-    command: list[list[str]]
+    steps: list[BuildStep]
     compiler: Compilers
     output: Optional[Path] = None
+    build_dir: Optional[Path] = None
+    profile: BuildProfile = BuildProfile.RELEASE
+
+    @property
+    def command(self) -> list[list[str]]:
+        return [step.command for step in self.steps]
+
+    @property
+    def env(self) -> dict[str, str]:
+        """Environment of the final step, which produced the output."""
+        return self.steps[-1].env if self.steps else {}
 
 
 def get_compiler_install_cmd(compiler: Compilers) -> list[str]:
     """Get the installation command based on the current OS."""
     log.debug("Determining installation command based on OS.")
-    match distro.id():
+    match get_inventory().distro_id:
         case "debian" | "ubuntu" | "linuxmint" | "pop":
             match compiler:
                 case Compilers.RUST:
@@ -180,7 +582,7 @@ def get_compiler_install_cmd(compiler: Compilers) -> list[str]:
                         "https://sh.rustup.rs",
                     ]
                 case Compilers.GCC | Compilers.GPP:
-                    return ["sudo", "dnf", "groupinstall", "-y", "Development Tools"]
+                    return ["sudo", "dnf", "install", "-y", "@Development Tools"]
                 case Compilers.GO:
                     return ["sudo", "dnf", "install", "-y", "golang"]
                 case Compilers.GFORTRAN:
@@ -233,27 +635,25 @@ def get_compiler_install_cmd(compiler: Compilers) -> list[str]:
             )
 
 
-def install_rust() -> None:
+def fetch_rustup_script() -> str:
+    """Download the rustup installation script."""
+    from utils.download import RUSTUP_URL, fetch_text
+
+    log.debug("Downloading the rustup installation script.")
+    return fetch_text(RUSTUP_URL)
+
+
+def install_rust(script: Optional[str] = None) -> None:
     """Install Rust using rustup."""
     log.debug("Installing Rust using rustup.")
-    script = requests.get("https://sh.rustup.rs", allow_redirects=True)
-    if script.status_code != 200:
-        raise click.ClickException(
-            error("Failed to download the Rust installation script.")
-        )
+    if script is None:
+        script = fetch_rustup_script()
     try:
-        subprocess.run(
-            ["sh", "-c", script.text],
-            check=True,
-            text=True,
-            stdout=subprocess.STD_OUTPUT_HANDLE,
-            stderr=subprocess.STD_ERROR_HANDLE,
-            stdin=subprocess.STD_INPUT_HANDLE,
-        )
+        subprocess.run(["sh", "-c", script], check=True, text=True)
         click.echo(click.style("Rustup installed successfully.", fg="green", bold=True))
     except subprocess.CalledProcessError as exc:
         raise click.ClickException(
-            error(f"Failed to install Rust: {exc.output}")
+            error(f"Failed to install Rust: exit code {exc.returncode}")
         ) from exc
 
 
@@ -264,27 +664,105 @@ def compiler_install(compiler: Compilers) -> None:
         return
     cmd = get_compiler_install_cmd(compiler)
     try:
-        subprocess.run(
-            cmd,
-            check=True,
-            text=True,
-            stdout=subprocess.STD_OUTPUT_HANDLE,
-            stderr=subprocess.STD_ERROR_HANDLE,
-            stdin=subprocess.STD_INPUT_HANDLE,
-        )
+        subprocess.run(cmd, check=True, text=True)
         click.echo(
             click.style(f"{compiler} installed successfully.", fg="green", bold=True)
         )
     except subprocess.CalledProcessError as exc:
         raise click.ClickException(
-            error(f"Failed to install {compiler}: {exc.output}")
+            error(f"Failed to install {compiler}: exit code {exc.returncode}")
         ) from exc
 
 
+def get_compiler_install_cmds(compilers: Iterable[Compilers]) -> list[list[str]]:
+    """Merge the install commands of several compilers.
+
+    Commands that only differ in the package they install are combined, so
+    each distro family needs a single package manager transaction. rustup is
+    not a package and is left out; see 'install_rust'.
+    """
+    merged: dict[tuple[str, ...], list[str]] = {}
+    for compiler in compilers:
+        if compiler == Compilers.RUST:
+            continue
+        cmd = get_compiler_install_cmd(compiler)
+        packages = merged.setdefault(tuple(cmd[:-1]), [])
+        if cmd[-1] not in packages:
+            packages.append(cmd[-1])
+    return [[*prefix, *packages] for prefix, packages in merged.items()]
+
+
+def install_toolchains(
+    util_types: Iterable[UtilityType], dry_run: bool = False
+) -> None:
+    """'toolchains install' command implementation."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    inventory = get_inventory()
+    missing = [
+        compiler
+        for compiler in required_compilers(util_types)
+        if not inventory.get(compiler).installed
+    ]
+    if not missing:
+        click.echo(
+            click.style("All required toolchains are installed.", fg="green", bold=True)
+        )
+        return
+    echo = click.style("Missing toolchains: ", fg="yellow", bold=True)
+    echo += click.style(", ".join(missing), fg="cyan", bold=True)
+    click.echo(echo)
+    cmds = get_compiler_install_cmds(missing)
+    needs_rust = Compilers.RUST in missing
+    for cmd in cmds:
+        click.echo(f"{click.style('Running:', fg='magenta')} {' '.join(cmd)}")
+    if needs_rust:
+        click.echo(f"{click.style('Running:', fg='magenta')} rustup installer")
+    if dry_run:
+        return
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        # Download rustup while the package manager runs in the foreground.
+        rustup = pool.submit(fetch_rustup_script) if needs_rust else None
+        for cmd in cmds:
+            try:
+                subprocess.run(cmd, check=True, text=True)
+            except (OSError, subprocess.CalledProcessError) as exc:
+                raise click.ClickException(
+                    error(f"Failed to run {' '.join(cmd)}: {exc}")
+                ) from exc
+        if rustup is not None:
+            install_rust(rustup.result())
+    for compiler in missing:
+        inventory.refresh(compiler)
+    inventory.save()
+    still_missing = [c for c in missing if not inventory.get(c).installed]
+    if still_missing:
+        raise click.ClickException(
+            error(
+                "Still not found on PATH after installing: "
+                + ", ".join(still_missing)
+                + ". You may need to refresh your shell."
+            )
+        )
+    click.echo(
+        click.style("Toolchains installed successfully.", fg="green", bold=True)
+    )
+
+
+def get_compiler_version(compiler: Compilers) -> str:
+    """Get the version string reported by the specified compiler."""
+    log.debug("Getting version of compiler: %s", compiler)
+    return get_inventory().get(compiler).version
+
+
 def install_compiler(compiler: Compilers) -> None:
     """Install the specified compiler if not already installed."""
-    log.debug(f"Installing compiler: {compiler}")
-    if shutil.which(compiler):
+    log.debug("Installing compiler: %s", compiler)
+    with span("detect compiler", compiler=compiler) as s:
+        inventory = get_inventory()
+        installed = inventory.get(compiler).installed
+        s.set(installed=installed)
+    if installed:
         click.echo(
             click.style(f"{compiler} is already installed.", fg="green", bold=True)
         )
@@ -298,45 +776,152 @@ def install_compiler(compiler: Compilers) -> None:
             )
         )
         compiler_install(compiler)
+        inventory.refresh(compiler)
+        inventory.save()
+
+
+PROFILE_FLAGS: dict[BuildProfile, tuple[list[str], list[str]]] = {
+    BuildProfile.DEBUG: (["-O0", "-g"], []),
+    BuildProfile.RELEASE: (["-O2"], ["-s"]),
+    BuildProfile.NATIVE: (["-O3", "-march=native", "-flto"], ["-flto", "-s"]),
+    BuildProfile.SIZE: (
+        ["-Os", "-flto", "-ffunction-sections", "-fdata-sections"],
+        ["-flto", "-Wl,--gc-sections", "-s"],
+    ),
+}
+"""Compile and link flags of each profile for gcc, g++ and gfortran."""
 
+CMAKE_BUILD_TYPES = {
+    BuildProfile.DEBUG: "Debug",
+    BuildProfile.RELEASE: "Release",
+    BuildProfile.NATIVE: "Release",
+    BuildProfile.SIZE: "MinSizeRel",
+}
 
-def handle_make_type(util_type: UtilityType, path: Path) -> CompilerCommand:
-    """Get the make type for the given C/CPP utility type."""
-    log.debug(f"Getting make type for C/CPP utility: {util_type}")
+
+def _flags_env(profile: BuildProfile, extra: Sequence[str] = ()) -> dict[str, str]:
+    """The profile's flags as the variables make and configure scripts read."""
+    compile_flags, link_flags = PROFILE_FLAGS[profile]
+    flags = " ".join([*compile_flags, *extra])
+    return {
+        "CFLAGS": flags,
+        "CXXFLAGS": flags,
+        "FFLAGS": flags,
+        "FCFLAGS": flags,
+        "LDFLAGS": " ".join([*link_flags, *extra]),
+    }
+
+
+def _cmake_flags(profile: BuildProfile, extra: Sequence[str] = ()) -> list[str]:
+    """CMake cache entries that select the profile in a new or existing tree.
+
+    Every entry is always passed, so switching profiles reconfigures the
+    build tree instead of keeping the flags of the previous profile.
+    CMake also passes the language flags when it links executables.
+    """
+    native = ["-march=native"] if profile == BuildProfile.NATIVE else []
+    flags = " ".join([*native, *extra])
+    lto = "ON" if profile in (BuildProfile.NATIVE, BuildProfile.SIZE) else "OFF"
+    return [
+        f"-DCMAKE_BUILD_TYPE={CMAKE_BUILD_TYPES[profile]}",
+        *(f"-DCMAKE_{lang}_FLAGS={flags}" for lang in ("C", "CXX", "Fortran")),
+        f"-DCMAKE_INTERPROCEDURAL_OPTIMIZATION={lto}",
+    ]
+
+
+def handle_make_type(
+    util_type: UtilityType,
+    path: Path,
+    build_dir: Path,
+    profile: BuildProfile = BuildProfile.RELEASE,
+    pgo_flags: Sequence[str] = (),
+) -> CompilerCommand:
+    """Get the make type for the given C/CPP utility type.
+
+    make only looks at timestamps, so builds with PGO flags remake every
+    target to compile it with the flags of the current stage.
+    """
+    log.debug("Getting make type for C/CPP utility: %s", util_type)
+    make = ["make", "-B"] if pgo_flags else ["make"]
     match util_type:
         case UtilityType.MAKE:
             return CompilerCommand(
-                command=[["make", f"-j{os.cpu_count()}"]],
+                steps=[
+                    BuildStep(
+                        "build",
+                        make,
+                        inputs=[Path(".")],
+                        env=_flags_env(profile, pgo_flags),
+                    )
+                ],
                 compiler=Compilers.GCC,
+                profile=profile,
             )
         case UtilityType.CMAKE:
+            cmake_dir = build_dir / "cmake"
+            output = build_dir / "output" / "bin" / path.stem
+            config = CMAKE_BUILD_TYPES[profile]
+            strip = [] if profile == BuildProfile.DEBUG else ["--strip"]
             return CompilerCommand(
-                command=[
-                    [
-                        "cmake",
-                        "--build=.",
-                        f"--parallel={os.cpu_count()}",
-                    ],
-                    [
-                        "cmake",
-                        "--install=.",
-                        "--prefix=output",
-                        f"--parallel={os.cpu_count()}",
-                        "--strip",
-                    ],
+                steps=[
+                    BuildStep(
+                        "configure",
+                        [
+                            "cmake",
+                            "-S",
+                            ".",
+                            "-B",
+                            str(cmake_dir),
+                            *_cmake_flags(profile, pgo_flags),
+                        ],
+                        inputs=[Path("CMakeLists.txt")],
+                        outputs=[cmake_dir / "CMakeCache.txt"],
+                    ),
+                    BuildStep(
+                        "build",
+                        ["cmake", "--build", str(cmake_dir), "--config", config],
+                        inputs=[Path(".")],
+                    ),
+                    BuildStep(
+                        "install",
+                        [
+                            "cmake",
+                            "--install",
+                            str(cmake_dir),
+                            "--config",
+                            config,
+                            "--prefix",
+                            str(build_dir / "output"),
+                            *strip,
+                        ],
+                        outputs=[output],
+                    ),
                 ],
-                output=path / "output" / path.stem,
+                output=output,
+                build_dir=build_dir,
                 compiler=Compilers.GCC,
+                profile=profile,
             )
         case UtilityType.AUTOCONF:
             log.debug("Using configure script for C/CPP utility.")
+            output = build_dir / "output" / "bin" / path.stem
+            env = _flags_env(profile, pgo_flags)
             return CompilerCommand(
-                command=[
-                    ["./configure", "--prefix=output"],
-                    ["make", f"-j{os.cpu_count()}"],
+                steps=[
+                    BuildStep(
+                        "configure",
+                        ["./configure", f"--prefix={build_dir / 'output'}"],
+                        inputs=[Path("configure")],
+                        outputs=[Path("config.status"), Path("Makefile")],
+                        env=env,
+                    ),
+                    BuildStep("build", make, inputs=[Path(".")], env=env),
+                    BuildStep("install", ["make", "install"], outputs=[output], env=env),
                 ],
-                output=path / "output" / path.stem,
+                output=output,
+                build_dir=build_dir,
                 compiler=Compilers.CONF,
+                profile=profile,
             )
         case _:
             raise click.ClickException(
@@ -346,54 +931,90 @@ def handle_make_type(util_type: UtilityType, path: Path) -> CompilerCommand:
             )
 
 
-def handle_raw_compiler_command(util_type: UtilityType, path: Path) -> CompilerCommand:
+def _raw_compiler_steps(
+    compiler: str,
+    path: Path,
+    build_dir: Path,
+    profile: BuildProfile,
+    pgo_flags: Sequence[str] = (),
+) -> list[BuildStep]:
+    """Steps that compile a single source file with gcc, g++ or gfortran.
+
+    The source is compiled to an object file first and linked after, so
+    the built-in object cache can serve the compile step on its own.
+    """
+    compile_flags, link_flags = PROFILE_FLAGS[profile]
+    obj = build_dir / f"{path.stem}.o"
+    return [
+        BuildStep("prepare", ["mkdir", "-p", str(build_dir)], outputs=[build_dir]),
+        BuildStep(
+            "compile",
+            [
+                compiler,
+                "-Wall",
+                "-Wextra",
+                "-fPIC",
+                "-I.",
+                *compile_flags,
+                *pgo_flags,
+                "-c",
+                "-o",
+                str(obj),
+                path.name,
+            ],
+            inputs=[Path(path.name)],
+            outputs=[obj],
+        ),
+        BuildStep(
+            "link",
+            [
+                compiler,
+                *compile_flags,
+                *(flag for flag in link_flags if flag not in compile_flags),
+                *pgo_flags,
+                "-o",
+                str(build_dir / path.stem),
+                str(obj),
+            ],
+            inputs=[obj],
+            outputs=[build_dir / path.stem],
+        ),
+    ]
+
+
+def handle_raw_compiler_command(
+    util_type: UtilityType,
+    path: Path,
+    build_dir: Path,
+    profile: BuildProfile = BuildProfile.RELEASE,
+    pgo_flags: Sequence[str] = (),
+) -> CompilerCommand:
     """Get the raw compiler command for the given utility type."""
-    log.debug(f"Getting raw compiler command for utility type: {util_type}")
+    log.debug("Getting raw compiler command for utility type: %s", util_type)
     match util_type:
         case UtilityType.C:
             return CompilerCommand(
-                command=[
-                    [
-                        "gcc",
-                        "-W all",
-                        "-W extra",
-                        "-f PIC",
-                        "-I .",
-                        f"-o output/{path.stem}",
-                    ],
-                ],
-                output=path.parent / Path("output") / path.stem,
+                steps=_raw_compiler_steps("gcc", path, build_dir, profile, pgo_flags),
+                output=build_dir / path.stem,
+                build_dir=build_dir,
                 compiler=Compilers.GCC,
+                profile=profile,
             )
         case UtilityType.CPP:
             return CompilerCommand(
-                command=[
-                    [
-                        "g++",
-                        "-W all",
-                        "-W extra",
-                        "-f PIC",
-                        "-I .",
-                        f"-o output/{path.stem}",
-                    ]
-                ],
-                output=path.parent / "output" / path.stem,
+                steps=_raw_compiler_steps("g++", path, build_dir, profile, pgo_flags),
+                output=build_dir / path.stem,
+                build_dir=build_dir,
                 compiler=Compilers.GPP,
+                profile=profile,
             )
         case UtilityType.FORTRAN:
             return CompilerCommand(
-                command=[
-                    [
-                        "gfortran",
-                        "-W all",
-                        "-W extra",
-                        "-f PIC",
-                        "-I .",
-                        f"-o output/{path.stem}",
-                    ]
-                ],
-                output=path.parent / "output" / path.stem,
+                steps=_raw_compiler_steps("gfortran", path, build_dir, profile, pgo_flags),
+                output=build_dir / path.stem,
+                build_dir=build_dir,
                 compiler=Compilers.GFORTRAN,
+                profile=profile,
             )
         case _:
             raise click.ClickException(
@@ -403,56 +1024,419 @@ def handle_raw_compiler_command(util_type: UtilityType, path: Path) -> CompilerC
             )
 
 
-def find_compiled_output(path: Path) -> Path:
-    """Find the compiled output file in the given path."""
-    log.debug(f"Finding compiled output in path: {path}")
-    items: list[Path] = []
-    for item in path.glob("**/*"):
-        if item.is_file() and os.access(item, mode=os.X_OK | os.R_OK):
-            log.debug(f"Found compiled output: {item}")
-            items.append(item)
-    if len(items) == 1:
-        log.debug(f"Single compiled output found: {items[0]}")
-        return items[0]
-    if len(items) > 1:
-        log.debug(f"Multiple compiled outputs found: {items}")
-        for item in items:
-            if item.stem == path.stem:
-                log.debug(f"Returning output with matching stem: {item}")
-                return item
+def choose_output(candidates: list[Path], stem: str, where: Path) -> Path:
+    """Pick the compiled output named like the utility among candidates."""
+    if len(candidates) == 1:
+        log.debug("Single compiled output found: %s", candidates[0])
+        return candidates[0]
+    if not candidates:
+        raise click.ClickException(
+            error(
+                f"No compiled output found in {click.format_filename(where, shorten=True)}."
+            )
+        )
+    log.debug("Multiple compiled outputs found: %s", candidates)
+    wanted = stem.replace("_", "-").lower()
+    for item in candidates:
+        if item.stem == stem:
+            return item
+    for item in candidates:
+        if item.stem.replace("_", "-").lower() == wanted:
+            return item
+    found = "\n".join(
+        f"  {click.format_filename(item)}" for item in candidates
+    )
     raise click.ClickException(
         error(
-            f"No compiled output found in {click.format_filename(path, shorten=True)}."
+            f"Found {len(candidates)} executables in {click.format_filename(where, shorten=True)}, "
+            f"but none is named {stem}:\n{found}"
         )
     )
 
 
-def compiler_command(util_type: UtilityType, path: Path) -> CompilerCommand:
-    """Get the compiler command for the given utility type."""
-    log.debug(f"Getting compiler command for utility type: {util_type}")
+def find_compiled_output(path: Path, stem: Optional[str] = None) -> Path:
+    """Find the compiled output file in the given path.
+
+    The tree is walked with intermediate directories pruned, so this stays
+    cheap in large cargo and CMake build trees.
+    """
+    log.debug("Finding compiled output in path: %s", path)
+    with span("find compiled output", path=path) as s:
+        items = scan_executables(path)
+        s.set(candidates=len(items))
+    return choose_output(items, path.stem if stem is None else stem, path)
+
+
+def _cargo_env(profile: BuildProfile, rustflags: Sequence[str] = ()) -> dict[str, str]:
+    """Cargo profile overrides for the release build of a profile."""
+    env: dict[str, str] = {}
+    rustflags = list(rustflags)
+    if profile == BuildProfile.NATIVE:
+        rustflags.append("-Ctarget-cpu=native")
+    if rustflags:
+        env["RUSTFLAGS"] = " ".join([os.environ.get("RUSTFLAGS", ""), *rustflags]).strip()
+    if profile == BuildProfile.DEBUG:
+        return env
+    env["CARGO_PROFILE_RELEASE_STRIP"] = "symbols"
+    if profile in (BuildProfile.NATIVE, BuildProfile.SIZE):
+        env["CARGO_PROFILE_RELEASE_LTO"] = "fat"
+        env["CARGO_PROFILE_RELEASE_CODEGEN_UNITS"] = "1"
+    if profile == BuildProfile.SIZE:
+        env["CARGO_PROFILE_RELEASE_OPT_LEVEL"] = "z"
+    return env
+
+
+def _go_flags(profile: BuildProfile) -> list[str]:
+    """go build flags of a profile. The gc toolchain has no -march or LTO."""
+    if profile == BuildProfile.DEBUG:
+        return ["-gcflags=all=-N -l"]
+    return ["-trimpath", "-ldflags=-s -w"]
+
+
+def compiler_command(
+    util_type: UtilityType,
+    path: Path,
+    build_dir: Optional[Path] = None,
+    profile: BuildProfile = BuildProfile.RELEASE,
+    pgo_flags: Sequence[str] = (),
+) -> CompilerCommand:
+    """Get the compiler command for the given utility type.
+
+    Build output goes to build_dir, which defaults to the managed build
+    directory of the utility, so that later rebuilds are incremental.
+    profile picks the optimization, target CPU, LTO and stripping settings.
+    pgo_flags are passed to every compiler call, see PgoData.
+    """
+    log.debug("Getting compiler command for utility type: %s", util_type)
+    if build_dir is None:
+        build_dir = get_builds_dir() / utility_name(path)
+    profile = BuildProfile(profile)
     match util_type:
         case UtilityType.RUST:
+            cargo_profile = "debug" if profile == BuildProfile.DEBUG else "release"
+            release = [] if profile == BuildProfile.DEBUG else ["--release"]
+            output = build_dir / cargo_profile / path.stem
             return CompilerCommand(
-                command=[["cargo", "build", "--release", f"--jobs={os.cpu_count()}"]],
-                output=path / "target" / "release" / path.stem,
+                steps=[
+                    BuildStep(
+                        "build",
+                        ["cargo", "build", *release, "--target-dir", str(build_dir)],
+                        inputs=[Path(".")],
+                        outputs=[output],
+                        env=_cargo_env(profile, pgo_flags),
+                    )
+                ],
+                output=output,
+                build_dir=build_dir,
                 compiler=Compilers.RUST,
+                profile=profile,
             )
         case UtilityType.GO:
             return CompilerCommand(
-                command=[["go", "build", "-o output/", f"-p {os.cpu_count()}"]],
-                output=path / "output" / path.stem,
+                steps=[
+                    BuildStep(
+                        "build",
+                        ["go", "build", *_go_flags(profile), "-o", f"{build_dir}/"],
+                        inputs=[Path(".")],
+                        outputs=[build_dir / path.stem],
+                    )
+                ],
+                output=build_dir / path.stem,
+                build_dir=build_dir,
                 compiler=Compilers.GO,
+                profile=profile,
             )
         case UtilityType.C | UtilityType.CPP | UtilityType.FORTRAN:
-            return handle_raw_compiler_command(util_type, path)
+            return handle_raw_compiler_command(
+                util_type, path, build_dir, profile, pgo_flags
+            )
         case UtilityType.MAKE | UtilityType.CMAKE | UtilityType.AUTOCONF:
-            return handle_make_type(util_type, path)
+            return handle_make_type(util_type, path, build_dir, profile, pgo_flags)
+
+
+def run_build_step(
+    cmd: list[str],
+    cwd: Path,
+    jobs: Optional[int],
+    build_log: BuildLog,
+    env: Optional[dict[str, str]] = None,
+) -> None:
+    """Run one build command, streaming its output to the log and spinner.
+
+    The last few lines of output are shown under the spinner while the
+    command runs. env is added on top of the jobserver's environment.
+    """
+    label = f"{click.style('Running:', fg='magenta')} {' '.join(cmd)}"
+    build_log.section(" ".join(cmd))
+    parallel = Jobserver.is_parallel(cmd)
+    with span(" ".join(cmd), cwd=cwd), Jobserver(jobs, parallel) as jobserver:
+        log.debug("Running with %s job slots.", jobserver.slots)
+        with LiveTail(label) as tail, subprocess.Popen(
+            jobserver.command(cmd),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            text=True,
+            errors="replace",
+            bufsize=1,
+            cwd=cwd,
+            env={**jobserver.env(), **(env or {})},
+            pass_fds=jobserver.pass_fds,
+        ) as proc:
+            try:
+                for line in proc.stdout:
+                    build_log.write(line)
+                    tail.write(line)
+            except BaseException:
+                proc.kill()
+                raise
+            returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def _build_compiled(
+    comp_cmd: CompilerCommand,
+    utility: Path,
+    util_type: UtilityType,
+    jobs: Optional[int],
+    resume: bool,
+    compiler_cache: CompilerCache,
+) -> Path:
+    """Run the steps of a build plan and return the path of its output.
+
+    Every successful build step is checkpointed. With resume, steps whose
+    checkpoint is still valid are skipped up to the first step that failed
+    or whose inputs or outputs changed.
+    """
+    from halo import Halo
+
+    name = utility_name(utility)
+    cwd = utility if utility.is_dir() else utility.parent
+    checkpoints = Checkpoints.load(name)
+    steps = comp_cmd.steps
+    build_env = compiler_cache.env(util_type)
+    with BuildLog(name) as build_log:
+        skipping = resume
+        for i, step in enumerate(steps):
+            cmd = step.command
+            if skipping and checkpoints.is_complete(step, cwd):
+                log.debug("Build step %s is up to date. Skipping it.", step.name)
+                Halo().info(
+                    f"Step {i + 1} of {len(steps)} ({step.name}) is up to date. Skipping it."
+                )
+                continue
+            if skipping:
+                # Everything after a step that reruns has to run again.
+                skipping = False
+                checkpoints.invalidate(steps[i:])
+            msg = (
+                "Compilation succeeded!"
+                if i == len(steps) - 1
+                else f"Step {i + 1} of {len(steps)} ({step.name}) completed successfully!"
+            )
+            object_key = None
+            if step.outputs and compiler_cache.uses_builtin(cmd):
+                with span("object cache lookup") as s:
+                    object_key = compiler_cache.key(
+                        cmd, cwd, get_compiler_version(comp_cmd.compiler)
+                    )
+                    hit = object_key is not None and compiler_cache.restore(
+                        object_key, step.outputs[0]
+                    )
+                    s.set(hit=hit)
+                if hit:
+                    log.debug("Restored %s from the object cache.", step.outputs[0])
+                    checkpoints.complete(step, cwd)
+                    Halo().succeed(f"{msg} (object cache hit)")
+                    continue
+            log.debug("Running command: %s", cmd)
+            halo = Halo()
+            try:
+                run_build_step(
+                    compiler_cache.wrap(cmd),
+                    cwd=cwd,
+                    jobs=jobs,
+                    build_log=build_log,
+                    env={**build_env, **step.env},
+                )
+                if object_key is not None:
+                    compiler_cache.store(object_key, step.outputs[0])
+                checkpoints.complete(step, cwd)
+                halo.succeed(msg)
+            except (OSError, subprocess.CalledProcessError) as exc:
+                checkpoints.fail(step)
+                halo.fail(
+                    f"{click.style('Compilation failed:', fg='red', bold=True)} {' '.join(cmd)}"
+                )
+                reason = (
+                    f"exit code {exc.returncode}"
+                    if isinstance(exc, subprocess.CalledProcessError)
+                    else str(exc)
+                )
+                tail = "\n".join(build_log.tail)
+                raise click.ClickException(
+                    error(
+                        f"Compilation failed with {reason}:\n{tail}\n"
+                        f"Full build log: {click.format_filename(build_log.path)}\n"
+                        "Run again with --resume to continue from the failed step."
+                    )
+                ) from exc
+    output = comp_cmd.output
+    if output is None or not output.exists():
+        with span("discover outputs") as s:
+            candidates = discover_outputs(
+                util_type,
+                cwd,
+                comp_cmd.build_dir,
+                env={**build_env, **comp_cmd.env},
+                profile=comp_cmd.profile,
+            )
+            s.set(candidates=len(candidates))
+        if candidates:
+            output = choose_output(candidates, utility.stem, cwd)
+        elif comp_cmd.build_dir is not None and comp_cmd.build_dir.is_dir():
+            try:
+                output = find_compiled_output(comp_cmd.build_dir, utility.stem)
+            except click.ClickException:
+                output = find_compiled_output(cwd)
+        else:
+            output = find_compiled_output(cwd)
+        Halo().info(
+            "Expected output not found. Using "
+            f"{click.format_filename(output, shorten=True)}"
+            + (
+                " (reported by the build system)."
+                if candidates
+                else " (found by scanning the build tree)."
+            )
+        )
+    log.debug("Compiled output path: %s", output)
+    if not output.exists():
+        raise click.ClickException(
+            error(
+                f"Compiled output {click.format_filename(output, shorten=True)} does not exist."
+            )
+        )
+    return output
+
+
+def _train(
+    pgo_data: PgoData,
+    command: str,
+    utility: Path,
+    util_type: UtilityType,
+    profile: BuildProfile,
+    jobs: Optional[int],
+) -> None:
+    """Build an instrumented binary, train it and merge the profile data."""
+    from halo import Halo
+
+    pgo_data.reset()
+    instrumented = compiler_command(
+        util_type, utility, profile=profile, pgo_flags=pgo_data.generate_flags()
+    )
+    Halo().info("Building an instrumented binary for profile-guided optimization.")
+    # Objects built with other flags or profile data must not be reused.
+    binary = _build_compiled(
+        instrumented, utility, util_type, jobs, False, CompilerCache(mode="off")
+    )
+    Halo().info(f"Running the training workload: {command}")
+    try:
+        with span("pgo training", command=command):
+            pgo_data.train(command, binary, utility_name(binary), instrumented.env)
+        with span("pgo merge"):
+            pgo_data.merge()
+    except PgoError as e:
+        raise click.ClickException(error(str(e))) from e
+    Halo().succeed("Collected the profile data. Rebuilding with it applied.")
+
+
+def add_compiled_utility(
+    utility: Path,
+    util_type: UtilityType,
+    use_cache: bool = True,
+    jobs: Optional[int] = None,
+    update: bool = False,
+    resume: bool = False,
+    fetch: bool = True,
+    profile: BuildProfile = BuildProfile.RELEASE,
+    pgo: Optional[str] = None,
+    train: bool = True,
+) -> None:
+    """'add <language>' command implementation.
+
+    If an artifact store is configured and fetch is set, a prebuilt binary
+    for the same sources, profile and platform is installed instead of
+    building.
 
+    With pgo, the training command runs against an instrumented build and
+    the utility is rebuilt with the collected profile data. Unless train
+    is set, the profile data kept from an earlier training is applied
+    instead, if there is any.
+    """
+    from halo import Halo
 
-def add_compiled_utility(utility: Path, util_type: UtilityType) -> None:
-    """'add <language>' command implementation."""
-    log.debug(f"Adding compiled utility: {utility}")
-    comp_cmd = compiler_command(util_type, utility)
+    log.debug("Adding compiled utility: %s", utility)
+    name = utility_name(utility)
+    if not update and (get_utils_dir() / name).exists():
+        raise click.ClickException(
+            error(
+                f"{click.format_filename(name, shorten=True)} already exists in the utilities directory.",
+            )
+        )
+    pgo_data = None
+    if pgo is not None:
+        if util_type not in PGO_TYPES:
+            raise click.ClickException(
+                error(
+                    f"Profile-guided optimization is not supported for {util_type} utilities. "
+                    f"Supported types are: {', '.join(sorted(PGO_TYPES))}."
+                )
+            )
+        pgo_data = PgoData(name, util_type)
+        train = train or not pgo_data.exists()
+        # Prebuilt binaries were not trained on this workload.
+        fetch = False
+    comp_cmd = compiler_command(
+        util_type,
+        utility,
+        profile=profile,
+        pgo_flags=pgo_data.use_flags() if pgo_data is not None else (),
+    )
+    source_hash = ""
+    sources = None
+    store = open_store() if fetch else None
+    if use_cache or store is not None:
+        sources = source_digests(utility)
+        source_hash = hash_source_tree(utility, sources)
+    # Fetch before installing the compiler, so hosts that never build
+    # don't need one.
+    if store is not None:
+        with span("artifact fetch") as s:
+            prebuilt = fetch_prebuilt(
+                store, name, source_hash, util_type, comp_cmd.profile
+            )
+            s.set(hit=prebuilt is not None)
+        if prebuilt is not None:
+            click.echo(
+                click.style(
+                    f"Using a prebuilt binary from {store.location}.",
+                    fg="green",
+                    bold=True,
+                )
+            )
+            add_utility(
+                prebuilt,
+                copy=True,
+                update=update,
+                origin=utility,
+                util_type=util_type,
+                build_dir=None,
+                profile=comp_cmd.profile,
+                source=source_hash,
+            )
+            return
     halo = Halo(
         text="Installing compiler...",
         spinner="dots",
@@ -462,51 +1446,653 @@ def add_compiled_utility(utility: Path, util_type: UtilityType) -> None:
     halo.start()
     install_compiler(comp_cmd.compiler)
     halo.succeed("Compiler installed successfully!")
-    for i, cmd in enumerate(comp_cmd.command):
-        log.debug(f"Running command: {' '.join(cmd)}")
-        halo = Halo(
-            text=f"{click.style('Running:', fg='magenta')} {' '.join(cmd)}",
-            spinner="dots",
-            animation="marquee",
-            color="green",
-        )
-        halo.start()
-        try:
-            subprocess.run(
-                cmd,
-                capture_output=True,
-                shell=True,
-                check=True,
-                text=True,
-                cwd=utility if utility.is_dir() else utility.parent,
-            )
-            msg = ""
-            if i == len(comp_cmd.command) - 1:
-                msg = "Compilation succeeded!"
-            else:
-                msg = f"Step {i + 1} of {len(comp_cmd.command)} completed successfully!"
-            halo.succeed(msg)
-        except subprocess.CalledProcessError as exc:
-            halo.fail(
-                f"{click.style('Compilation failed:', fg='red', bold=True)} {exc.cmd}"
+    if pgo_data is not None and train:
+        _train(pgo_data, pgo, utility, util_type, comp_cmd.profile, jobs)
+    cache = BuildCache()
+    cache_key = ""
+    if use_cache:
+        cache_key = build_cache_key(
+            source_hash=source_hash,
+            util_type=util_type,
+            compiler_version=get_compiler_version(comp_cmd.compiler),
+            command=comp_cmd.command,
+            distro_id=get_inventory().distro,
+            profile=comp_cmd.profile,
+            pgo=pgo_data.digest() if pgo_data is not None else "",
+        )
+        with span("cache lookup") as s:
+            cached = cache.get(cache_key)
+            s.set(hit=cached is not None)
+        if cached is not None:
+            log.debug("Installing cached build: %s", cached)
+            click.echo(
+                click.style(
+                    "Sources unchanged since the last build. Using the cached build.",
+                    fg="green",
+                    bold=True,
+                )
             )
+            # Cached artifacts are never modified in place, so the
+            # installed copy may share their inode.
+            add_utility(
+                cached,
+                copy=True,
+                update=update,
+                origin=utility,
+                util_type=util_type,
+                build_dir=comp_cmd.build_dir,
+                allow_hardlink=True,
+                profile=comp_cmd.profile,
+                pgo=pgo,
+                source=source_hash or None,
+            )
+            return
+    # The object caches don't key objects by the profile data they applied.
+    compiler_cache = get_compiler_cache() if pgo_data is None else CompilerCache(mode="off")
+    comp_cmd.output = _build_compiled(
+        comp_cmd, utility, util_type, jobs, resume, compiler_cache
+    )
+    if sources is not None:
+        # Keep what the build wrote into the source tree out of the hash
+        # of the next build, which would never hit the cache otherwise.
+        record_generated(utility, sources)
+    if use_cache:
+        with span("cache store"):
+            cache.put(cache_key, comp_cmd.output)
+    log.debug("Adding compiled utility to utilities directory: %s", comp_cmd.output)
+    # Copy rather than move so the build directory stays intact for
+    # incremental rebuilds.
+    add_utility(
+        comp_cmd.output,
+        copy=True,
+        update=update,
+        origin=utility,
+        util_type=util_type,
+        build_dir=comp_cmd.build_dir,
+        profile=comp_cmd.profile,
+        pgo=pgo,
+        source=source_hash or None,
+    )
+    if comp_cmd.build_dir is not None and comp_cmd.build_dir.is_dir():
+        with span("record usage"):
+            with BuildUsage.locked() as usage:
+                usage.record(name, comp_cmd.build_dir, origin=utility)
+    auto_gc()
+
+
+def auto_gc() -> None:
+    """Collect garbage down to 'UTILS_GC_QUOTA' after a build, if it is set."""
+    quota = gc_quota()
+    if quota is None:
+        return
+    with span("gc", quota=quota) as s:
+        evicted, _ = collect(quota)
+        s.set(evicted=len(evicted))
+    if evicted:
+        echo = click.style("Freed ", fg="cyan")
+        echo += click.style(
+            format_size(sum(item.size for item in evicted)), fg="magenta", bold=True
+        )
+        echo += click.style(
+            f" by evicting {len(evicted)} least recently used build dirs and cache entries"
+            f" (quota {format_size(quota)}).",
+            fg="cyan",
+        )
+        click.echo(echo)
+        click.echo()
+
+
+def fetch_prebuilt(
+    store: ArtifactStore,
+    name: str,
+    source_hash: str,
+    util_type: UtilityType,
+    profile: BuildProfile = BuildProfile.RELEASE,
+) -> Optional[Path]:
+    """Fetch the prebuilt binary of name for this platform, if published."""
+    key = artifact_key(
+        source_hash, util_type, platform_id(get_inventory().distro, profile), profile
+    )
+    meta = store.get_meta(name, key)
+    if meta is None:
+        log.debug("No prebuilt %s with key %s in %s", name, key, store.location)
+        return None
+    try:
+        return store.fetch(meta)
+    except DownloadError as e:
+        log.warning("Failed to fetch the prebuilt %s: %s", name, e)
+        return None
+
+
+def cache_stats_cmd() -> None:
+    """'cache stats' command implementation."""
+    cache = BuildCache()
+    entries = cache.entries()
+    total = sum(e.size for e in entries)
+    echo = click.style("Build cache: ", fg="cyan")
+    echo += click.style(click.format_filename(cache.root), fg="magenta", bold=True)
+    click.echo(echo)
+    echo = click.style("Entries: ", fg="cyan")
+    echo += click.style(str(len(entries)), fg="magenta", bold=True)
+    click.echo(echo)
+    echo = click.style("Size: ", fg="cyan")
+    echo += click.style(
+        f"{format_size(total)} / {format_size(cache.max_size)}",
+        fg="magenta",
+        bold=True,
+    )
+    click.echo(echo)
+    for entry in entries:
+        click.echo(
+            f"  {click.style(entry.name, fg='cyan', bold=True)} "
+            f"{click.style(entry.key[:12], fg='yellow')} "
+            f"{format_size(entry.size)}"
+        )
+    click.echo()
+    compiler_cache = get_compiler_cache()
+    echo = click.style("Object cache: ", fg="cyan")
+    echo += click.style(
+        click.format_filename(compiler_cache.root), fg="magenta", bold=True
+    )
+    echo += click.style(f" (limit {format_size(compiler_cache.max_size)} each)", dim=True)
+    click.echo(echo)
+    for backend, counts in compiler_cache.stats().items():
+        hits, misses = counts.get("hits", 0), counts.get("misses", 0)
+        rate = f"{hits / (hits + misses):.0%}" if hits + misses else "-"
+        click.echo(
+            f"  {click.style(backend, fg='cyan', bold=True)} "
+            f"{click.style(f'{hits} hits', fg='green')}, "
+            f"{click.style(f'{misses} misses', fg='yellow')} "
+            f"({rate}), {format_size(counts.get('size', 0))}"
+        )
+    click.echo()
+
+
+def cache_prune_cmd(max_size: Optional[int] = None) -> None:
+    """'cache prune' command implementation."""
+    cache = BuildCache()
+    evicted = cache.prune(max_size)
+    evicted += get_compiler_cache().builtin.prune(max_size)
+    freed = sum(e.size for e in evicted)
+    echo = click.style("Evicted ", fg="cyan")
+    echo += click.style(str(len(evicted)), fg="magenta", bold=True)
+    echo += click.style(" cached builds and objects, freeing ", fg="cyan")
+    echo += click.style(format_size(freed), fg="magenta", bold=True)
+    echo += click.style(".", fg="cyan")
+    click.echo(echo)
+    click.echo()
+
+
+def rebuild_utilities(
+    names: Iterable[str],
+    all_: bool = False,
+    use_cache: bool = True,
+    jobs: Optional[int] = None,
+    resume: bool = False,
+    fetch: bool = True,
+    profile: Optional[BuildProfile] = None,
+    pgo: Optional[str] = None,
+) -> None:
+    """'rebuild' command implementation.
+
+    Utilities are rebuilt with the profile they were added with, unless
+    profile is given. Utilities added with PGO get their kept profile data
+    applied again, while pgo trains them anew with another command.
+    """
+    utils_path = get_utils_dir()
+    manifest = Manifest.load(utils_path)
+    if all_:
+        # Utilities restored from a bundle keep their type, but have no
+        # source to build from.
+        entries = [e for e in manifest if e.type is not None and e.origin is not None]
+    else:
+        entries = []
+        for name in names:
+            name = name.replace("_", "-").lower()
+            entry = manifest.entries.get(name)
+            if entry is None:
+                raise click.ClickException(
+                    error(
+                        f"{click.format_filename(name, shorten=True)} does not exist in the utilities directory."
+                    )
+                )
+            entries.append(entry)
+    if not entries:
+        raise click.ClickException(error("No compiled utilities to rebuild."))
+    for entry in entries:
+        if entry.type is None or entry.origin is None:
+            raise click.ClickException(
+                error(f"{entry.name} was not installed from a compiled source.")
+            )
+        origin = Path(entry.origin)
+        if not origin.exists():
             raise click.ClickException(
                 error(
-                    f"Compilation failed with exit code {exc.returncode}:\n{exc.output}"
+                    f"The source of {entry.name} no longer exists: {click.format_filename(origin)}"
                 )
             )
-    if comp_cmd.output is None or not (
-        comp_cmd.output is not None and comp_cmd.output.exists()
-    ):
-        comp_cmd.output = find_compiled_output(
-            utility if utility.is_dir() else utility.parent
+    for entry in entries:
+        echo = click.style("Rebuilding ", fg="cyan")
+        echo += click.style(entry.name, fg="magenta", bold=True)
+        echo += click.style(
+            f" from {click.format_filename(entry.origin, shorten=True)}", fg="cyan"
         )
-    log.debug(f"Compiled output path: {comp_cmd.output}")
-    if not comp_cmd.output.exists():
+        click.echo(echo)
+        with span("rebuild", utility=entry.name):
+            add_compiled_utility(
+                Path(entry.origin),
+                UtilityType(entry.type),
+                use_cache=use_cache,
+                jobs=jobs,
+                update=True,
+                resume=resume,
+                fetch=fetch,
+                profile=profile or entry.profile or BuildProfile.RELEASE,
+                pgo=pgo or entry.pgo,
+                train=pgo is not None,
+            )
+
+
+def _open_store_or_fail(location: Optional[str]) -> ArtifactStore:
+    store = open_store(location)
+    if store is None:
         raise click.ClickException(
-            error(
-                f"Compiled output {click.format_filename(comp_cmd.output, shorten=True)} does not exist."
+            error("No artifact store configured. Use --store or set UTILS_ARTIFACT_STORE.")
+        )
+    return store
+
+
+def publish_cmd(
+    names: Iterable[str], all_: bool = False, store_location: Optional[str] = None
+) -> None:
+    """'publish' command implementation.
+
+    Only builds that are still in the build cache are published, under the
+    hash their sources had before they were built, so a store never serves
+    a binary under the wrong key.
+    Utilities built with PGO are skipped: they were trained on this host's
+    workload, which the artifact key doesn't capture.
+    """
+    store = _open_store_or_fail(store_location)
+    utils_path = get_utils_dir()
+    manifest = Manifest.load(utils_path)
+    if all_:
+        # Utilities restored from a bundle keep their type, but have no
+        # source to build from.
+        entries = [e for e in manifest if e.type is not None and e.origin is not None]
+    else:
+        entries = []
+        for name in names:
+            name = name.replace("_", "-").lower()
+            entry = manifest.entries.get(name)
+            if entry is None:
+                raise click.ClickException(
+                    error(
+                        f"{click.format_filename(name, shorten=True)} does not exist in the utilities directory."
+                    )
+                )
+            if entry.type is None or entry.origin is None:
+                raise click.ClickException(
+                    error(f"{entry.name} was not installed from a compiled source.")
+                )
+            entries.append(entry)
+    if not entries:
+        raise click.ClickException(error("No compiled utilities to publish."))
+    cache = BuildCache()
+    distro = get_inventory().distro
+    for entry in entries:
+        if entry.pgo is not None:
+            echo = click.style("Skipping ", fg="yellow")
+            echo += click.style(entry.name, fg="magenta", bold=True)
+            echo += click.style(
+                ": it was built with PGO, and only plain builds are published.",
+                fg="yellow",
+            )
+            click.echo(echo)
+            continue
+        origin = Path(entry.origin)
+        util_type = UtilityType(entry.type)
+        if not origin.exists():
+            raise click.ClickException(
+                error(
+                    f"The source of {entry.name} no longer exists: {click.format_filename(origin)}"
+                )
             )
+        comp_cmd = compiler_command(
+            util_type, origin, profile=entry.profile or BuildProfile.RELEASE
+        )
+        compiler_version = get_compiler_version(comp_cmd.compiler)
+        # The hash taken before the build is the one a clean copy of the
+        # sources has, so it is the key fetch looks for.
+        source_hash = entry.source or hash_source_tree(origin)
+        cached = cache.get(
+            build_cache_key(
+                source_hash=source_hash,
+                util_type=util_type,
+                compiler_version=compiler_version,
+                command=comp_cmd.command,
+                distro_id=distro,
+                profile=comp_cmd.profile,
+            )
+        )
+        if cached is None:
+            raise click.ClickException(
+                error(
+                    f"The build of {entry.name} is no longer in the build cache. "
+                    f"Run 'utils rebuild {entry.name}' first."
+                )
+            )
+        meta = ArtifactMeta.for_binary(
+            entry.name,
+            cached,
+            source_hash,
+            util_type,
+            distro,
+            compiler=compiler_version,
+            profile=comp_cmd.profile,
+        )
+        with span("publish", utility=entry.name):
+            try:
+                store.publish(cached, meta)
+            except (OSError, DownloadError) as e:
+                raise click.ClickException(
+                    error(f"Failed to publish {entry.name}: {e}")
+                ) from e
+        echo = click.style("Published ", fg="cyan")
+        echo += click.style(entry.name, fg="magenta", bold=True)
+        echo += click.style(
+            f" ({meta.profile}) for {meta.arch}/{meta.distro}/{meta.libc} to ", fg="cyan"
+        )
+        echo += click.style(store.location, fg="magenta", bold=True)
+        click.echo(echo)
+    click.echo()
+
+
+def fetch_cmd(
+    sources: Iterable[Path],
+    util_type: UtilityType,
+    update: bool = False,
+    store_location: Optional[str] = None,
+    profile: BuildProfile = BuildProfile.RELEASE,
+) -> None:
+    """'fetch' command implementation."""
+    store = _open_store_or_fail(store_location)
+    for source in sources:
+        name = utility_name(source)
+        if not update and (get_utils_dir() / name).exists():
+            raise click.ClickException(
+                error(
+                    f"{click.format_filename(name, shorten=True)} already exists in the utilities directory.",
+                )
+            )
+        source_hash = hash_source_tree(source)
+        with span("artifact fetch", utility=name):
+            key = artifact_key(
+                source_hash,
+                util_type,
+                platform_id(get_inventory().distro, profile),
+                profile,
+            )
+            meta = store.get_meta(name, key)
+            if meta is None:
+                raise click.ClickException(
+                    error(
+                        f"No prebuilt {name} ({profile}) for these sources and this platform in {store.location}."
+                    )
+                )
+            try:
+                prebuilt = store.fetch(meta)
+            except DownloadError as e:
+                raise click.ClickException(error(str(e))) from e
+        add_utility(
+            prebuilt,
+            copy=True,
+            update=update,
+            origin=source,
+            util_type=util_type,
+            build_dir=None,
+            profile=profile,
+            source=source_hash,
+        )
+
+
+def export_cmd(output: Path, fmt: Optional[str] = None, level: Optional[int] = None) -> None:
+    """'export' command implementation. An output of '-' writes to stdout."""
+    import sys
+    from utils.bundle import BundleError, default_format, export_bundle
+
+    to_stdout = str(output) == "-"
+    fmt = fmt or default_format(None if to_stdout else output)
+    utils_path = get_utils_dir()
+    try:
+        if to_stdout:
+            with span("export", format=fmt):
+                stats = export_bundle(utils_path, sys.stdout.buffer, fmt, level)
+            sys.stdout.buffer.flush()
+        else:
+            output = output.resolve()
+            tmp = output.with_name(f".{output.name}.{os.getpid()}.tmp")
+            try:
+                with span("export", format=fmt), open(tmp, "wb") as f:
+                    stats = export_bundle(utils_path, f, fmt, level)
+                os.replace(tmp, output)
+            finally:
+                tmp.unlink(missing_ok=True)
+    except (OSError, BundleError) as e:
+        raise click.ClickException(error(f"Failed to export the utilities: {e}")) from e
+    echo = click.style("Exported ", fg="cyan")
+    echo += click.style(str(stats.utilities), fg="magenta", bold=True)
+    echo += click.style(" utilities (", fg="cyan")
+    echo += click.style(str(stats.objects), fg="magenta", bold=True)
+    echo += click.style(f" distinct files, {format_size(stats.size)}", fg="cyan")
+    if not to_stdout:
+        echo += click.style(
+            f", {format_size(output.stat().st_size)} {fmt} compressed", fg="cyan"
         )
-    log.debug(f"Adding compiled utility to utilities directory: {comp_cmd.output}")
-    add_utility(comp_cmd.output, copy=False, update=False)
+    echo += click.style(") to ", fg="cyan")
+    echo += click.style(
+        "stdout" if to_stdout else click.format_filename(output, shorten=True),
+        fg="magenta",
+        bold=True,
+    )
+    echo += click.style(".", fg="cyan")
+    # Keep stdout clean for the bundle itself.
+    click.echo(echo, err=to_stdout)
+
+
+def import_cmd(source: Path, update: bool = False, jobs: Optional[int] = None) -> None:
+    """'import' command implementation. A source of '-' reads from stdin."""
+    import sys
+    from utils.bundle import BundleError, import_bundle
+
+    utils_path = get_utils_dir()
+    try:
+        with span("import"):
+            if str(source) == "-":
+                result = import_bundle(sys.stdin.buffer, utils_path, update, jobs)
+            else:
+                with open(source, "rb") as f:
+                    result = import_bundle(f, utils_path, update, jobs)
+    except (OSError, BundleError) as e:
+        raise click.ClickException(error(f"Failed to import the utilities: {e}")) from e
+    for kind, color in (("added", "green"), ("updated", "yellow")):
+        for name in getattr(result, kind):
+            echo = click.style(f"{kind.capitalize()}: ", fg=color, bold=True)
+            echo += click.style(name, fg="cyan")
+            click.echo(echo)
+    echo = click.style("Imported ", fg="cyan")
+    echo += click.style(str(len(result.added) + len(result.updated)), fg="magenta", bold=True)
+    echo += click.style(" utilities, ", fg="cyan")
+    echo += click.style(str(len(result.unchanged)), fg="magenta", bold=True)
+    echo += click.style(" already up to date.", fg="cyan")
+    click.echo(echo)
+    click.echo()
+
+
+def gc_cmd(max_size: Optional[int] = None, dry_run: bool = False) -> None:
+    """'gc' command implementation."""
+    quota = max_size if max_size is not None else gc_quota()
+    if quota is None:
+        raise click.ClickException(
+            error("No quota given. Use --max-size or set UTILS_GC_QUOTA.")
+        )
+    with span("gc", quota=quota):
+        evicted, total = collect(quota, dry_run=dry_run)
+    for item in evicted:
+        echo = click.style("Would evict " if dry_run else "Evicted ", fg="yellow")
+        echo += click.style(f"{item.kind} ", fg="cyan")
+        echo += click.style(item.name, fg="magenta", bold=True)
+        echo += click.style(f" ({format_size(item.size)})", dim=True)
+        click.echo(echo)
+    freed = sum(item.size for item in evicted)
+    echo = click.style("Would free " if dry_run else "Freed ", fg="cyan")
+    echo += click.style(format_size(freed), fg="magenta", bold=True)
+    echo += click.style(
+        f" of {format_size(total)}, leaving {format_size(total - freed)}"
+        f" (quota {format_size(quota)}).",
+        fg="cyan",
+    )
+    click.echo(echo)
+    click.echo()
+
+
+def du_cmd() -> None:
+    """'du' command implementation."""
+    import time
+    from rich.console import Console
+    from rich.table import Table
+    from utils.dir import get_cache_dir
+
+    utils_path = get_utils_dir()
+    manifest = Manifest.load(utils_path)
+    with span("measure build dirs"), BuildUsage.locked() as usage:
+        for record in usage.records.values():
+            record.size = disk_usage(Path(record.path))
+        usage.save()
+        # Build dirs are named after the sources, which may differ from the
+        # name the utility was installed under.
+        installed_as = {e.build_dir: e.name for e in manifest if e.build_dir}
+        records = {
+            installed_as.get(r.path, r.name): r
+            for r in [*usage.records.values(), *usage.untracked()]
+        }
+    cached: dict[str, int] = {}
+    for cache_entry in BuildCache().entries():
+        name = utility_name(Path(cache_entry.name))
+        cached[name] = cached.get(name, 0) + cache_entry.size
+    names = sorted(
+        {e.name for e in manifest if e.type is not None} | records.keys() | cached.keys()
+    )
+
+    table = Table(title="Disk usage by utility", title_justify="left")
+    table.add_column("Utility", style="bold cyan")
+    table.add_column("Installed", justify="right")
+    table.add_column("Build dir", justify="right")
+    table.add_column("Cached builds", justify="right")
+    table.add_column("Last built", style="dim")
+    totals = [0, 0, 0]
+    for name in names:
+        entry = manifest.entries.get(name)
+        record = records.get(name)
+        sizes = [
+            entry.size if entry is not None else 0,
+            record.size if record is not None else 0,
+            cached.get(name, 0),
+        ]
+        totals = [a + b for a, b in zip(totals, sizes)]
+        last = (
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(record.last_used))
+            if record is not None
+            else ""
+        )
+        table.add_row(
+            name if entry is not None else f"{name} [dim](removed)[/dim]",
+            *(format_size(size) if size else "-" for size in sizes),
+            last,
+        )
+    table.add_section()
+    table.add_row("Total", *(format_size(size) for size in totals), "")
+    console = Console()
+    console.print(table)
+
+    cache_dir = get_cache_dir()
+    objects = get_compiler_cache().root
+    shared = {
+        "Build cache": BuildCache().root,
+        "Object cache (builtin)": objects / "builtin",
+        "Object cache (ccache)": objects / "ccache",
+        "Object cache (sccache)": objects / "sccache",
+        "Downloads": cache_dir / "downloads",
+        "Fetched artifacts": cache_dir / "artifacts",
+        "Build logs": cache_dir / "logs",
+        "Checkpoints": cache_dir / "checkpoints",
+    }
+    table = Table(title="Shared caches", title_justify="left")
+    table.add_column("Cache", style="bold cyan")
+    table.add_column("Path", style="magenta")
+    table.add_column("Size", justify="right")
+    total = 0
+    with span("measure caches"):
+        for label, path in shared.items():
+            size = disk_usage(path) if path.exists() else 0
+            total += size
+            table.add_row(label, str(path), format_size(size) if size else "-")
+    table.add_section()
+    table.add_row("Total", "", format_size(total))
+    console.print(table)
+    quota = gc_quota()
+    if quota is not None:
+        click.echo(f"Garbage collection quota: {format_size(quota)} (UTILS_GC_QUOTA)")
+    click.echo()
+
+
+def toolchains_cmd(refresh: bool = False) -> None:
+    """'toolchains' command implementation."""
+    from rich.console import Console
+    from rich.table import Table
+
+    inventory = get_inventory(refresh=refresh)
+    table = Table(
+        title=f"Toolchains on {inventory.distro}",
+        title_justify="left",
+    )
+    table.add_column("Compiler", style="bold cyan")
+    table.add_column("Path", style="magenta")
+    table.add_column("Version")
+    for name, toolchain in sorted(inventory.toolchains.items()):
+        if toolchain.installed:
+            table.add_row(name, toolchain.path, toolchain.version)
+        else:
+            table.add_row(name, "[red]not installed[/red]", "")
+    Console().print(table)
+
+
+def doctor_cmd() -> None:
+    """'doctor' command implementation."""
+    from utils.dir import UTILS_DIR, create_utils_dir, add_utils_to_path, utils_in_path
+
+    def report(ok: bool, message: str) -> None:
+        mark = click.style("✔", fg="green") if ok else click.style("✖", fg="yellow")
+        click.echo(f"{mark} {message}")
+
+    exists = UTILS_DIR.is_dir()
+    report(exists, f"Utilities directory: {click.format_filename(UTILS_DIR)}")
+    if not exists:
+        create_utils_dir()
+    report(utils_in_path(), "Utilities directory is on PATH")
+    # Ignore the recorded state and scan the rc file again.
+    add_utils_to_path(force=True)
+    manifest = Manifest.load(UTILS_DIR)
+    if manifest.exists:
+        _, drift = reindex(UTILS_DIR)
+        clean = not any(drift.values())
+        report(
+            clean,
+            "Manifest matches the utilities directory"
+            if clean
+            else "Manifest was out of date and has been rebuilt",
+        )
+    else:
+        reindex(UTILS_DIR)
+        report(False, "Manifest was missing and has been rebuilt")
+    click.echo()
@@ -0,0 +1,6 @@
+"""Lazily loaded subcommands of the 'utils' command group.
+
+Each module in this package only defines the click command and its
+arguments. The implementation (and any heavy dependencies) is imported
+inside the command callback so startup stays cheap.
+"""
@@ -0,0 +1,163 @@
+from utils.click import click
+from utils.log import get_level, LOG_FORMAT
+from utils.types import BuildProfile, UtilityType
+from pathlib import Path
+import logging
+from typing import Optional
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+
+def _add(utilities: tuple[Path, ...], copy: bool, force: bool) -> None:
+    """Add one file with the detailed message, or many with a summary table."""
+    if len(utilities) == 1 and utilities[0].is_file():
+        from utils.cmds import add_utility
+
+        add_utility(utilities[0], copy, update=force)
+    else:
+        from utils.cmds import add_utilities
+
+        add_utilities(utilities, copy, update=force)
+
+
+@click.command(no_args_is_help=True)
+@click.argument(
+    "utilities",
+    metavar="UTILITY...",
+    nargs=-1,
+    required=True,
+    type=click.Path(
+        exists=False,
+        dir_okay=True,
+        file_okay=True,
+        path_type=Path,
+        allow_dash=False,
+    ),
+)
+@click.option(
+    "--compile",
+    type=click.Choice(
+        UtilityType.ls(),
+        case_sensitive=False,
+    ),
+    help="Optional. The type of utility to compile.",
+)
+@click.option(
+    "--force", "-f", is_flag=True, help="Force overwrite if utility already exists."
+)
+@click.option("--copy", "-c", is_flag=True, help="Copy the file instead of move it.")
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Always rebuild compiled utilities instead of using the build cache.",
+)
+@click.option(
+    "--no-fetch",
+    is_flag=True,
+    help="Build even if the artifact store has a prebuilt binary.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    envvar="UTILS_JOBS",
+    help="Maximum parallel jobs shared by all running builds. Defaults to the CPU count.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Skip build steps that already succeeded and whose inputs are unchanged.",
+)
+@click.option(
+    "--profile",
+    type=click.Choice(BuildProfile.ls(), case_sensitive=False),
+    default="release",
+    show_default=True,
+    help="Build profile of compiled utilities: debug info, optimized, tuned to this CPU or small.",
+)
+@click.option(
+    "--pgo",
+    metavar="COMMAND",
+    type=str,
+    help="Optimize compiled utilities for a training workload. COMMAND runs in a shell "
+    "with the instrumented utility first on PATH.",
+)
+def add(
+    utilities: tuple[Path, ...],
+    compile: Optional[str] = None,
+    force: bool = False,
+    copy: bool = False,
+    no_cache: bool = False,
+    no_fetch: bool = False,
+    jobs: Optional[int] = None,
+    resume: bool = False,
+    profile: str = "release",
+    pgo: Optional[str] = None,
+) -> None:
+    """Installs the specified utilities to the user's utilities directory.
+
+    This command will move the specified utilities to the user's utilities
+    directory, removing the file extension is any exist, replacing any
+    underscores with dashes, make the name lowercase, and ensuring the
+    file is executable. Each UTILITY may be a file, a directory whose files
+    are all installed, or a glob pattern.
+    """
+    log.debug("Executing 'add' command.")
+    if pgo is not None and compile is None:
+        raise click.UsageError("--pgo only applies to utilities added with --compile.")
+    if compile is not None:
+        from utils.cmds import add_compiled_utility
+
+        log.debug("Compiling utility of type: %s", compile)
+        try:
+            compile = UtilityType(compile.strip().lower())
+        except ValueError as e:
+            log.error("Invalid utility type: %s. Error: %s", compile, e)
+            raise click.BadParameter(f"Invalid utility type: {compile}.") from e
+        for utility in utilities:
+            if not utility.exists():
+                raise click.BadParameter(
+                    f"{click.format_filename(utility)} does not exist.",
+                    param_hint="UTILITY",
+                )
+        for utility in utilities:
+            add_compiled_utility(
+                utility.resolve(),
+                compile,
+                use_cache=not no_cache,
+                jobs=jobs,
+                update=force,
+                resume=resume,
+                fetch=not (no_cache or no_fetch),
+                profile=BuildProfile(profile.lower()),
+                pgo=pgo,
+            )
+    else:
+        _add(utilities, copy, force)
+
+
+@click.command(hidden=True, no_args_is_help=True)
+@click.argument(
+    "utilities",
+    metavar="UTILITY...",
+    nargs=-1,
+    required=True,
+    type=click.Path(
+        exists=False,
+        dir_okay=True,
+        file_okay=True,
+        path_type=Path,
+        allow_dash=False,
+    ),
+)
+@click.option(
+    "--force", "-f", is_flag=True, help="Force overwrite if utility already exists."
+)
+@click.option("--copy", "-c", is_flag=True, help="Copy the file instead of move it.")
+def install(
+    utilities: tuple[Path, ...], force: bool = False, copy: bool = False
+) -> None:
+    """Alias for 'add'."""
+    log.debug("Executing 'add' command.")
+    _add(utilities, copy, force)
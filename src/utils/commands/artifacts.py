@@ -0,0 +1,97 @@
+from utils.click import click
+from utils.log import get_level, LOG_FORMAT
+from utils.types import BuildProfile, UtilityType
+from pathlib import Path
+import logging
+from typing import Optional
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+_STORE_HELP = (
+    "Artifact store: a directory or an http(s) URL. Defaults to UTILS_ARTIFACT_STORE."
+)
+
+
+@click.command()
+@click.argument("utilities", metavar="[UTILITY]...", nargs=-1, type=str)
+@click.option("--all", "all_", is_flag=True, help="Publish every compiled utility.")
+@click.option("--store", type=str, help=_STORE_HELP)
+def publish(
+    utilities: tuple[str, ...],
+    all_: bool = False,
+    store: Optional[str] = None,
+) -> None:
+    """Publish compiled utilities to a shared artifact store.
+
+    Binaries are keyed by their source hash, type, build profile,
+    architecture, distro and C library (and CPU, for native builds), so other hosts with the same platform can fetch them
+    instead of building. Publishing over HTTP uses PUT and sends
+    UTILS_ARTIFACT_TOKEN as a bearer token if set.
+    """
+    from utils.cmds import publish_cmd
+
+    log.debug("Executing 'publish' command.")
+    if not utilities and not all_:
+        raise click.UsageError("Specify at least one UTILITY or --all.")
+    publish_cmd(utilities, all_=all_, store_location=store)
+
+
+@click.command(no_args_is_help=True)
+@click.argument(
+    "utilities",
+    metavar="UTILITY...",
+    nargs=-1,
+    required=True,
+    type=click.Path(
+        exists=True,
+        dir_okay=True,
+        file_okay=True,
+        path_type=Path,
+        allow_dash=False,
+    ),
+)
+@click.option(
+    "--compile",
+    "util_type",
+    required=True,
+    type=click.Choice(
+        UtilityType.ls(),
+        case_sensitive=False,
+    ),
+    help="The type of utility the sources would be compiled as.",
+)
+@click.option(
+    "--force", "-f", is_flag=True, help="Force overwrite if utility already exists."
+)
+@click.option("--store", type=str, help=_STORE_HELP)
+@click.option(
+    "--profile",
+    type=click.Choice(BuildProfile.ls(), case_sensitive=False),
+    default="release",
+    show_default=True,
+    help="Build profile of the prebuilt binary.",
+)
+def fetch(
+    utilities: tuple[Path, ...],
+    util_type: str,
+    force: bool = False,
+    store: Optional[str] = None,
+    profile: str = "release",
+) -> None:
+    """Install prebuilt utilities from a shared artifact store.
+
+    Each UTILITY is the source that would be compiled. It is hashed to find
+    a binary published for the same sources and platform, without
+    installing a compiler or building anything.
+    """
+    from utils.cmds import fetch_cmd
+
+    log.debug("Executing 'fetch' command.")
+    fetch_cmd(
+        [utility.resolve() for utility in utilities],
+        UtilityType(util_type.strip().lower()),
+        update=force,
+        store_location=store,
+        profile=BuildProfile(profile.lower()),
+    )
@@ -0,0 +1,63 @@
+from utils.click import click
+from utils.log import get_level, LOG_FORMAT
+from pathlib import Path
+import logging
+from typing import Optional
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+
+@click.command(no_args_is_help=True)
+@click.argument(
+    "output",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path, allow_dash=True),
+)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(("zstd", "xz"), case_sensitive=False),
+    help="Compression. Defaults to the file suffix, else zstd when available.",
+)
+@click.option(
+    "--level",
+    type=click.IntRange(min=0, max=22),
+    help="Compression level (zstd: 1-22, xz: 0-9).",
+)
+def export(output: Path, fmt: Optional[str] = None, level: Optional[int] = None) -> None:
+    """Pack every utility and its metadata into one compressed bundle.
+
+    Identical files are stored once. Use '-' as OUTPUT to write to stdout,
+    e.g. 'utils export - | ssh host utils import -'.
+    """
+    from utils.cmds import export_cmd
+
+    log.debug("Executing 'export' command.")
+    export_cmd(output, fmt.lower() if fmt else None, level)
+
+
+@click.command(name="import", no_args_is_help=True)
+@click.argument(
+    "bundle",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path, allow_dash=True),
+)
+@click.option(
+    "--force", "-f", is_flag=True, help="Replace utilities that already exist."
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    envvar="UTILS_JOBS",
+    help="Number of files written in parallel.",
+)
+def import_(bundle: Path, force: bool = False, jobs: Optional[int] = None) -> None:
+    """Restore the utilities from a bundle made by 'utils export'.
+
+    Files are written in parallel, each atomically and with its original
+    permissions. Use '-' as BUNDLE to read from stdin.
+    """
+    from utils.cmds import import_cmd
+
+    log.debug("Executing 'import' command.")
+    import_cmd(bundle, update=force, jobs=jobs)
@@ -0,0 +1,46 @@
+from utils.click import click
+from utils.log import get_level, LOG_FORMAT
+import logging
+from typing import Optional
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+
+@click.group(no_args_is_help=True)
+def cache() -> None:
+    """Inspect and prune the caches of compiled utilities and objects."""
+    pass
+
+
+@cache.command()
+def stats() -> None:
+    """Show the size and contents of the build cache."""
+    from utils.cmds import cache_stats_cmd
+
+    log.debug("Executing 'cache stats' command.")
+    cache_stats_cmd()
+
+
+@cache.command()
+@click.option(
+    "--max-size",
+    type=str,
+    help="Evict least recently used builds until the cache fits, e.g. '500M'.",
+)
+@click.option("--all", "all_", is_flag=True, help="Empty the whole cache.")
+def prune(max_size: Optional[str] = None, all_: bool = False) -> None:
+    """Evict least recently used builds from the cache."""
+    from utils.cmds import cache_prune_cmd
+    from utils.cache import parse_size
+
+    log.debug("Executing 'cache prune' command.")
+    size: Optional[int] = None
+    if all_:
+        size = 0
+    elif max_size is not None:
+        try:
+            size = parse_size(max_size)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--max-size") from e
+    cache_prune_cmd(size)
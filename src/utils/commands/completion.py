@@ -0,0 +1,39 @@
+from utils.click import click
+from utils.log import get_level, LOG_FORMAT
+import logging
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+
+@click.command()
+@click.argument("shell", type=click.Choice(["bash", "zsh", "fish", "nu"]))
+@click.pass_context
+def completion(ctx: click.Context, shell: str) -> None:
+    """Print a static completion script for the given shell.
+
+    The script completes utility names from a cache file that 'add' and
+    'remove' keep up to date, so pressing TAB never starts Python.
+
+    \b
+    Examples:
+        utils completion bash > ~/.local/share/bash-completion/completions/utils
+        utils completion zsh > "${fpath[1]}/_utils"
+        utils completion fish > ~/.config/fish/completions/utils.fish
+        utils completion nu | save -f ($nu.default-config-dir | path join utils.nu)
+    """
+    from utils.completion import completion_script, write_completion_cache
+    from utils.completion import COMPLETION_CACHE
+    from utils.manifest import Manifest
+    from utils.dir import UTILS_DIR
+
+    log.debug("Executing 'completion' command.")
+    group = ctx.parent.command
+    commands = [
+        name
+        for name in group.list_commands(ctx.parent)
+        if not group.get_command(ctx.parent, name).hidden
+    ]
+    if not COMPLETION_CACHE.exists():
+        write_completion_cache(Manifest.load(UTILS_DIR).entries.keys())
+    click.echo(completion_script(shell, commands), nl=False)
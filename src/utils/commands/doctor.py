@@ -0,0 +1,19 @@
+from utils.click import click
+from utils.log import get_level, LOG_FORMAT
+import logging
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+
+@click.command()
+def doctor() -> None:
+    """Re-check the utilities directory, PATH and shell configuration.
+
+    Normal commands trust the recorded state of the shell rc file and skip
+    these checks; this command always performs them in full.
+    """
+    from utils.cmds import doctor_cmd
+
+    log.debug("Executing 'doctor' command.")
+    doctor_cmd()
@@ -0,0 +1,43 @@
+from utils.click import click
+from utils.log import get_level, LOG_FORMAT
+import logging
+from typing import Optional
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+
+def _list_options(f):
+    f = click.option(
+        "--long", "-l", "long", is_flag=True, help="Show size, mtime, type and origin."
+    )(f)
+    f = click.option(
+        "--ndjson",
+        "fmt",
+        flag_value="ndjson",
+        help="Print one JSON object per utility and line.",
+    )(f)
+    f = click.option(
+        "--json", "fmt", flag_value="json", help="Print a JSON array of utilities."
+    )(f)
+    return f
+
+
+@click.command(name="list")
+@_list_options
+def list_(fmt: Optional[str] = None, long: bool = False) -> None:
+    """List all available utilities"""
+    from utils.cmds import list_cmd
+
+    log.debug("Executing 'list' command.")
+    list_cmd(fmt or "text", long)
+
+
+@click.command(hidden=True)
+@_list_options
+def ls(fmt: Optional[str] = None, long: bool = False) -> None:
+    """Alias for 'list' command."""
+    from utils.cmds import list_cmd
+
+    log.debug("Executing 'list' command.")
+    list_cmd(fmt or "text", long)
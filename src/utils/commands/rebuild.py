@@ -0,0 +1,76 @@
+from utils.click import click
+from utils.log import get_level, LOG_FORMAT
+from utils.types import BuildProfile
+import logging
+from typing import Optional
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+
+@click.command()
+@click.argument("utilities", metavar="[UTILITY]...", nargs=-1, type=str)
+@click.option("--all", "all_", is_flag=True, help="Rebuild every compiled utility.")
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Always rebuild instead of using the build cache.",
+)
+@click.option(
+    "--no-fetch",
+    is_flag=True,
+    help="Build even if the artifact store has a prebuilt binary.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    envvar="UTILS_JOBS",
+    help="Maximum parallel jobs shared by all running builds. Defaults to the CPU count.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Skip build steps that already succeeded and whose inputs are unchanged.",
+)
+@click.option(
+    "--profile",
+    type=click.Choice(BuildProfile.ls(), case_sensitive=False),
+    help="Build profile to switch to. Defaults to the profile each utility was added with.",
+)
+@click.option(
+    "--pgo",
+    metavar="COMMAND",
+    type=str,
+    help="Train again with COMMAND. Utilities added with --pgo otherwise reuse their profile data.",
+)
+def rebuild(
+    utilities: tuple[str, ...],
+    all_: bool = False,
+    no_cache: bool = False,
+    no_fetch: bool = False,
+    jobs: Optional[int] = None,
+    resume: bool = False,
+    profile: Optional[str] = None,
+    pgo: Optional[str] = None,
+) -> None:
+    """Incrementally rebuild compiled utilities from their recorded sources.
+
+    Rebuilds reuse the managed build directory of each utility, so only
+    the parts of the source that changed are recompiled.
+    """
+    from utils.cmds import rebuild_utilities
+
+    log.debug("Executing 'rebuild' command.")
+    if not utilities and not all_:
+        raise click.UsageError("Specify at least one UTILITY or --all.")
+    rebuild_utilities(
+        utilities,
+        all_=all_,
+        use_cache=not no_cache,
+        jobs=jobs,
+        resume=resume,
+        fetch=not (no_cache or no_fetch),
+        profile=BuildProfile(profile.lower()) if profile is not None else None,
+        pgo=pgo,
+    )
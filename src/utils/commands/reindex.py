@@ -0,0 +1,15 @@
+from utils.click import click
+from utils.log import get_level, LOG_FORMAT
+import logging
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+
+@click.command()
+def reindex() -> None:
+    """Rebuild the index of installed utilities from disk."""
+    from utils.cmds import reindex_cmd
+
+    log.debug("Executing 'reindex' command.")
+    reindex_cmd()
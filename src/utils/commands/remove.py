@@ -0,0 +1,48 @@
+from utils.click import click
+from utils.log import get_level, LOG_FORMAT
+import logging
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+
+@click.command(no_args_is_help=True)
+@click.argument(
+    "utility",
+    type=str,
+)
+@click.confirmation_option()
+def remove(utility: str) -> None:
+    """Remove the specified utility from the user's utilities directory."""
+    from utils.cmds import remove_utility
+
+    log.debug("Executing 'remove' command.")
+    remove_utility(utility)
+
+
+@click.command(hidden=True, no_args_is_help=True)
+@click.argument(
+    "utility",
+    type=str,
+)
+@click.confirmation_option()
+def rm(utility: str) -> None:
+    """Alias for 'remove' command."""
+    from utils.cmds import remove_utility
+
+    log.debug("Executing 'remove' command.")
+    remove_utility(utility)
+
+
+@click.command(hidden=True, no_args_is_help=True)
+@click.argument(
+    "utility",
+    type=str,
+)
+@click.confirmation_option()
+def uninstall(utility: str) -> None:
+    """Alias for 'remove' command."""
+    from utils.cmds import remove_utility
+
+    log.debug("Executing 'remove' command.")
+    remove_utility(utility)
@@ -0,0 +1,55 @@
+from utils.click import click
+from utils.log import get_level, LOG_FORMAT
+from utils.types import UtilityType
+import logging
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+
+@click.group(invoke_without_command=True)
+@click.option(
+    "--refresh", is_flag=True, help="Re-detect every toolchain instead of using the cache."
+)
+@click.pass_context
+def toolchains(ctx: click.Context, refresh: bool = False) -> None:
+    """Report the detected compilers, their versions and the distro."""
+    if ctx.invoked_subcommand is not None:
+        return
+    from utils.cmds import toolchains_cmd
+
+    log.debug("Executing 'toolchains' command.")
+    toolchains_cmd(refresh=refresh)
+
+
+@toolchains.command(name="install")
+@click.argument(
+    "util_types",
+    metavar="[TYPE]...",
+    nargs=-1,
+    type=click.Choice(UtilityType.ls(), case_sensitive=False),
+)
+@click.option(
+    "--all", "all_", is_flag=True, help="Install the toolchains for every type."
+)
+@click.option(
+    "--dry-run", is_flag=True, help="Only print what would be installed."
+)
+def install(
+    util_types: tuple[str, ...], all_: bool = False, dry_run: bool = False
+) -> None:
+    """Install every missing toolchain for the given utility types at once.
+
+    Missing packages are installed with one package manager transaction per
+    distro family, and the rustup installer is downloaded in parallel.
+    """
+    from utils.cmds import install_toolchains
+
+    log.debug("Executing 'toolchains install' command.")
+    if all_:
+        types = list(UtilityType)
+    elif util_types:
+        types = [UtilityType(t.strip().lower()) for t in util_types]
+    else:
+        raise click.UsageError("Specify at least one TYPE or --all.")
+    install_toolchains(types, dry_run=dry_run)
@@ -0,0 +1,45 @@
+from utils.click import click
+from utils.log import get_level, LOG_FORMAT
+import logging
+from typing import Optional
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+
+@click.command()
+@click.option(
+    "--max-size",
+    type=str,
+    help="Quota to collect down to, e.g. '2G'. Defaults to UTILS_GC_QUOTA.",
+)
+@click.option(
+    "--dry-run", "-n", is_flag=True, help="Only show what would be evicted."
+)
+def gc(max_size: Optional[str] = None, dry_run: bool = False) -> None:
+    """Evict least recently used build directories and cache entries.
+
+    Build directories, cached builds and cached objects are evicted
+    oldest first until their total fits in the quota. Set UTILS_GC_QUOTA
+    to also collect automatically after each build.
+    """
+    from utils.cmds import gc_cmd
+    from utils.cache import parse_size
+
+    log.debug("Executing 'gc' command.")
+    size: Optional[int] = None
+    if max_size is not None:
+        try:
+            size = parse_size(max_size)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--max-size") from e
+    gc_cmd(size, dry_run=dry_run)
+
+
+@click.command()
+def du() -> None:
+    """Show the disk usage of each utility and of the shared caches."""
+    from utils.cmds import du_cmd
+
+    log.debug("Executing 'du' command.")
+    du_cmd()
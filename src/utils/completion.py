@@ -0,0 +1,164 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.dir import UTILS_DIR
+from pathlib import Path
+from typing import Iterable
+import os
+import logging
+
+__all__ = [
+    "COMPLETION_CACHE",
+    "SHELLS",
+    "write_completion_cache",
+    "completion_script",
+]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+COMPLETION_CACHE = UTILS_DIR.parent / "completions" / "utilities"
+"""Plain text list of installed utility names, one per line."""
+
+NAME_COMMANDS = ("remove", "rm", "uninstall", "rebuild", "publish")
+"""Subcommands whose arguments are names of installed utilities."""
+
+PATH_COMMANDS = ("add", "install", "fetch", "export", "import")
+"""Subcommands whose arguments are paths."""
+
+bash_script = """
+# 'utils' completion for bash. Generated by 'utils completion bash'.
+_utils_completion() {
+    local cur="${COMP_WORDS[COMP_CWORD]}"
+    local cache="__CACHE__"
+    if [ "$COMP_CWORD" -eq 1 ]; then
+        COMPREPLY=($(compgen -W "__COMMANDS__" -- "$cur"))
+        return
+    fi
+    case "${COMP_WORDS[1]}" in
+        __NAME_COMMANDS__)
+            if [[ "$cur" != -* ]] && [ -r "$cache" ]; then
+                COMPREPLY=($(compgen -W "$(< "$cache")" -- "$cur"))
+            fi
+            ;;
+        __PATH_COMMANDS__)
+            COMPREPLY=($(compgen -f -- "$cur"))
+            ;;
+    esac
+}
+complete -o default -F _utils_completion utils
+"""
+
+zsh_script = """
+#compdef utils
+# 'utils' completion for zsh. Generated by 'utils completion zsh'.
+_utils() {
+    local cache="__CACHE__"
+    if (( CURRENT == 2 )); then
+        compadd -- __COMMANDS__
+        return
+    fi
+    case "${words[2]}" in
+        __NAME_COMMANDS__)
+            [[ -r "$cache" ]] && compadd -- ${(f)"$(<$cache)"}
+            ;;
+        *)
+            _files
+            ;;
+    esac
+}
+compdef _utils utils
+"""
+
+fish_script = """
+# 'utils' completion for fish. Generated by 'utils completion fish'.
+complete -c utils -f
+complete -c utils -n "__fish_use_subcommand" -a "__COMMANDS__"
+complete -c utils -n "__fish_seen_subcommand_from __NAME_COMMANDS__" -a "(string split -n \\n < '__CACHE__' 2>/dev/null)"
+complete -c utils -n "__fish_seen_subcommand_from __PATH_COMMANDS__" -F
+"""
+
+nu_script = """
+# 'utils' completion for nushell. Generated by 'utils completion nu'.
+def "nu-complete utils commands" [] {
+    [__NU_COMMANDS__]
+}
+
+def "nu-complete utils names" [] {
+    let cache = '__CACHE__'
+    if ($cache | path exists) { open --raw $cache | lines } else { [] }
+}
+
+export extern "utils" [
+    command?: string@"nu-complete utils commands"
+]
+__NU_EXTERNS__
+"""
+
+SHELLS = ("bash", "zsh", "fish", "nu")
+
+NU_FLAGS: dict[str, tuple[str, ...]] = {
+    "remove": ("--yes",),
+    "rm": ("--yes",),
+    "uninstall": ("--yes",),
+    "rebuild": (
+        "--all",
+        "--no-cache",
+        "--no-fetch",
+        "--jobs(-j): int",
+        "--resume",
+        "--profile: string",
+        "--pgo: string",
+    ),
+    "publish": ("--all", "--store: string"),
+}
+"""Flags of the name-taking subcommands, which nushell's externs must declare."""
+
+
+def write_completion_cache(names: Iterable[str], path: Path = COMPLETION_CACHE) -> None:
+    """Atomically rewrite the list of names used by the completion scripts."""
+    log.debug("Writing completion cache: %s", path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            f.writelines(f"{name}\n" for name in sorted(names))
+        os.replace(tmp, path)
+    except OSError as e:
+        log.warning("Failed to write completion cache %s: %s", path, e)
+
+
+def completion_script(shell: str, commands: Iterable[str]) -> str:
+    """Render the static completion script for the given shell."""
+    commands = sorted(commands)
+    match shell:
+        case "bash":
+            script = bash_script
+        case "zsh":
+            script = zsh_script
+        case "fish":
+            script = fish_script
+        case "nu":
+            script = nu_script
+        case _:
+            raise ValueError(f"Unsupported shell: {shell}")
+    externs = "\n".join(
+        f'export extern "utils {command}" [\n'
+        f'    ...utilities: string@"nu-complete utils names"\n'
+        + "".join(f"    {flag}\n" for flag in NU_FLAGS.get(command, ()))
+        + "    --help\n]"
+        for command in NAME_COMMANDS
+    )
+    return (
+        script.replace("__CACHE__", str(COMPLETION_CACHE))
+        .replace("__COMMANDS__", " ".join(commands))
+        .replace("__NU_COMMANDS__", " ".join(f'"{c}"' for c in commands))
+        .replace("__NU_EXTERNS__", externs)
+        .replace(
+            "__NAME_COMMANDS__",
+            " ".join(NAME_COMMANDS) if shell == "fish" else "|".join(NAME_COMMANDS),
+        )
+        .replace(
+            "__PATH_COMMANDS__",
+            " ".join(PATH_COMMANDS) if shell == "fish" else "|".join(PATH_COMMANDS),
+        )
+        .lstrip("\n")
+    )
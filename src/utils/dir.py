@@ -1,16 +1,31 @@
 from utils.click import click
 from utils.log import get_level, LOG_FORMAT
+from utils.trace import span, traced
 from pathlib import Path
+from typing import Optional
+import json
 import os
 import sys
 import logging
 
-__all__ = ["get_utils_dir", "utils_in_path", "create_utils_dir", "add_utils_to_path"]
+__all__ = [
+    "get_utils_dir",
+    "utils_in_path",
+    "create_utils_dir",
+    "add_utils_to_path",
+    "get_builds_dir",
+    "get_pgo_dir",
+    "get_config_dir",
+    "get_cache_dir",
+    "get_shell_rc",
+    "rc_file_is_patched",
+]
 
 logging.basicConfig(level=get_level(), format=LOG_FORMAT)
 log = logging.getLogger(__name__)
 
 UTILS_DIR = Path.home() / ".local" / "share" / "utils" / "bin"
+STATE_FILE = UTILS_DIR.parent / "state.json"
 
 shrc = f"""
 # ADDED BY 'utils' SCRIPT >>>
@@ -60,6 +75,7 @@ if $env.UTILS_PATH not-in $env.path {{
 nuadd = f'$env.path ++= ["{UTILS_DIR}"]'
 
 
+@traced()
 def get_utils_dir() -> Path:
     """Get the utilities directory path."""
     log.debug("Checking if utilities directory exists.")
@@ -69,6 +85,7 @@ def get_utils_dir() -> Path:
     return UTILS_DIR
 
 
+@traced()
 def utils_in_path() -> bool:
     """Check if the utilities directory is in the PATH environment variable."""
     log.debug("Checking if utilities directory is in PATH.")
@@ -80,11 +97,21 @@ def create_utils_dir() -> None:
     """Create the utilities directory if it does not exist."""
     log.debug("Creating utilities directory.")
     UTILS_DIR.mkdir(parents=True, exist_ok=True)
-    log.debug(f"Utilities directory created at: {UTILS_DIR}")
+    log.debug("Utilities directory created at: %s", UTILS_DIR)
     if not utils_in_path():
         add_utils_to_path()
 
 
+def get_builds_dir() -> Path:
+    """Get the directory holding the managed build directories of compiled utilities."""
+    return UTILS_DIR.parent / "builds"
+
+
+def get_pgo_dir() -> Path:
+    """Get the directory holding the profile data of PGO-built utilities."""
+    return UTILS_DIR.parent / "pgo"
+
+
 def get_config_dir() -> Path:
     """Get the default user configuration directory."""
     log.debug("Getting default user configuration directory.")
@@ -117,9 +144,26 @@ def get_config_dir() -> Path:
                 raise click.ClickException(echo)
 
 
+def get_cache_dir() -> Path:
+    """Get the cache directory used by 'utils'."""
+    log.debug("Getting user cache directory.")
+    xdg_cache = os.environ.get("XDG_CACHE_HOME")
+    if xdg_cache is not None and xdg_cache != "":
+        return Path(xdg_cache) / "utils"
+    else:
+        log.debug("XDG_CACHE_HOME not set. Using platform-specific default.")
+        match sys.platform:
+            case "darwin":
+                return Path.home() / "Library" / "Caches" / "utils"
+            case "win32":
+                return Path.home() / "AppData" / "Local" / "utils" / "Cache"
+            case _:
+                return Path.home() / ".cache" / "utils"
+
+
 def echo_added_to_rc(rc_file: Path, rc_add: str, already: bool) -> None:
     """Echo a message indicating the utilities directory was added to the shell config."""
-    log.debug(f"Echoing message for rc file: {rc_file}")
+    log.debug("Echoing message for rc file: %s", rc_file)
     color1 = "yellow" if already else "cyan"
     color2 = "green" if already else "magenta"
     echo = click.style(
@@ -142,11 +186,10 @@ def echo_added_to_rc(rc_file: Path, rc_add: str, already: bool) -> None:
     click.echo()
 
 
-def add_utils_to_path() -> None:
-    """Add the utilities directory to the PATH environment variable."""
-    log.debug("Adding utilities directory to PATH.")
+def get_shell_rc() -> tuple[Path, str, str]:
+    """Get the rc file of the user's shell, the block to add to it and a hint."""
     shell = os.environ.get("SHELL", "")
-    log.debug(f"Detected shell: {shell}")
+    log.debug("Detected shell: %s", shell)
     if shell == "":
         echo = click.style("No shell detected.", fg="red", bold=True)
         echo += "\n"
@@ -160,59 +203,118 @@ def add_utils_to_path() -> None:
         )
         echo += "\n    export PATH=$PATH:~/.local/share/utils/bin"
         raise click.ClickException(echo)
-    else:
-        shell = Path(shell).stem
-        log.debug(f"Normalized shell name: {shell}")
-        rc_file: Path = Path()
-        rc_text: str = ""
-        rc_add: str = ""
-        match shell:
-            case "sh":
-                rc_file = Path.home() / ".profile"
-                rc_text = shrc
-                rc_add = shadd
-            case "bash":
-                rc_file = Path.home() / ".bashrc"
-                rc_text = bashrc
-                rc_add = shadd
-            case "zsh":
-                rc_file = Path.home() / ".zshrc"
-                rc_text = bashrc
-                rc_add = shadd
-            case "fish":
-                rc_file = Path.home() / ".config" / "fish" / "config.fish"
-                rc_text = fishrc
-                rc_add = fishadd
-            case "nu":
-                rc_file = get_config_dir() / "nushell" / "config.nu"
-                rc_text = nurc
-                rc_add = nuadd
-            case _:
-                echo = click.style(
-                    f"Unsupported shell: {click.format_filename(shell)}.",
-                    fg="red",
-                    bold=True,
-                )
-                echo += click.style(
-                    "\nPlease add the utilities directory to your PATH manually."
-                )
-                raise click.ClickException(echo)
-        # Ensure the shell config exists
-        log.debug(f"Ensuring the shell config file exists: {rc_file}")
-        if (not rc_file.exists()) or (not rc_file.is_file()):
-            log.debug(f"Creating the shell config file: {rc_file}")
-            if (not rc_file.parent.exists()) or (not rc_file.parent.is_dir()):
-                rc_file.parent.mkdir(parents=True, exist_ok=True)
-            rc_file.touch()
-        log.debug(f"Checking if utilities directory is already in {rc_file}")
-        with click.open_file(rc_file, "r") as f:
-            log.debug(f"Reading {rc_file} to check for existing utilities directory.")
-            for line in f:
-                if "# ADDED BY 'utils' SCRIPT >>>" in line:
-                    log.debug("Utilities directory already added to the shell config.")
-                    echo_added_to_rc(rc_file, rc_add, True)
-                    return
-        log.debug("Utilities directory not found in the shell config. Adding it.")
-        with click.open_file(rc_file, "a") as f:
-            f.write(rc_text)
-        echo_added_to_rc(rc_file, rc_add, False)
+    shell = Path(shell).stem
+    log.debug("Normalized shell name: %s", shell)
+    match shell:
+        case "sh":
+            return Path.home() / ".profile", shrc, shadd
+        case "bash":
+            return Path.home() / ".bashrc", bashrc, shadd
+        case "zsh":
+            return Path.home() / ".zshrc", bashrc, shadd
+        case "fish":
+            return Path.home() / ".config" / "fish" / "config.fish", fishrc, fishadd
+        case "nu":
+            return get_config_dir() / "nushell" / "config.nu", nurc, nuadd
+        case _:
+            echo = click.style(
+                f"Unsupported shell: {click.format_filename(shell)}.",
+                fg="red",
+                bold=True,
+            )
+            echo += click.style(
+                "\nPlease add the utilities directory to your PATH manually."
+            )
+            raise click.ClickException(echo)
+
+
+def _load_state() -> dict:
+    """Load the record of which shell rc files have been patched."""
+    try:
+        with open(STATE_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        log.debug("Ignoring unreadable state file %s: %s", STATE_FILE, e)
+        return {}
+
+
+def _save_state(state: dict) -> None:
+    try:
+        STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = STATE_FILE.with_name(f"{STATE_FILE.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, STATE_FILE)
+    except OSError as e:
+        log.debug("Failed to save state file %s: %s", STATE_FILE, e)
+
+
+def _rc_key(rc_file: Path) -> Optional[dict]:
+    try:
+        st = rc_file.stat()
+    except OSError:
+        return None
+    return {"inode": st.st_ino, "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def rc_file_is_patched(rc_file: Path) -> bool:
+    """Check the state file for an rc file that is known to be patched.
+
+    The record is only trusted while the rc file's inode, mtime and size
+    are unchanged, so any edit to the file triggers a full re-check.
+    """
+    record = _load_state().get("rc_files", {}).get(str(rc_file))
+    return record is not None and record == _rc_key(rc_file)
+
+
+def _record_patched(rc_file: Path) -> None:
+    key = _rc_key(rc_file)
+    if key is None:
+        return
+    state = _load_state()
+    state.setdefault("rc_files", {})[str(rc_file)] = key
+    _save_state(state)
+
+
+def add_utils_to_path(force: bool = False) -> None:
+    """Add the utilities directory to the PATH environment variable.
+
+    Once an rc file is known to be patched this is a no-op, unless force is
+    set, in which case the rc file is scanned again.
+    """
+    log.debug("Adding utilities directory to PATH.")
+    with span("add_utils_to_path", force=force) as s:
+        rc_file, rc_text, rc_add = get_shell_rc()
+        s.set(rc_file=rc_file)
+        if not force and rc_file_is_patched(rc_file):
+            log.debug("%s is already patched according to %s.", rc_file, STATE_FILE)
+            s.set(cached=True)
+            return
+        _patch_rc_file(rc_file, rc_text, rc_add)
+
+
+def _patch_rc_file(rc_file: Path, rc_text: str, rc_add: str) -> None:
+    """Append the PATH block to an rc file unless it is already there."""
+    # Ensure the shell config exists
+    log.debug("Ensuring the shell config file exists: %s", rc_file)
+    if (not rc_file.exists()) or (not rc_file.is_file()):
+        log.debug("Creating the shell config file: %s", rc_file)
+        if (not rc_file.parent.exists()) or (not rc_file.parent.is_dir()):
+            rc_file.parent.mkdir(parents=True, exist_ok=True)
+        rc_file.touch()
+    log.debug("Checking if utilities directory is already in %s", rc_file)
+    with click.open_file(rc_file, "r") as f:
+        log.debug("Reading %s to check for existing utilities directory.", rc_file)
+        for line in f:
+            if "# ADDED BY 'utils' SCRIPT >>>" in line:
+                log.debug("Utilities directory already added to the shell config.")
+                _record_patched(rc_file)
+                echo_added_to_rc(rc_file, rc_add, True)
+                return
+    log.debug("Utilities directory not found in the shell config. Adding it.")
+    with click.open_file(rc_file, "a") as f:
+        f.write(rc_text)
+    _record_patched(rc_file)
+    echo_added_to_rc(rc_file, rc_add, False)
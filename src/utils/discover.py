@@ -0,0 +1,279 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.types import UtilityType
+from pathlib import Path
+from typing import Optional
+import json
+import os
+import stat
+import subprocess
+import logging
+
+__all__ = [
+    "INTERMEDIATE_DIRS",
+    "discover_outputs",
+    "scan_executables",
+    "cargo_executables",
+    "cmake_executables",
+    "go_executables",
+]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+INTERMEDIATE_DIRS = frozenset(
+    {
+        ".git",
+        ".hg",
+        ".svn",
+        "__pycache__",
+        "node_modules",
+        ".venv",
+        # cargo
+        "deps",
+        ".fingerprint",
+        "incremental",
+        # CMake and autotools
+        "CMakeFiles",
+        ".cmake",
+        "_deps",
+        ".deps",
+        ".libs",
+    }
+)
+"""Directories that hold sources or intermediate files, never final outputs."""
+
+_INTERMEDIATE_SUFFIXES = frozenset(
+    {
+        ".o",
+        ".obj",
+        ".a",
+        ".so",
+        ".dylib",
+        ".d",
+        ".rlib",
+        ".rmeta",
+        ".json",
+        ".txt",
+        ".cmake",
+        ".make",
+        ".ninja",
+        ".log",
+        ".mod",
+        ".c",
+        ".h",
+        ".cc",
+        ".cpp",
+        ".hpp",
+        ".rs",
+        ".go",
+        ".f90",
+    }
+)
+"""Suffixes of files that are not worth a stat call during the scan."""
+
+QUERY_TIMEOUT = 120
+
+
+def _executable(path: Path) -> bool:
+    try:
+        st = path.stat()
+    except OSError:
+        return False
+    return stat.S_ISREG(st.st_mode) and bool(st.st_mode & 0o111)
+
+
+def scan_executables(root: Path) -> list[Path]:
+    """Find the executable files below root, pruning intermediate directories.
+
+    Cargo's per-crate 'build' directories, recognisable by a '.fingerprint'
+    sibling, only hold build scripts and are pruned as well.
+    """
+    found: list[Path] = []
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError as e:
+            log.debug("Skipping unreadable directory %s: %s", current, e)
+            continue
+        names = {entry.name for entry in entries}
+        prune = INTERMEDIATE_DIRS | ({"build"} if ".fingerprint" in names else set())
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in prune:
+                        stack.append(Path(entry.path))
+                    continue
+                if os.path.splitext(entry.name)[1] in _INTERMEDIATE_SUFFIXES:
+                    continue
+                st = entry.stat()
+            except OSError as e:
+                log.debug("Skipping %s: %s", entry.path, e)
+                continue
+            if stat.S_ISREG(st.st_mode) and st.st_mode & 0o111:
+                found.append(Path(entry.path))
+    return sorted(found)
+
+
+def _query(cmd: list[str], cwd: Path, env: Optional[dict[str, str]] = None) -> str:
+    """Run a build system query, returning its stdout or '' on failure."""
+    try:
+        return subprocess.run(
+            cmd,
+            cwd=cwd,
+            env={**os.environ, **(env or {})},
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=QUERY_TIMEOUT,
+        ).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        log.debug("Build system query %s failed: %s", cmd, e)
+        return ""
+
+
+def cargo_executables(
+    source_dir: Path,
+    target_dir: Path,
+    env: Optional[dict[str, str]] = None,
+    release: bool = True,
+) -> list[Path]:
+    """Ask cargo for the binaries of the release or debug build.
+
+    Cargo reports every artifact, including fresh ones, so repeating the
+    build after it succeeded is a cheap no-op as long as env matches the
+    build's.
+    """
+    out = _query(
+        [
+            "cargo",
+            "build",
+            *(["--release"] if release else []),
+            "--target-dir",
+            str(target_dir),
+            "--message-format=json",
+        ],
+        source_dir,
+        env,
+    )
+    found = []
+    for line in out.splitlines():
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if message.get("reason") != "compiler-artifact":
+            continue
+        executable = message.get("executable")
+        if executable and "bin" in message.get("target", {}).get("kind", []):
+            found.append(Path(executable))
+    return found
+
+
+def _install_manifest(build_dir: Path) -> list[Path]:
+    """Executables listed in a CMake install_manifest.txt."""
+    try:
+        lines = (build_dir / "install_manifest.txt").read_text().splitlines()
+    except OSError:
+        return []
+    return [Path(line) for line in lines if line and _executable(Path(line))]
+
+
+def cmake_executables(source_dir: Path, build_dir: Path) -> list[Path]:
+    """Ask CMake for the executables of a build tree.
+
+    Installed executables from the install manifest come first. Otherwise
+    the file API's codemodel is read, after reconfiguring once to answer a
+    new query if the tree has no reply yet.
+    """
+    installed = _install_manifest(build_dir)
+    if installed:
+        return installed
+    api = build_dir / ".cmake" / "api" / "v1"
+    query = api / "query" / "codemodel-v2"
+    reply = api / "reply"
+    if not any(reply.glob("index-*.json")):
+        try:
+            query.parent.mkdir(parents=True, exist_ok=True)
+            query.touch()
+        except OSError as e:
+            log.debug("Failed to write CMake file API query: %s", e)
+            return []
+        _query(["cmake", "-S", str(source_dir), "-B", str(build_dir)], source_dir)
+    indexes = sorted(reply.glob("index-*.json"))
+    if not indexes:
+        return []
+    found = []
+    try:
+        index = json.loads(indexes[-1].read_text())
+        codemodel_file = index["reply"]["codemodel-v2"]["jsonFile"]
+        codemodel = json.loads((reply / codemodel_file).read_text())
+        for configuration in codemodel.get("configurations", []):
+            for target in configuration.get("targets", []):
+                data = json.loads((reply / target["jsonFile"]).read_text())
+                if data.get("type") != "EXECUTABLE":
+                    continue
+                for artifact in data.get("artifacts", []):
+                    path = build_dir / artifact["path"]
+                    if _executable(path):
+                        found.append(path)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        log.debug("Unreadable CMake file API reply: %s", e)
+    return found
+
+
+def go_executables(source_dir: Path, output_dir: Path) -> list[Path]:
+    """Ask go for the name of the main package's binary in output_dir."""
+    out = _query(
+        ["go", "list", "-f", "{{.Name}}\t{{.ImportPath}}\t{{.Target}}", "."],
+        source_dir,
+    )
+    found = []
+    for line in out.splitlines():
+        name, _, rest = line.partition("\t")
+        import_path, _, target = rest.partition("\t")
+        if name != "main":
+            continue
+        if target:
+            binary = Path(target).name
+        else:
+            # Like go build, drop a major version suffix such as '/v2'.
+            parts = import_path.split("/")
+            if len(parts) > 1 and parts[-1][:1] == "v" and parts[-1][1:].isdigit():
+                parts.pop()
+            binary = parts[-1]
+        path = output_dir / binary
+        if _executable(path):
+            found.append(path)
+    return found
+
+
+def discover_outputs(
+    util_type: UtilityType,
+    source_dir: Path,
+    build_dir: Optional[Path],
+    env: Optional[dict[str, str]] = None,
+    profile: str = "release",
+) -> list[Path]:
+    """Ask the build system which executables a build produced.
+
+    Returns an empty list when the build system can't tell, in which case
+    callers fall back to scanning the build tree.
+    """
+    match util_type:
+        case UtilityType.RUST if build_dir is not None:
+            return cargo_executables(
+                source_dir, build_dir, env, release=profile != "debug"
+            )
+        case UtilityType.CMAKE if build_dir is not None:
+            return cmake_executables(source_dir, build_dir / "cmake")
+        case UtilityType.GO if build_dir is not None:
+            return go_executables(source_dir, build_dir)
+        case UtilityType.AUTOCONF if build_dir is not None:
+            # 'make install' into the managed prefix is the install manifest.
+            return scan_executables(build_dir / "output" / "bin")
+        case _:
+            return []
@@ -0,0 +1,208 @@
+from utils.click import click
+from utils.log import get_level, LOG_FORMAT
+from utils.dir import get_cache_dir
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from typing import Optional
+import hashlib
+import json
+import os
+import logging
+
+__all__ = [
+    "RUSTUP_URL",
+    "DownloadError",
+    "get_session",
+    "is_offline",
+    "download",
+    "fetch_text",
+]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+RUSTUP_URL = os.environ.get("UTILS_RUSTUP_URL", "https://sh.rustup.rs")
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_TIMEOUT = (10, 60)
+"""Connect and read timeouts in seconds."""
+
+_session = None
+
+
+class DownloadError(click.ClickException):
+    """Raised when a file can't be downloaded or served from the cache."""
+
+    def __init__(self, message: str) -> None:
+        super().__init__(f"{click.style('ERROR:', fg='red', bold=True)} {message}")
+
+
+def get_session():
+    """Get the shared HTTP session used for every installer download."""
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        _session = requests.Session()
+        retries = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET", "HEAD"),
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retries)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+        _session.headers["User-Agent"] = "utils"
+    return _session
+
+
+def is_offline() -> bool:
+    """Whether 'UTILS_OFFLINE' asks for downloads to be served from the cache only."""
+    return os.environ.get("UTILS_OFFLINE", "").lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class CachedDownload:
+    """Metadata stored next to a cached download."""
+
+    url: str
+    sha256: str
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def _cache_paths(url: str, root: Path) -> tuple[Path, Path, Path]:
+    key = hashlib.sha256(url.encode()).hexdigest()
+    base = root / key[:2] / key
+    return base, base.with_suffix(".json"), base.with_suffix(".part")
+
+
+def _load_meta(path: Path) -> Optional[CachedDownload]:
+    try:
+        with open(path, "r") as f:
+            return CachedDownload(**json.load(f))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError) as e:
+        log.debug("Ignoring unreadable download metadata %s: %s", path, e)
+        return None
+
+
+def _hash(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def download(
+    url: str,
+    sha256: Optional[str] = None,
+    offline: Optional[bool] = None,
+    root: Optional[Path] = None,
+    timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+) -> Path:
+    """Download url into the download cache and return the cached file.
+
+    A cached copy is revalidated with its ETag or Last-Modified date and
+    reused when the server answers 304. Interrupted downloads continue from
+    the partial file with a range request. When sha256 is given the file
+    must match it. In offline mode, or when the network fails, the cached
+    copy is used if there is one.
+    """
+    root = root if root is not None else get_cache_dir() / "downloads"
+    offline = is_offline() if offline is None else offline
+    target, meta_path, part = _cache_paths(url, root)
+    meta = _load_meta(meta_path)
+    cached = meta if meta is not None and target.is_file() else None
+    if cached is not None and sha256 is not None and cached.sha256 != sha256:
+        log.debug("Cached copy of %s does not match the expected checksum.", url)
+        cached = None
+
+    if offline:
+        if cached is None:
+            raise DownloadError(f"{url} is not in the download cache (offline mode).")
+        log.debug("Offline mode: serving %s from %s", url, target)
+        return target
+
+    import requests
+
+    headers: dict[str, str] = {}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+    resume_from = part.stat().st_size if part.exists() else 0
+    if resume_from:
+        log.debug("Resuming download of %s at byte %s", url, resume_from)
+        headers["Range"] = f"bytes={resume_from}-"
+        partial = _load_meta(part.with_suffix(".part.json"))
+        if partial is not None and (partial.etag or partial.last_modified):
+            headers["If-Range"] = partial.etag or partial.last_modified
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with get_session().get(
+            url, headers=headers, stream=True, timeout=timeout, allow_redirects=True
+        ) as response:
+            if response.status_code == 304 and cached is not None:
+                log.debug("%s not modified. Using the cached copy.", url)
+                return target
+            if response.status_code == 416 and resume_from:
+                log.debug("Server rejected the range request. Restarting.")
+                part.unlink(missing_ok=True)
+                return download(url, sha256, offline, root, timeout)
+            if response.status_code not in (200, 206):
+                raise DownloadError(
+                    f"Failed to download {url}: HTTP {response.status_code}."
+                )
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            append = response.status_code == 206 and resume_from > 0
+            # Remember the validators so an interrupted download can resume.
+            partial_meta = CachedDownload(
+                url=url, sha256="", size=0, etag=etag, last_modified=last_modified
+            )
+            with open(part.with_suffix(".part.json"), "w") as f:
+                json.dump(asdict(partial_meta), f)
+            with open(part, "ab" if append else "wb") as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+    except requests.RequestException as e:
+        if cached is not None:
+            log.warning("Failed to revalidate %s, using the cached copy: %s", url, e)
+            return target
+        raise DownloadError(
+            f"Failed to download {url}: {e}. Run again to resume the download."
+        ) from e
+
+    digest = _hash(part)
+    if sha256 is not None and digest != sha256.lower():
+        part.unlink(missing_ok=True)
+        part.with_suffix(".part.json").unlink(missing_ok=True)
+        raise DownloadError(
+            f"Checksum mismatch for {url}: expected {sha256}, got {digest}."
+        )
+    os.replace(part, target)
+    part.with_suffix(".part.json").unlink(missing_ok=True)
+    new_meta = CachedDownload(
+        url=url,
+        sha256=digest,
+        size=target.stat().st_size,
+        etag=etag,
+        last_modified=last_modified,
+    )
+    tmp = meta_path.with_name(f"{meta_path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(asdict(new_meta), f, indent=2)
+    os.replace(tmp, meta_path)
+    log.debug("Downloaded %s to %s", url, target)
+    return target
+
+
+def fetch_text(url: str, sha256: Optional[str] = None) -> str:
+    """Download a text file, such as an installer script, through the cache."""
+    return download(url, sha256=sha256).read_text()
@@ -0,0 +1,147 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.types import StrEnumUtil
+from pathlib import Path
+import errno
+import os
+import shutil
+import logging
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+__all__ = ["Strategy", "copy_file", "move_file"]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+FICLONE = 0x40049409
+"""Linux ioctl that shares the extents of one file with another (a reflink)."""
+
+# Errors meaning "this strategy is not supported here", as opposed to real
+# I/O failures that should be reported.
+_UNSUPPORTED = {
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTTY,
+    errno.EPERM,
+    errno.EBADF,
+    errno.EOPNOTSUPP,
+    getattr(errno, "ENOTSUP", errno.EOPNOTSUPP),
+}
+
+
+class Strategy(StrEnumUtil):
+    """How a file ended up at its destination."""
+
+    RENAME = "rename"
+    REFLINK = "reflink"
+    HARDLINK = "hardlink"
+    COPY_FILE_RANGE = "copy_file_range"
+    SENDFILE = "sendfile"
+    BUFFERED = "buffered"
+    UNCHANGED = "unchanged"
+
+
+def _reflink(src_fd: int, dst_fd: int, size: int) -> None:
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, "reflinks are not supported")
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, size: int) -> None:
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "copy_file_range is not supported")
+    remaining = size
+    while remaining > 0:
+        copied = os.copy_file_range(src_fd, dst_fd, remaining)
+        if copied == 0:
+            break
+        remaining -= copied
+
+
+def _sendfile(src_fd: int, dst_fd: int, size: int) -> None:
+    if not hasattr(os, "sendfile"):
+        raise OSError(errno.ENOSYS, "sendfile is not supported")
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+        if sent == 0:
+            break
+        offset += sent
+
+
+def _buffered(src_fd: int, dst_fd: int, size: int) -> None:
+    with open(src_fd, "rb", closefd=False) as src, open(
+        dst_fd, "wb", closefd=False
+    ) as dst:
+        shutil.copyfileobj(src, dst, length=1024 * 1024)
+
+
+_COPIERS = (
+    (Strategy.REFLINK, _reflink),
+    (Strategy.COPY_FILE_RANGE, _copy_file_range),
+    (Strategy.SENDFILE, _sendfile),
+    (Strategy.BUFFERED, _buffered),
+)
+
+
+def copy_file(src: Path, dst: Path, allow_hardlink: bool = False) -> Strategy:
+    """Copy src to dst with the cheapest strategy the filesystem supports.
+
+    Tries a reflink first, then a hardlink when allow_hardlink is set, then
+    the in-kernel copy_file_range and sendfile calls, and finally a buffered
+    userspace copy. Only allow hardlinks when neither file will be modified
+    in place afterwards, since both names share the same inode. Like
+    shutil.copy2, the file's metadata is copied as well. dst must not exist.
+    """
+    if allow_hardlink:
+        try:
+            os.link(src, dst)
+            log.debug("Hardlinked %s to %s", src, dst)
+            return Strategy.HARDLINK
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED | {errno.EMLINK}:
+                raise
+            log.debug("Hardlink of %s failed: %s", src, e)
+    with open(src, "rb") as fsrc:
+        size = os.fstat(fsrc.fileno()).st_size
+        fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            for strategy, copier in _COPIERS:
+                try:
+                    copier(fsrc.fileno(), fd, size)
+                except OSError as e:
+                    if strategy == Strategy.BUFFERED or e.errno not in _UNSUPPORTED:
+                        raise
+                    log.debug("%s copy of %s failed: %s", strategy, src, e)
+                    os.ftruncate(fd, 0)
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    fsrc.seek(0)
+                    continue
+                log.debug("Copied %s to %s with %s", src, dst, strategy)
+                break
+        except BaseException:
+            os.close(fd)
+            dst.unlink(missing_ok=True)
+            raise
+        os.close(fd)
+    shutil.copystat(src, dst)
+    return strategy
+
+
+def move_file(src: Path, dst: Path) -> Strategy:
+    """Move src to dst, falling back to a copy and delete across filesystems."""
+    try:
+        os.replace(src, dst)
+        log.debug("Renamed %s to %s", src, dst)
+        return Strategy.RENAME
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        log.debug("%s and %s are on different filesystems. Copying instead.", src, dst)
+    strategy = copy_file(src, dst)
+    os.unlink(src)
+    return strategy
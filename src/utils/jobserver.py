@@ -0,0 +1,163 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.dir import get_cache_dir
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Optional
+import os
+import time
+import logging
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+__all__ = ["PARALLEL_TOOLS", "get_job_limit", "SlotPool", "Jobserver"]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+PARALLEL_TOOLS = frozenset({"make", "gmake", "ninja", "cargo", "go"})
+"""Build tools that run jobs in parallel when they are given more slots."""
+
+
+def get_job_limit(jobs: Optional[int] = None) -> int:
+    """Get the number of parallel jobs all builds may share.
+
+    An explicit value wins over the 'UTILS_JOBS' environment variable, which
+    wins over the number of CPUs.
+    """
+    if jobs is not None and jobs > 0:
+        return jobs
+    env_jobs = os.environ.get("UTILS_JOBS", "")
+    if env_jobs != "":
+        try:
+            value = int(env_jobs)
+            if value > 0:
+                return value
+        except ValueError:
+            pass
+        log.warning("Ignoring invalid UTILS_JOBS: %s", env_jobs)
+    return os.cpu_count() or 1
+
+
+@dataclass
+class SlotPool:
+    """A per-user pool of job slots shared by every running 'utils' process.
+
+    Each slot is a lock file that is held with ``flock`` while a build step
+    runs. Locks are released by the kernel when a process exits, so a crashed
+    build never leaks slots.
+    """
+
+    limit: int
+    root: Path = field(default_factory=lambda: get_cache_dir() / "jobs")
+    poll_interval: float = 0.05
+    max_poll_interval: float = 0.5
+
+    def _try_lock(self, index: int) -> Optional[int]:
+        fd = os.open(self.root / f"slot-{index}", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    def acquire(self, wanted: int = 1) -> list[int]:
+        """Block until one slot is free, then take up to wanted slots.
+
+        Only the first slot is waited for. Extra slots are taken if they are
+        free right now, so a parallel step never holds up other builds.
+        """
+        wanted = max(1, min(wanted, self.limit))
+        if fcntl is None:
+            return [-1] * wanted
+        self.root.mkdir(parents=True, exist_ok=True)
+        interval = self.poll_interval
+        while True:
+            held: list[int] = []
+            for index in range(self.limit):
+                fd = self._try_lock(index)
+                if fd is not None:
+                    held.append(fd)
+                    if len(held) >= wanted:
+                        break
+            if held:
+                log.debug("Acquired %s of %s job slots.", len(held), self.limit)
+                return held
+            log.debug("All job slots are busy. Waiting for one to free up.")
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+
+    @staticmethod
+    def release(held: list[int]) -> None:
+        for fd in held:
+            if fd >= 0:
+                os.close(fd)
+
+
+class Jobserver:
+    """A GNU make compatible jobserver for a single build step.
+
+    Every step holds one slot from the shared :class:`SlotPool`. Steps that
+    run a parallel build tool also take the slots that are free when they
+    start, which are handed out to the tool as jobserver tokens. make, and
+    cmake's Makefile generator, use the tokens through ``MAKEFLAGS``, and
+    cargo does the same. go has no jobserver support, so it gets ``-p`` set
+    to the number of slots held.
+    """
+
+    def __init__(self, jobs: Optional[int] = None, parallel: bool = True) -> None:
+        self.pool = SlotPool(limit=get_job_limit(jobs))
+        self.parallel = parallel
+        self.held: list[int] = []
+        self.read_fd: Optional[int] = None
+        self.write_fd: Optional[int] = None
+
+    @property
+    def slots(self) -> int:
+        return len(self.held)
+
+    def __enter__(self) -> "Jobserver":
+        self.held = self.pool.acquire(self.pool.limit if self.parallel else 1)
+        self.read_fd, self.write_fd = os.pipe()
+        # Every client owns one implicit token, so only hand out the rest.
+        os.write(self.write_fd, b"+" * (self.slots - 1))
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for fd in (self.read_fd, self.write_fd):
+            if fd is not None:
+                os.close(fd)
+        self.read_fd = self.write_fd = None
+        self.pool.release(self.held)
+        self.held = []
+
+    @property
+    def pass_fds(self) -> tuple[int, ...]:
+        return (self.read_fd, self.write_fd)
+
+    def env(self, base: Optional[dict[str, str]] = None) -> dict[str, str]:
+        """Environment that points make-compatible tools at the jobserver."""
+        env = dict(os.environ if base is None else base)
+        auth = f"{self.read_fd},{self.write_fd}"
+        makeflags = f" -j{self.slots} --jobserver-fds={auth} --jobserver-auth={auth}"
+        env["MAKEFLAGS"] = makeflags
+        env["CARGO_MAKEFLAGS"] = makeflags
+        env.pop("MFLAGS", None)
+        return env
+
+    @staticmethod
+    def is_parallel(cmd: list[str]) -> bool:
+        """Whether a command runs a build tool that can use more than one slot."""
+        tool = Path(cmd[0]).name
+        if tool == "cmake":
+            return "--build" in cmd
+        return tool in PARALLEL_TOOLS
+
+    def command(self, cmd: list[str]) -> list[str]:
+        """Add job-count arguments for tools that can't use the jobserver."""
+        if Path(cmd[0]).name == "go" and len(cmd) > 1 and "-p" not in cmd:
+            return [cmd[0], cmd[1], "-p", str(self.slots), *cmd[2:]]
+        return cmd
@@ -0,0 +1,37 @@
+from utils.log import get_level, LOG_FORMAT
+from pathlib import Path
+from typing import Iterator
+from contextlib import contextmanager
+import os
+import logging
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+__all__ = ["file_lock"]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive ``flock`` on path, e.g. for a read-modify-write.
+
+    The lock file is created if needed and is never removed, so every
+    process locks the same inode. Without fcntl nothing is locked.
+    """
+    if fcntl is None:
+        yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        log.debug("Locked %s", path)
+        yield
+    finally:
+        # Closing the file releases the lock.
+        os.close(fd)
@@ -0,0 +1,262 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.completion import write_completion_cache
+from utils.trace import traced
+from utils.lock import file_lock
+from pathlib import Path
+from dataclasses import dataclass, asdict, field
+from typing import Optional, Iterator
+from contextlib import contextmanager
+import hashlib
+import json
+import mmap
+import os
+import logging
+
+__all__ = [
+    "MANIFEST_NAME",
+    "ManifestEntry",
+    "Manifest",
+    "hash_file",
+    "entry_for",
+    "reindex",
+    "walk_utilities",
+]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".utils-manifest.json"
+MANIFEST_VERSION = 1
+
+
+def hash_file(path: Path) -> str:
+    """Return the SHA-256 hex digest of a file's contents.
+
+    Regular files are memory-mapped and hashed straight from the page cache,
+    without copying them through Python buffers.
+    """
+    with open(path, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                return hashlib.sha256(m).hexdigest()
+        except (OSError, ValueError):
+            # Empty and special files can't be mapped.
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+@dataclass
+class ManifestEntry:
+    """A single installed utility as recorded in the manifest."""
+
+    name: str
+    size: int
+    mtime: float
+    hash: str
+    origin: Optional[str] = None
+    type: Optional[str] = None
+    build_dir: Optional[str] = None
+    profile: Optional[str] = None
+    pgo: Optional[str] = None
+    source: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ManifestEntry":
+        return cls(
+            name=data["name"],
+            size=int(data["size"]),
+            mtime=float(data["mtime"]),
+            hash=data["hash"],
+            origin=data.get("origin"),
+            type=data.get("type"),
+            build_dir=data.get("build_dir"),
+            profile=data.get("profile"),
+            pgo=data.get("pgo"),
+            source=data.get("source"),
+        )
+
+
+def entry_for(
+    utils_dir: Path,
+    path: Path,
+    origin: Optional[Path] = None,
+    util_type: Optional[str] = None,
+    build_dir: Optional[Path] = None,
+    digest: Optional[str] = None,
+    profile: Optional[str] = None,
+    pgo: Optional[str] = None,
+    source: Optional[str] = None,
+) -> ManifestEntry:
+    """Build a manifest entry for an installed utility.
+
+    Pass digest when the hash of the file's contents is already known.
+    pgo is the training command of utilities built with PGO, and source
+    the hash of the sources a compiled utility was built from.
+    """
+    st = path.stat()
+    return ManifestEntry(
+        name=path.relative_to(utils_dir).as_posix(),
+        size=st.st_size,
+        mtime=st.st_mtime,
+        hash=digest if digest is not None else hash_file(path),
+        origin=str(origin) if origin is not None else None,
+        type=str(util_type) if util_type is not None else None,
+        build_dir=str(build_dir) if build_dir is not None else None,
+        profile=str(profile) if profile is not None else None,
+        pgo=pgo,
+        source=source,
+    )
+
+
+@dataclass
+class Manifest:
+    """On-disk index of the utilities installed in the utilities directory."""
+
+    path: Path
+    entries: dict[str, ManifestEntry] = field(default_factory=dict)
+    exists: bool = False
+
+    @classmethod
+    @traced("load manifest")
+    def load(cls, utils_dir: Path) -> "Manifest":
+        """Load the manifest from the utilities directory."""
+        path = utils_dir / MANIFEST_NAME
+        log.debug("Loading manifest from %s", path)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            log.debug("No manifest found.")
+            return cls(path=path)
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable manifest %s: %s", path, e)
+            return cls(path=path)
+        if data.get("version") != MANIFEST_VERSION:
+            log.warning("Ignoring manifest with unknown version: %s", data.get('version'))
+            return cls(path=path)
+        entries = {
+            name: ManifestEntry.from_dict(entry)
+            for name, entry in data.get("utilities", {}).items()
+        }
+        return cls(path=path, entries=entries, exists=True)
+
+    @classmethod
+    @contextmanager
+    def locked(cls, utils_dir: Path) -> Iterator["Manifest"]:
+        """Load the manifest and hold its lock until the block ends.
+
+        Use it to load, change and save the manifest, so commands running
+        at the same time don't drop each other's entries.
+        """
+        with file_lock(utils_dir / f"{MANIFEST_NAME}.lock"):
+            yield cls.load(utils_dir)
+
+    def save(self) -> None:
+        """Atomically write the manifest back to disk."""
+        log.debug("Saving manifest to %s", self.path)
+        data = {
+            "version": MANIFEST_VERSION,
+            "utilities": {
+                name: asdict(entry) for name, entry in sorted(self.entries.items())
+            },
+        }
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+        self.exists = True
+        write_completion_cache(self.entries.keys())
+
+    def add(self, entry: ManifestEntry) -> None:
+        self.entries[entry.name] = entry
+
+    def remove(self, name: str) -> Optional[ManifestEntry]:
+        return self.entries.pop(name, None)
+
+    def __iter__(self) -> Iterator[ManifestEntry]:
+        return iter(sorted(self.entries.values(), key=lambda e: e.name))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def walk_utilities(root: Path) -> Iterator[tuple[str, os.DirEntry]]:
+    """Yield the name and directory entry of every utility below root.
+
+    Utilities are the executable files below root, following symlinks.
+    Entries come in name order and directories are read one at a time, so
+    callers can stream them without holding the whole tree in memory.
+    """
+    seen: set[tuple[int, int]] = set()
+
+    def walk(current: Path, prefix: str) -> Iterator[tuple[str, os.DirEntry]]:
+        try:
+            st = current.stat()
+            if (st.st_dev, st.st_ino) in seen:
+                return
+            seen.add((st.st_dev, st.st_ino))
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            log.debug("Skipping unreadable directory %s: %s", current, e)
+            return
+        for entry in entries:
+            if entry.name == MANIFEST_NAME or entry.name.startswith(
+                f"{MANIFEST_NAME}."
+            ):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=True):
+                    yield from walk(Path(entry.path), f"{prefix}{entry.name}/")
+                elif entry.is_file(follow_symlinks=True) and os.access(
+                    entry.path, mode=os.X_OK | os.R_OK
+                ):
+                    yield f"{prefix}{entry.name}", entry
+            except OSError as e:
+                log.debug("Skipping %s: %s", entry.path, e)
+
+    yield from walk(root, "")
+
+
+def _walk_executables(root: Path) -> Iterator[Path]:
+    """Yield every executable file below root, following symlinks."""
+    for _, entry in walk_utilities(root):
+        yield Path(entry.path)
+
+
+def reindex(utils_dir: Path) -> tuple[Manifest, dict[str, list[str]]]:
+    """Rebuild the manifest from the contents of the utilities directory.
+
+    Entries whose size and mtime are unchanged are kept as they are; the
+    origin and type of existing entries are carried over. Returns the new
+    manifest and the names that were added, removed and updated.
+    """
+    log.debug("Reindexing utilities directory: %s", utils_dir)
+    with Manifest.locked(utils_dir) as old:
+        new = Manifest(path=old.path, exists=old.exists)
+        drift: dict[str, list[str]] = {"added": [], "removed": [], "updated": []}
+        for path in _walk_executables(utils_dir):
+            name = path.relative_to(utils_dir).as_posix()
+            previous = old.entries.get(name)
+            st = path.stat()
+            if (
+                previous is not None
+                and previous.size == st.st_size
+                and previous.mtime == st.st_mtime
+            ):
+                new.add(previous)
+                continue
+            entry = entry_for(utils_dir, path)
+            if previous is None:
+                drift["added"].append(name)
+            else:
+                entry.origin = previous.origin
+                entry.type = previous.type
+                entry.build_dir = previous.build_dir
+                entry.profile = previous.profile
+                entry.pgo = previous.pgo
+                entry.source = previous.source
+                drift["updated"].append(name)
+            new.add(entry)
+        drift["removed"] = sorted(set(old.entries) - set(new.entries))
+        new.save()
+        return new, drift
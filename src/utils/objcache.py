@@ -0,0 +1,286 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.dir import get_cache_dir
+from utils.cache import BuildCache, parse_size
+from utils.fastcopy import copy_file
+from utils.types import UtilityType
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Optional
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import logging
+
+__all__ = [
+    "RAW_COMPILERS",
+    "CompilerCache",
+    "get_compiler_cache",
+]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 5 * 1024**3
+"""Default size limit of each object cache (5 GiB), see ``UTILS_OBJECT_CACHE_SIZE``."""
+
+RAW_COMPILERS = frozenset({"gcc", "g++", "gfortran"})
+"""Compilers that the raw single-file builds call directly."""
+
+_C_FAMILY = {
+    UtilityType.C,
+    UtilityType.CPP,
+    UtilityType.FORTRAN,
+    UtilityType.MAKE,
+    UtilityType.CMAKE,
+    UtilityType.AUTOCONF,
+}
+
+
+def _max_size() -> int:
+    env_size = os.environ.get("UTILS_OBJECT_CACHE_SIZE", "")
+    if env_size:
+        try:
+            return parse_size(env_size)
+        except ValueError:
+            log.warning("Ignoring invalid UTILS_OBJECT_CACHE_SIZE: %s", env_size)
+    return DEFAULT_MAX_SIZE
+
+
+@dataclass
+class CompilerCache:
+    """Shared object cache wired into every compiled build.
+
+    ccache or sccache are used as compiler launchers when they are on the
+    PATH, with their cache directories and size limits managed under
+    ``$XDG_CACHE_HOME/utils/objects``. Without them, the compile step of
+    raw single-file C, C++ and Fortran builds falls back to a built-in
+    cache of object files keyed by the preprocessed source, the compiler
+    version and the flags. Linking always runs.
+
+    ``UTILS_COMPILER_CACHE`` selects ``auto`` (the default), ``ccache``,
+    ``sccache``, ``builtin`` or ``off``.
+    """
+
+    mode: str = "auto"
+    ccache: Optional[str] = None
+    sccache: Optional[str] = None
+    root: Path = field(default_factory=lambda: get_cache_dir() / "objects")
+    max_size: int = field(default_factory=_max_size)
+
+    @classmethod
+    def detect(cls) -> "CompilerCache":
+        mode = os.environ.get("UTILS_COMPILER_CACHE", "auto").strip().lower()
+        if mode not in ("auto", "ccache", "sccache", "builtin", "off"):
+            log.warning("Ignoring invalid UTILS_COMPILER_CACHE: %s", mode)
+            mode = "auto"
+        return cls(
+            mode=mode,
+            ccache=shutil.which("ccache") if mode in ("auto", "ccache") else None,
+            sccache=shutil.which("sccache") if mode in ("auto", "sccache") else None,
+        )
+
+    @property
+    def c_launcher(self) -> Optional[str]:
+        """The launcher for gcc, g++ and gfortran, if any."""
+        return self.ccache or self.sccache
+
+    @property
+    def builtin(self) -> BuildCache:
+        return BuildCache(root=self.root / "builtin", max_size=self.max_size)
+
+    def _size_limit(self) -> str:
+        return f"{max(self.max_size // 1000**2, 1)}M"
+
+    def env(self, util_type: UtilityType) -> dict[str, str]:
+        """Environment that routes a build's compilers through the cache."""
+        env: dict[str, str] = {}
+        if self.mode == "off":
+            return env
+        if self.ccache is not None:
+            env["CCACHE_DIR"] = str(self.root / "ccache")
+            env["CCACHE_MAXSIZE"] = self._size_limit()
+        if self.sccache is not None:
+            env["SCCACHE_DIR"] = str(self.root / "sccache")
+            env["SCCACHE_CACHE_SIZE"] = self._size_limit()
+        launcher = self.c_launcher
+        if launcher is not None and util_type == UtilityType.CMAKE:
+            # CMake reads these when it configures a new build tree. CC and
+            # friends are left alone, or it would run the launcher twice.
+            for lang in ("C", "CXX", "Fortran"):
+                env[f"CMAKE_{lang}_COMPILER_LAUNCHER"] = launcher
+        elif launcher is not None and util_type in _C_FAMILY:
+            # Makefiles and configure scripts pick these up.
+            env["CC"] = f"{launcher} gcc"
+            env["CXX"] = f"{launcher} g++"
+            env["FC"] = f"{launcher} gfortran"
+        if self.sccache is not None and util_type == UtilityType.RUST:
+            env["RUSTC_WRAPPER"] = self.sccache
+        return env
+
+    def wrap(self, cmd: list[str]) -> list[str]:
+        """Prefix a direct compiler call with the launcher."""
+        launcher = self.c_launcher
+        if self.mode == "off" or launcher is None or cmd[0] not in RAW_COMPILERS:
+            return cmd
+        return [launcher, *cmd]
+
+    def uses_builtin(self, cmd: list[str]) -> bool:
+        """Whether a command is served by the built-in fallback cache.
+
+        Only calls that compile to an object file are cached; linking is
+        cheap, and whole executables are already kept by the build cache.
+        """
+        if cmd[0] not in RAW_COMPILERS or "-c" not in cmd:
+            return False
+        return self.mode == "builtin" or (self.mode == "auto" and self.c_launcher is None)
+
+    def key(self, cmd: list[str], cwd: Path, compiler_version: str) -> Optional[str]:
+        """Key a compiler call by its preprocessed source, flags and version.
+
+        Returns None when the source can't be preprocessed, in which case
+        the call is not cached.
+        """
+        try:
+            out = cmd.index("-o")
+        except ValueError:
+            return None
+        args = cmd[:out] + cmd[out + 2 :]
+        # gfortran only preprocesses with -cpp. Fortran INCLUDE lines are left
+        # as they are, so included files are not part of the key.
+        cpp = ["-cpp"] if Path(args[0]).name == "gfortran" else []
+        try:
+            result = subprocess.run(
+                [args[0], "-E", *cpp, *args[1:]],
+                cwd=cwd,
+                capture_output=True,
+                check=True,
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            log.debug("Failed to preprocess %s: %s", cmd, e)
+            return None
+        digest = hashlib.sha256()
+        digest.update(json.dumps([compiler_version, args]).encode())
+        digest.update(result.stdout)
+        return digest.hexdigest()
+
+    def restore(self, key: str, output: Path) -> bool:
+        """Copy a cached object file to output. Returns whether it hit."""
+        cached = self.builtin.get(key)
+        self._count("hits" if cached is not None else "misses")
+        if cached is None:
+            return False
+        output.parent.mkdir(parents=True, exist_ok=True)
+        tmp = output.with_name(f"{output.name}.{os.getpid()}.tmp")
+        tmp.unlink(missing_ok=True)
+        copy_file(cached, tmp)
+        os.replace(tmp, output)
+        return True
+
+    def store(self, key: str, output: Path) -> None:
+        self.builtin.put(key, output)
+
+    @property
+    def stats_path(self) -> Path:
+        return self.root / "builtin" / "stats.json"
+
+    def _load_stats(self) -> dict[str, int]:
+        try:
+            with open(self.stats_path, "r") as f:
+                return {k: int(v) for k, v in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            log.debug("Ignoring unreadable object cache stats: %s", e)
+            return {}
+
+    def _count(self, counter: str) -> None:
+        stats = self._load_stats()
+        stats[counter] = stats.get(counter, 0) + 1
+        try:
+            self.stats_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.stats_path.with_name(f"stats.json.{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(stats, f)
+            os.replace(tmp, self.stats_path)
+        except OSError as e:
+            log.debug("Failed to save object cache stats: %s", e)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Hits, misses and size of every object cache in use."""
+        builtin = self._load_stats()
+        result = {
+            "builtin": {
+                "hits": builtin.get("hits", 0),
+                "misses": builtin.get("misses", 0),
+                "size": self.builtin.size(),
+            }
+        }
+        if self.ccache is not None:
+            result["ccache"] = self._ccache_stats()
+        if self.sccache is not None:
+            result["sccache"] = self._sccache_stats()
+        return result
+
+    def _ccache_stats(self) -> dict[str, int]:
+        env = {**os.environ, **self.env(UtilityType.C)}
+        try:
+            result = subprocess.run(
+                [self.ccache, "--print-stats"],
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            log.debug("Failed to read ccache stats: %s", e)
+            return {}
+        raw: dict[str, int] = {}
+        for line in result.stdout.splitlines():
+            name, _, value = line.partition("\t")
+            if value.strip().isdigit():
+                raw[name] = int(value)
+        return {
+            "hits": raw.get("direct_cache_hit", 0) + raw.get("preprocessed_cache_hit", 0),
+            "misses": raw.get("cache_miss", 0),
+            "size": raw.get("cache_size_kibibyte", 0) * 1024,
+        }
+
+    def _sccache_stats(self) -> dict[str, int]:
+        env = {**os.environ, **self.env(UtilityType.RUST)}
+        try:
+            result = subprocess.run(
+                [self.sccache, "--show-stats", "--stats-format", "json"],
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+                timeout=30,
+            )
+            data = json.loads(result.stdout)
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            log.debug("Failed to read sccache stats: %s", e)
+            return {}
+        stats = data.get("stats", {})
+
+        def total(counter: str) -> int:
+            counts = stats.get(counter, {}).get("counts", {})
+            return sum(v for v in counts.values() if isinstance(v, int))
+
+        return {
+            "hits": total("cache_hits"),
+            "misses": total("cache_misses"),
+            "size": int(data.get("cache_size") or 0),
+        }
+
+
+_compiler_cache: Optional[CompilerCache] = None
+
+
+def get_compiler_cache() -> CompilerCache:
+    """Get the compiler cache configuration for this process."""
+    global _compiler_cache
+    if _compiler_cache is None:
+        _compiler_cache = CompilerCache.detect()
+    return _compiler_cache
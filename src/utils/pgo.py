@@ -0,0 +1,235 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.dir import get_pgo_dir
+from utils.types import UtilityType
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Optional
+import glob
+import hashlib
+import os
+import shutil
+import subprocess
+import logging
+
+__all__ = [
+    "PGO_TYPES",
+    "PgoError",
+    "PgoData",
+    "find_llvm_profdata",
+]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+PGO_TYPES = frozenset(
+    {
+        UtilityType.C,
+        UtilityType.CPP,
+        UtilityType.FORTRAN,
+        UtilityType.MAKE,
+        UtilityType.CMAKE,
+        UtilityType.AUTOCONF,
+        UtilityType.RUST,
+    }
+)
+"""Utility types whose toolchains support profile-guided optimization."""
+
+
+class PgoError(Exception):
+    """Raised when profile data can't be collected or merged."""
+
+
+def find_llvm_profdata() -> Optional[str]:
+    """Find an llvm-profdata that reads the profiles of the installed rustc.
+
+    The one shipped with rustup's llvm-tools component matches rustc's LLVM,
+    so it is preferred, and installed if rustup is available.
+    """
+    try:
+        sysroot = subprocess.run(
+            ["rustc", "--print", "sysroot"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError) as e:
+        log.debug("Failed to find the rustc sysroot: %s", e)
+        sysroot = ""
+
+    def bundled() -> Optional[str]:
+        if not sysroot:
+            return None
+        found = glob.glob(os.path.join(sysroot, "lib", "rustlib", "*", "bin", "llvm-profdata"))
+        return found[0] if found else None
+
+    tool = bundled()
+    if tool is None and sysroot and shutil.which("rustup") is not None:
+        log.debug("Installing the llvm-tools component for llvm-profdata.")
+        try:
+            subprocess.run(
+                ["rustup", "component", "add", "llvm-tools-preview"],
+                capture_output=True,
+                check=True,
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            log.debug("Failed to install llvm-tools: %s", e)
+        tool = bundled()
+    return tool or shutil.which("llvm-profdata")
+
+
+@dataclass
+class PgoData:
+    """Profile data collected by the training runs of a utility.
+
+    Like build directories, the data is keyed by the name derived from the
+    sources. It lives in ``~/.local/share/utils/pgo/<name>``, outside the
+    build directories and caches that gc evicts, so rebuilds can apply it
+    again without repeating the training. gcc writes and accumulates
+    ``.gcda`` files below ``raw``; rustc writes ``.profraw`` files there,
+    which are merged into ``merged.profdata``.
+    """
+
+    name: str
+    util_type: UtilityType
+    root: Path = field(default=None)  # type: ignore[assignment]
+
+    def __post_init__(self) -> None:
+        if self.root is None:
+            self.root = get_pgo_dir() / self.name
+
+    @property
+    def llvm(self) -> bool:
+        return self.util_type == UtilityType.RUST
+
+    @property
+    def raw_dir(self) -> Path:
+        return self.root / "raw"
+
+    @property
+    def merged(self) -> Path:
+        return self.root / "merged.profdata"
+
+    @property
+    def bin_dir(self) -> Path:
+        """Directory put first on the PATH of training runs."""
+        return self.root / "bin"
+
+    def generate_flags(self) -> list[str]:
+        """Compiler flags of the instrumented build."""
+        if self.llvm:
+            return [f"-Cprofile-generate={self.raw_dir}"]
+        return [f"-fprofile-generate={self.raw_dir}", "-fprofile-update=prefer-atomic"]
+
+    def use_flags(self) -> list[str]:
+        """Compiler flags that apply the profile data.
+
+        Functions whose code changed since the training are compiled without
+        their profile instead of failing the build, which LLVM does anyway.
+        """
+        if self.llvm:
+            return [f"-Cprofile-use={self.merged}"]
+        return [
+            f"-fprofile-use={self.raw_dir}",
+            "-fprofile-partial-training",
+            "-Wno-missing-profile",
+            "-Wno-coverage-mismatch",
+        ]
+
+    def _files(self) -> list[Path]:
+        if self.llvm:
+            return [self.merged] if self.merged.is_file() else []
+        return sorted(self.raw_dir.rglob("*.gcda"))
+
+    def exists(self) -> bool:
+        return bool(self._files())
+
+    def digest(self) -> str:
+        """Hash the profile data, so builds that applied other data differ."""
+        digest = hashlib.sha256()
+        for file in self._files():
+            with open(file, "rb") as f:
+                digest.update(file.relative_to(self.root).as_posix().encode())
+                digest.update(b"\0")
+                digest.update(hashlib.file_digest(f, "sha256").digest())
+        return digest.hexdigest()
+
+    def reset(self) -> None:
+        """Drop the data of earlier trainings before a new one."""
+        shutil.rmtree(self.raw_dir, ignore_errors=True)
+        shutil.rmtree(self.bin_dir, ignore_errors=True)
+        self.merged.unlink(missing_ok=True)
+        self.raw_dir.mkdir(parents=True, exist_ok=True)
+
+    def remove(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def train(
+        self,
+        command: str,
+        binary: Path,
+        installed_name: str,
+        env: Optional[dict[str, str]] = None,
+    ) -> None:
+        """Run the training command with the instrumented binary first on PATH.
+
+        The binary is linked into a directory of its own under the name it
+        will be installed as, so the command runs it like the installed one.
+        """
+        self.bin_dir.mkdir(parents=True, exist_ok=True)
+        link = self.bin_dir / installed_name
+        link.unlink(missing_ok=True)
+        link.symlink_to(binary)
+        train_env = {**os.environ, **(env or {})}
+        train_env["PATH"] = os.pathsep.join([str(self.bin_dir), train_env.get("PATH", "")])
+        log.debug("Running PGO training command: %s", command)
+        try:
+            result = subprocess.run(command, shell=True, env=train_env)
+        except OSError as e:
+            raise PgoError(f"Failed to run the training command: {e}") from e
+        finally:
+            # The build output is replaced by the optimized binary next.
+            shutil.rmtree(self.bin_dir, ignore_errors=True)
+        if result.returncode != 0:
+            raise PgoError(f"The training command failed with exit code {result.returncode}.")
+
+    def merge(self) -> None:
+        """Combine the raw profiles of every training run into one data set.
+
+        gcc merges its counters into the .gcda files as the runs exit, so
+        there is nothing left to do but check that some were written.
+        """
+        if not self.llvm:
+            if not self.exists():
+                raise PgoError(
+                    "The training command produced no profile data. Does it run the utility?"
+                )
+            return
+        raw = sorted(self.raw_dir.rglob("*.profraw"))
+        if not raw:
+            raise PgoError(
+                "The training command produced no profile data. Does it run the utility?"
+            )
+        profdata = find_llvm_profdata()
+        if profdata is None:
+            raise PgoError(
+                "llvm-profdata is needed to merge Rust profiles. "
+                "Install it with 'rustup component add llvm-tools-preview'."
+            )
+        tmp = self.merged.with_name(f"{self.merged.name}.{os.getpid()}.tmp")
+        try:
+            subprocess.run(
+                [profdata, "merge", "-o", str(tmp), *map(str, raw)],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        except subprocess.CalledProcessError as e:
+            tmp.unlink(missing_ok=True)
+            raise PgoError(
+                f"Failed to merge the profile data:\n{e.stderr.strip()}\n"
+                "llvm-profdata has to match the LLVM version of rustc. "
+                "'rustup component add llvm-tools-preview' installs one that does."
+            ) from e
+        except OSError as e:
+            raise PgoError(f"Failed to run {profdata}: {e}") from e
+        os.replace(tmp, self.merged)
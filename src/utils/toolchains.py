@@ -0,0 +1,286 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.dir import get_cache_dir
+from utils.types import Compilers, UtilityType
+from pathlib import Path
+from dataclasses import dataclass, asdict, field
+from typing import Optional, Iterable
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+import logging
+
+__all__ = [
+    "REQUIRED_COMPILERS",
+    "Toolchain",
+    "Inventory",
+    "get_inventory",
+    "detect_toolchain",
+    "resolve_binary",
+    "required_compilers",
+]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+INVENTORY_VERSION = 1
+DEFAULT_TTL = 24 * 60 * 60
+"""Seconds before the inventory is rebuilt from scratch, see ``UTILS_TOOLCHAIN_TTL``."""
+
+
+REQUIRED_COMPILERS: dict[UtilityType, tuple[Compilers, ...]] = {
+    UtilityType.RUST: (Compilers.RUST,),
+    UtilityType.GO: (Compilers.GO,),
+    UtilityType.C: (Compilers.GCC,),
+    UtilityType.CPP: (Compilers.GPP,),
+    UtilityType.FORTRAN: (Compilers.GFORTRAN,),
+    UtilityType.MAKE: (Compilers.MAKE, Compilers.GCC, Compilers.GPP),
+    UtilityType.CMAKE: (Compilers.CMAKE, Compilers.MAKE, Compilers.GCC, Compilers.GPP),
+    UtilityType.AUTOCONF: (
+        Compilers.CONF,
+        Compilers.MAKE,
+        Compilers.GCC,
+        Compilers.GPP,
+    ),
+}
+"""The toolchains needed to build each type of utility."""
+
+
+def required_compilers(util_types: Iterable[UtilityType]) -> list[Compilers]:
+    """Get the toolchains needed to build all of the given utility types."""
+    found: dict[Compilers, None] = {}
+    for util_type in util_types:
+        for compiler in REQUIRED_COMPILERS[util_type]:
+            found[compiler] = None
+    return list(found)
+
+
+def _ttl() -> float:
+    env_ttl = os.environ.get("UTILS_TOOLCHAIN_TTL", "")
+    if env_ttl != "":
+        try:
+            return float(env_ttl)
+        except ValueError:
+            log.warning("Ignoring invalid UTILS_TOOLCHAIN_TTL: %s", env_ttl)
+    return DEFAULT_TTL
+
+
+def _path_hash() -> str:
+    return hashlib.sha256(os.environ.get("PATH", "").encode()).hexdigest()
+
+
+def resolve_binary(path: str, compiler: str) -> str:
+    """The file that runs when path is run, looking through rustup's proxies.
+
+    cargo on the PATH is usually a link to rustup, which 'rustup update'
+    leaves alone while it replaces the toolchain behind it. 'rustup which'
+    names the binary of the toolchain that is active here.
+    """
+    rustup = shutil.which("rustup")
+    try:
+        if rustup is None or not os.path.samefile(path, rustup):
+            return path
+        result = subprocess.run(
+            [rustup, "which", str(compiler)],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=30,
+        )
+    except (OSError, subprocess.SubprocessError) as exc:
+        log.debug("Failed to resolve the rustup proxy %s: %s", path, exc)
+        return path
+    return result.stdout.strip() or path
+
+
+@dataclass
+class Toolchain:
+    """A detected compiler or build tool.
+
+    binary is the file that actually runs, which differs from path for
+    rustup's proxies. Its mtime and size tell whether it changed.
+    """
+
+    compiler: str
+    path: Optional[str] = None
+    version: str = ""
+    mtime: float = 0.0
+    size: int = 0
+    binary: Optional[str] = None
+
+    @property
+    def installed(self) -> bool:
+        return self.path is not None
+
+    def is_stale(self) -> bool:
+        """Whether the binary changed on disk since it was detected."""
+        if self.path is None:
+            return False
+        binary = resolve_binary(self.path, self.compiler)
+        if binary != self.binary:
+            return True
+        try:
+            st = os.stat(binary)
+        except OSError:
+            return True
+        return st.st_mtime != self.mtime or st.st_size != self.size
+
+
+def detect_toolchain(compiler: Compilers) -> Toolchain:
+    """Locate a compiler on the PATH and ask it for its version."""
+    log.debug("Detecting toolchain: %s", compiler)
+    path = shutil.which(compiler)
+    if path is None:
+        return Toolchain(compiler=str(compiler))
+    binary = resolve_binary(path, compiler)
+    st = os.stat(binary)
+    args = [path, "version"] if compiler == Compilers.GO else [path, "--version"]
+    version = ""
+    try:
+        result = subprocess.run(
+            args, capture_output=True, text=True, check=True, timeout=30
+        )
+        lines = result.stdout.strip().splitlines()
+        version = lines[0] if lines else ""
+    except (OSError, subprocess.SubprocessError) as exc:
+        log.debug("Failed to get version of %s: %s", compiler, exc)
+    return Toolchain(
+        compiler=str(compiler),
+        path=path,
+        version=version,
+        mtime=st.st_mtime,
+        size=st.st_size,
+        binary=binary,
+    )
+
+
+def _detect_distro() -> tuple[str, str]:
+    import distro
+
+    return distro.id(), distro.version()
+
+
+@dataclass
+class Inventory:
+    """Cached results of compiler and distro detection.
+
+    The inventory is kept in ``$XDG_CACHE_HOME/utils/toolchains.json``. It is
+    rebuilt when it is older than its TTL or ``PATH`` changed, and single
+    entries are re-probed when their binary's mtime or size changes, or
+    rustup switches to another toolchain.
+    """
+
+    path: Path = field(default_factory=lambda: get_cache_dir() / "toolchains.json")
+    distro_id: str = ""
+    distro_version: str = ""
+    path_hash: str = ""
+    created: float = 0.0
+    toolchains: dict[str, Toolchain] = field(default_factory=dict)
+    dirty: bool = False
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None) -> "Inventory":
+        inventory = cls() if path is None else cls(path=path)
+        try:
+            with open(inventory.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return inventory
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable toolchain inventory: %s", e)
+            return inventory
+        if data.get("version") != INVENTORY_VERSION:
+            return inventory
+        inventory.distro_id = data.get("distro_id", "")
+        inventory.distro_version = data.get("distro_version", "")
+        inventory.path_hash = data.get("path_hash", "")
+        inventory.created = float(data.get("created", 0.0))
+        inventory.toolchains = {
+            name: Toolchain(**tc) for name, tc in data.get("toolchains", {}).items()
+        }
+        return inventory
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": INVENTORY_VERSION,
+            "distro_id": self.distro_id,
+            "distro_version": self.distro_version,
+            "path_hash": self.path_hash,
+            "created": self.created,
+            "toolchains": {k: asdict(v) for k, v in self.toolchains.items()},
+        }
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    @property
+    def distro(self) -> str:
+        return f"{self.distro_id}-{self.distro_version}"
+
+    def is_expired(self) -> bool:
+        return (
+            time.time() - self.created > _ttl()
+            or self.path_hash != _path_hash()
+            or set(self.toolchains) != {str(c) for c in Compilers}
+        )
+
+    def rescan(self) -> None:
+        """Detect the distro and every known compiler, in parallel."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        log.debug("Rebuilding the toolchain inventory.")
+        with ThreadPoolExecutor() as pool:
+            found = list(pool.map(detect_toolchain, Compilers))
+        self.toolchains = {tc.compiler: tc for tc in found}
+        self.distro_id, self.distro_version = _detect_distro()
+        self.path_hash = _path_hash()
+        self.created = time.time()
+        self.dirty = True
+
+    def refresh(self, compiler: Compilers) -> Toolchain:
+        """Re-probe a single compiler, e.g. after installing it."""
+        toolchain = detect_toolchain(compiler)
+        self.toolchains[str(compiler)] = toolchain
+        self.dirty = True
+        return toolchain
+
+    def validate(self) -> None:
+        """Bring the inventory up to date with the system."""
+        if self.is_expired():
+            self.rescan()
+            return
+        for name, toolchain in self.toolchains.items():
+            if toolchain.is_stale():
+                log.debug("Toolchain %s changed on disk. Re-probing it.", name)
+                self.refresh(Compilers(name))
+
+    def get(self, compiler: Compilers) -> Toolchain:
+        toolchain = self.toolchains.get(str(compiler))
+        if toolchain is None:
+            toolchain = self.refresh(compiler)
+        return toolchain
+
+
+_inventory: Optional[Inventory] = None
+
+
+def get_inventory(refresh: bool = False) -> Inventory:
+    """Get the validated toolchain inventory for this process."""
+    global _inventory
+    if _inventory is None or refresh:
+        _inventory = Inventory.load()
+        if refresh:
+            _inventory.rescan()
+        else:
+            _inventory.validate()
+    if _inventory.dirty:
+        try:
+            _inventory.save()
+        except OSError as e:
+            log.warning("Failed to save the toolchain inventory: %s", e)
+    return _inventory
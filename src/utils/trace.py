@@ -0,0 +1,242 @@
+from utils.log import get_level, LOG_FORMAT
+from typing import Any, Callable, Optional, TypeVar
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+import logging
+
+__all__ = [
+    "Span",
+    "span",
+    "traced",
+    "enable",
+    "is_enabled",
+    "report",
+]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_TREE_VALUES = ("1", "true", "yes", "on", "tree")
+"""Values of 'UTILS_TRACE' that ask for a timing tree on stderr.
+
+Any other non-empty value is the path of a Chrome trace file to write.
+"""
+
+
+class Span:
+    """A timed phase of a command.
+
+    Arguments are kept as given and only turned into strings when a report
+    is written, so spans cost little more than two clock reads.
+    """
+
+    __slots__ = ("name", "args", "parent", "start", "end", "thread")
+
+    def __init__(self, name: str, args: dict[str, Any], parent: Optional["Span"]):
+        self.name = name
+        self.args = args
+        self.parent = parent
+        self.start = 0.0
+        self.end = 0.0
+        self.thread = threading.get_ident()
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def set(self, **args: Any) -> None:
+        """Attach more arguments to the span, e.g. once a result is known."""
+        self.args.update(args)
+
+    def __enter__(self) -> "Span":
+        stack = _stack()
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end = time.perf_counter()
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _spans.append(self)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("%s took %.1f ms", self.name, self.duration * 1000)
+
+
+class _NullSpan:
+    """Stand-in returned by 'span' while tracing is off."""
+
+    __slots__ = ()
+
+    def set(self, **args: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+_local = threading.local()
+_main_stack: list[Span] = []
+_spans: list[Span] = []
+_origin = time.perf_counter()
+_enabled = False
+_output: Optional[str] = None
+_registered = False
+
+
+def _stack() -> list[Span]:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        main = threading.current_thread() is threading.main_thread()
+        stack = _local.stack = _main_stack if main else []
+    return stack
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, /, **args: Any) -> Span | _NullSpan:
+    """Time a block of code as a named phase.
+
+    Use it as a context manager. Spans nest per thread; the outermost span
+    of a worker thread is attached to the innermost open span of the main
+    thread. While tracing is disabled this returns a shared no-op object.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    stack = _stack() or _main_stack
+    return Span(name, args, stack[-1] if stack else None)
+
+
+def traced(name: Optional[str] = None) -> Callable[[F], F]:
+    """Decorator that wraps every call of a function in a span."""
+
+    def decorator(func: F) -> F:
+        label = name if name is not None else func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return func(*args, **kwargs)
+            with span(label):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def enable(output: Optional[str] = None) -> None:
+    """Start recording spans and report them when the process exits.
+
+    With no output a timing tree is printed to stderr, otherwise a Chrome
+    trace (``chrome://tracing`` or Perfetto) is written to that path.
+    """
+    global _enabled, _output, _registered
+    _enabled = True
+    _output = output
+    if not _registered:
+        atexit.register(report)
+        _registered = True
+
+
+def _format_args(args: dict[str, Any]) -> str:
+    return " ".join(
+        f"{key}={' '.join(map(str, value)) if isinstance(value, list) else value}"
+        for key, value in args.items()
+    )
+
+
+def _tree() -> str:
+    """Merge spans with the same path and render them as an indented tree."""
+    nodes: dict[tuple[str, ...], list] = {}
+    paths: dict[int, tuple[str, ...]] = {}
+
+    def path_of(s: Span) -> tuple[str, ...]:
+        cached = paths.get(id(s))
+        if cached is None:
+            parent = path_of(s.parent) if s.parent is not None else ()
+            cached = paths[id(s)] = (*parent, s.name)
+        return cached
+
+    children: dict[tuple[str, ...], list[tuple[str, ...]]] = {}
+    for s in sorted(_spans, key=lambda s: s.start):
+        path = path_of(s)
+        if path not in nodes:
+            nodes[path] = [0, 0.0, s.args]
+            children.setdefault(path[:-1], []).append(path)
+        nodes[path][0] += 1
+        nodes[path][1] += s.duration
+
+    lines: list[str] = []
+    # Spans whose parent never finished are shown at the top level.
+    roots = [
+        p for parent, kids in children.items() if parent not in nodes for p in kids
+    ]
+    pending = list(reversed(roots))
+    while pending:
+        path = pending.pop()
+        count, total, args = nodes[path]
+        label = path[-1] if len(path[-1]) <= 60 else f"{path[-1][:57]}..."
+        label = label if count == 1 else f"{label} ×{count}"
+        detail = _format_args(args) if count == 1 else ""
+        lines.append(
+            f"{total * 1000:10.1f} ms  {'  ' * (len(path) - 1)}{label}"
+            + (f"  [{detail}]" if detail else "")
+        )
+        pending.extend(reversed(children.get(path, [])))
+    return "\n".join(lines)
+
+
+def _chrome_trace() -> dict:
+    pid = os.getpid()
+    events = [
+        {
+            "name": s.name,
+            "cat": "utils",
+            "ph": "X",
+            "ts": (s.start - _origin) * 1e6,
+            "dur": s.duration * 1e6,
+            "pid": pid,
+            "tid": s.thread,
+            "args": {k: str(v) for k, v in s.args.items()},
+        }
+        for s in _spans
+    ]
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def report() -> None:
+    """Write the recorded spans as a timing tree or a Chrome trace."""
+    if not _spans:
+        return
+    if _output is None:
+        sys.stderr.write(f"{'time':>13}  phase\n{_tree()}\n")
+        return
+    import json
+
+    try:
+        with open(_output, "w") as f:
+            json.dump(_chrome_trace(), f)
+        sys.stderr.write(f"Trace written to {_output}\n")
+    except OSError as e:
+        log.warning("Failed to write trace file %s: %s", _output, e)
+
+
+_env_trace = os.environ.get("UTILS_TRACE", "")
+if _env_trace:
+    enable(None if _env_trace.lower() in _TREE_VALUES else _env_trace)
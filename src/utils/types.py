@@ -0,0 +1,54 @@
+from enum import EnumType, StrEnum
+
+__all__ = ["Meta", "StrEnumUtil", "UtilityType", "BuildProfile", "Compilers"]
+
+
+class Meta(EnumType):
+    def __repr__(cls):
+        return ", ".join(cls.ls())
+
+    def __str__(cls):
+        return ", ".join(cls.ls())
+
+    def ls(cls) -> list[str]:
+        """List all members of the enumeration."""
+        return [str(member) for member in cls.__members__.values()]
+
+
+class StrEnumUtil(StrEnum, metaclass=Meta):
+    """Base class for string enumerations with custom __repr__ and __str__ methods."""
+
+
+class UtilityType(StrEnumUtil):
+    """Enumeration for utility types."""
+
+    RUST = "rust"
+    GO = "go"
+    C = "c"
+    CPP = "cpp"
+    FORTRAN = "fortran"
+    MAKE = "make"
+    CMAKE = "cmake"
+    AUTOCONF = "autoconf"
+
+
+class BuildProfile(StrEnumUtil):
+    """Enumeration for build profiles of compiled utilities."""
+
+    DEBUG = "debug"
+    RELEASE = "release"
+    NATIVE = "native"
+    SIZE = "size"
+
+
+class Compilers(StrEnumUtil):
+    """Enumeration for compiler types."""
+
+    GCC = "gcc"
+    GPP = "g++"
+    GFORTRAN = "gfortran"
+    MAKE = "make"
+    CMAKE = "cmake"
+    RUST = "cargo"
+    GO = "go"
+    CONF = "autoconf"
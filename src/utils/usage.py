@@ -0,0 +1,251 @@
+from utils.log import get_level, LOG_FORMAT
+from utils.dir import get_builds_dir, get_cache_dir
+from utils.cache import BuildCache, parse_size
+from utils.objcache import get_compiler_cache
+from utils.lock import file_lock
+from pathlib import Path
+from dataclasses import dataclass, asdict, field
+from typing import Iterator, Optional
+from contextlib import contextmanager
+import json
+import os
+import shutil
+import stat
+import time
+import logging
+
+__all__ = [
+    "BuildRecord",
+    "BuildUsage",
+    "GcItem",
+    "disk_usage",
+    "gc_quota",
+    "gc_candidates",
+    "collect",
+]
+
+logging.basicConfig(level=get_level(), format=LOG_FORMAT)
+log = logging.getLogger(__name__)
+
+USAGE_VERSION = 1
+
+
+def disk_usage(path: Path) -> int:
+    """Bytes allocated on disk below path, counting hardlinked files once."""
+    total = 0
+    seen: set[tuple[int, int]] = set()
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except NotADirectoryError:
+            try:
+                return current.lstat().st_blocks * 512
+            except OSError:
+                return 0
+        except OSError as e:
+            log.debug("Skipping unreadable directory %s: %s", current, e)
+            continue
+        for entry in entries:
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                stack.append(Path(entry.path))
+            if st.st_nlink > 1:
+                if (st.st_dev, st.st_ino) in seen:
+                    continue
+                seen.add((st.st_dev, st.st_ino))
+            total += st.st_blocks * 512
+    return total
+
+
+def gc_quota() -> Optional[int]:
+    """The quota set with 'UTILS_GC_QUOTA', which enables gc after each build."""
+    env_size = os.environ.get("UTILS_GC_QUOTA", "")
+    if not env_size:
+        return None
+    try:
+        return parse_size(env_size)
+    except ValueError:
+        log.warning("Ignoring invalid UTILS_GC_QUOTA: %s", env_size)
+        return None
+
+
+@dataclass
+class BuildRecord:
+    """The footprint of a managed build directory."""
+
+    name: str
+    path: str
+    size: int
+    last_used: float
+    origin: Optional[str] = None
+
+
+@dataclass
+class BuildUsage:
+    """Recorded footprint and last use of every managed build directory.
+
+    Records live in ``$XDG_CACHE_HOME/utils/builds.json`` and are updated
+    after each build, so gc can pick what to evict without walking every
+    build tree. Changes are made under ``locked``, which holds an ``flock``
+    on ``builds.lock``, so builds finishing at once don't lose records.
+    """
+
+    path: Path
+    records: dict[str, BuildRecord] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, root: Optional[Path] = None) -> "BuildUsage":
+        root = root if root is not None else get_cache_dir()
+        usage = cls(path=root / "builds.json")
+        try:
+            with open(usage.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return usage
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable build usage records: %s", e)
+            return usage
+        if data.get("version") != USAGE_VERSION:
+            return usage
+        try:
+            usage.records = {
+                name: BuildRecord(**record)
+                for name, record in data.get("builds", {}).items()
+            }
+        except TypeError as e:
+            log.warning("Ignoring invalid build usage records: %s", e)
+        return usage
+
+    @classmethod
+    @contextmanager
+    def locked(cls, root: Optional[Path] = None) -> Iterator["BuildUsage"]:
+        """Load the records and hold their lock until the block ends."""
+        root = root if root is not None else get_cache_dir()
+        with file_lock(root / "builds.lock"):
+            yield cls.load(root)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": USAGE_VERSION,
+            "builds": {name: asdict(r) for name, r in sorted(self.records.items())},
+        }
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def record(
+        self, name: str, build_dir: Path, origin: Optional[Path] = None
+    ) -> BuildRecord:
+        """Measure a build directory that was just used and save its record."""
+        record = BuildRecord(
+            name=name,
+            path=str(build_dir),
+            size=disk_usage(build_dir),
+            last_used=time.time(),
+            origin=str(origin) if origin is not None else None,
+        )
+        self.records[name] = record
+        self.save()
+        return record
+
+    def forget(self, name: str) -> Optional[BuildRecord]:
+        record = self.records.pop(name, None)
+        if record is not None:
+            self.save()
+        return record
+
+    def untracked(self) -> list[BuildRecord]:
+        """Build directories that have no record, e.g. from older versions."""
+        tracked = {Path(r.path) for r in self.records.values()}
+        found = []
+        try:
+            entries = list(os.scandir(get_builds_dir()))
+        except OSError:
+            return found
+        for entry in entries:
+            path = Path(entry.path)
+            if not entry.is_dir(follow_symlinks=False) or path in tracked:
+                continue
+            found.append(
+                BuildRecord(
+                    name=entry.name,
+                    path=str(path),
+                    size=disk_usage(path),
+                    last_used=entry.stat(follow_symlinks=False).st_mtime,
+                )
+            )
+        return found
+
+
+@dataclass
+class GcItem:
+    """Something gc can evict: a build directory or a cache entry."""
+
+    kind: str
+    name: str
+    size: int
+    last_used: float
+    key: str = ""
+
+
+def gc_candidates(usage: BuildUsage) -> list[GcItem]:
+    """Everything gc may evict, least recently used first."""
+    items = [
+        GcItem("build dir", r.name, r.size, r.last_used, key=r.path)
+        for r in [*usage.records.values(), *usage.untracked()]
+    ]
+    items += [
+        GcItem("cached build", e.name, e.size, e.last_used, key=e.key)
+        for e in BuildCache().entries()
+    ]
+    items += [
+        GcItem("cached object", e.name, e.size, e.last_used, key=e.key)
+        for e in get_compiler_cache().builtin.entries()
+    ]
+    return sorted(items, key=lambda item: item.last_used)
+
+
+def collect(max_size: int, dry_run: bool = False) -> tuple[list[GcItem], int]:
+    """Evict least recently used build dirs and cache entries down to max_size.
+
+    Returns the evicted items and the total size before eviction. ccache
+    and sccache enforce their own limits and are not touched.
+    """
+    with BuildUsage.locked() as usage:
+        items = gc_candidates(usage)
+        total = sum(item.size for item in items)
+        evicted: list[GcItem] = []
+        remaining = total
+        for item in items:
+            if remaining <= max_size:
+                break
+            evicted.append(item)
+            remaining -= item.size
+        if dry_run or not evicted:
+            return evicted, total
+        from utils.buildplan import Checkpoints
+
+        builds, objects = [], []
+        for item in evicted:
+            if item.kind == "build dir":
+                log.debug("Removing build directory %s", item.key)
+                shutil.rmtree(item.key, ignore_errors=True)
+                # The checkpoints describe outputs that no longer exist.
+                Checkpoints.load(item.name).path.unlink(missing_ok=True)
+                usage.records.pop(item.name, None)
+            elif item.kind == "cached build":
+                builds.append(item.key)
+            else:
+                objects.append(item.key)
+        usage.save()
+        BuildCache().remove(builds)
+        get_compiler_cache().builtin.remove(objects)
+        return evicted, total
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Point the cache directory of every test at a fresh directory."""
+    cache = tmp_path / "cache"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache))
+    monkeypatch.delenv("UTILS_JOBS", raising=False)
+    monkeypatch.delenv("UTILS_OFFLINE", raising=False)
+    return cache / "utils"
+
+
+@pytest.fixture
+def utils_dir(tmp_path, monkeypatch):
+    """Install utilities into a fresh directory that is on the PATH."""
+    import utils.completion
+    import utils.dir
+
+    bin_dir = tmp_path / "share" / "utils" / "bin"
+    bin_dir.mkdir(parents=True)
+    monkeypatch.setattr(utils.dir, "UTILS_DIR", bin_dir)
+    monkeypatch.setattr(
+        utils.completion, "COMPLETION_CACHE", bin_dir.parent / "completions" / "utilities"
+    )
+    monkeypatch.setenv("PATH", os.pathsep.join([os.environ.get("PATH", ""), str(bin_dir)]))
+    monkeypatch.delenv("UTILS_ARTIFACT_STORE", raising=False)
+    monkeypatch.setenv("UTILS_COMPILER_CACHE", "off")
+    return bin_dir
+
+
+class FileServer(ThreadingHTTPServer):
+    """A static file server with ETags, range requests and PUT.
+
+    files maps URL paths to contents. Every request is recorded with its
+    headers, and paths in truncate are cut off halfway through once.
+    """
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.files: dict[str, bytes] = {}
+        self.requests: list[tuple[str, str, dict[str, str]]] = []
+        self.truncate: set[str] = set()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FileServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _record(self) -> None:
+        self.server.requests.append((self.command, self.path, dict(self.headers)))
+
+    def do_GET(self) -> None:
+        self._record()
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        start = 0
+        byte_range = self.headers.get("Range", "")
+        if byte_range.startswith("bytes=") and self.headers.get("If-Range", etag) == etag:
+            start = int(byte_range[len("bytes=") :].split("-")[0])
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        self.send_response(206 if start else 200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body) - start))
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.end_headers()
+        if self.path in self.server.truncate:
+            self.server.truncate.discard(self.path)
+            self.wfile.write(body[start : len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body[start:])
+
+    def do_PUT(self) -> None:
+        self._record()
+        length = int(self.headers.get("Content-Length", 0))
+        self.server.files[self.path] = self.rfile.read(length)
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+@pytest.fixture
+def http_server():
+    """A local FileServer running for the duration of a test."""
+    server = FileServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
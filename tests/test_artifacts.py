@@ -0,0 +1,124 @@
+import json
+import shutil
+from dataclasses import asdict
+
+import pytest
+
+from utils.artifacts import ArtifactMeta, HttpStore, LocalStore, open_store
+from utils.cmds import add_compiled_utility, fetch_cmd, publish_cmd
+from utils.download import DownloadError
+from utils.types import UtilityType
+
+
+@pytest.fixture
+def binary(tmp_path):
+    path = tmp_path / "tool"
+    path.write_bytes(b"\x7fELF tool binary")
+    path.chmod(0o755)
+    return path
+
+
+@pytest.fixture
+def meta(binary):
+    return ArtifactMeta.for_binary("tool", binary, "0" * 64, "c", "debian-12")
+
+
+def test_local_store_round_trip(tmp_path, binary, meta):
+    store = open_store(f"file://{tmp_path / 'store'}")
+    assert isinstance(store, LocalStore)
+    assert store.get_meta("tool", meta.key) is None
+    store.publish(binary, meta)
+    assert store.get_meta("tool", meta.key) == meta
+    fetched = store.fetch(meta)
+    assert fetched.name == "tool"
+    assert fetched.read_bytes() == binary.read_bytes()
+
+
+def test_local_store_rejects_a_corrupt_binary(tmp_path, binary, meta):
+    store = LocalStore(root=tmp_path / "store")
+    store.publish(binary, meta)
+    (tmp_path / "store" / "tool" / meta.key / "tool").write_bytes(b"tampered")
+    with pytest.raises(DownloadError, match="Checksum mismatch"):
+        store.fetch(meta)
+
+
+def test_http_store_hit(http_server, binary, meta):
+    prefix = f"/tool/{meta.key}"
+    http_server.files[f"{prefix}/tool"] = binary.read_bytes()
+    http_server.files[f"{prefix}/meta.json"] = json.dumps(asdict(meta)).encode()
+    store = open_store(f"{http_server.url}/")
+    assert isinstance(store, HttpStore)
+    found = store.get_meta("tool", meta.key)
+    assert found == meta
+    fetched = store.fetch(found)
+    assert fetched.name == "tool"
+    assert fetched.read_bytes() == binary.read_bytes()
+
+
+def test_http_store_miss(http_server, meta):
+    store = HttpStore(url=http_server.url)
+    assert store.get_meta("tool", meta.key) is None
+    assert http_server.requests[-1][1] == f"/tool/{meta.key}/meta.json"
+
+
+def test_http_store_missing_binary_is_an_error(http_server, meta):
+    http_server.files[f"/tool/{meta.key}/meta.json"] = json.dumps(asdict(meta)).encode()
+    store = HttpStore(url=http_server.url)
+    found = store.get_meta("tool", meta.key)
+    with pytest.raises(DownloadError, match="HTTP 404"):
+        store.fetch(found)
+
+
+def test_http_store_publish_then_fetch(http_server, binary, meta, monkeypatch):
+    monkeypatch.setenv("UTILS_ARTIFACT_TOKEN", "secret")
+    store = HttpStore(url=http_server.url)
+    store.publish(binary, meta)
+    assert [method for method, _, _ in http_server.requests] == ["PUT", "PUT"]
+    assert http_server.requests[0][2]["Authorization"] == "Bearer secret"
+    assert store.fetch(store.get_meta("tool", meta.key)).read_bytes() == binary.read_bytes()
+
+
+PROJECTS = {
+    UtilityType.MAKE: {
+        "Makefile": "tool: tool.o\n\t$(CC) -o $@ tool.o\n",
+        "tool.c": "int main(void) { return 0; }\n",
+    },
+    UtilityType.RUST: {
+        "Cargo.toml": '[package]\nname = "tool"\nversion = "0.1.0"\nedition = "2021"\n',
+        "src/main.rs": "fn main() {}\n",
+    },
+}
+
+
+@pytest.mark.parametrize("util_type", list(PROJECTS), ids=str)
+def test_publish_after_add_and_fetch_from_clean_sources(tmp_path, utils_dir, util_type):
+    tools = {UtilityType.MAKE: ("make", "cc"), UtilityType.RUST: ("cargo",)}[util_type]
+    if any(shutil.which(tool) is None for tool in tools):
+        pytest.skip(f"needs {' and '.join(tools)}")
+    for copy in ("work", "clean"):
+        for name, text in PROJECTS[util_type].items():
+            path = tmp_path / copy / "tool" / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text)
+    store = tmp_path / "store"
+    add_compiled_utility(tmp_path / "work" / "tool", util_type, fetch=False)
+    publish_cmd(["tool"], store_location=str(store))
+    (utils_dir / "tool").unlink()
+    fetch_cmd([tmp_path / "clean" / "tool"], util_type, store_location=str(store))
+    assert (utils_dir / "tool").is_file()
+
+
+def test_incomplete_store_fails_on_creation():
+    from utils.artifacts import ArtifactStore
+
+    class ReadOnlyStore(ArtifactStore):
+        location = "nowhere"
+
+        def get_meta(self, name, key):
+            return None
+
+        def fetch(self, meta):
+            raise NotImplementedError
+
+    with pytest.raises(TypeError, match="publish"):
+        ReadOnlyStore()
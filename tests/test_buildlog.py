@@ -0,0 +1,35 @@
+from rich.console import Console
+
+from utils.buildlog import BuildLog, LiveTail
+
+
+def test_live_tail_renders_the_last_lines():
+    tail = LiveTail("Running: make", lines=3)
+    for i in range(10):
+        tail.write(f"line {i}\n")
+    tail.write("\n")
+    console = Console(width=80, record=True, force_terminal=False)
+    console.print(tail)
+    rendered = console.export_text().splitlines()
+    assert "Running: make" in rendered[0]
+    assert [line.strip() for line in rendered[1:]] == ["line 7", "line 8", "line 9"]
+
+
+def test_build_log_keeps_every_line_on_disk(tmp_path):
+    with BuildLog("tool", root=tmp_path, tail=2) as build_log:
+        build_log.section("make")
+        for i in range(5):
+            build_log.write(f"line {i}\n")
+    assert list(build_log.tail) == ["line 3", "line 4"]
+    assert build_log.path.read_text().splitlines() == [
+        "==> make",
+        *(f"line {i}" for i in range(5)),
+    ]
+
+
+def test_each_build_starts_a_new_log(tmp_path):
+    for build in range(2):
+        with BuildLog("tool", root=tmp_path) as build_log:
+            build_log.write(f"build {build}\n")
+    assert (tmp_path / "tool.log").read_text() == "build 1\n"
+    assert (tmp_path / "tool.log.1").read_text() == "build 0\n"
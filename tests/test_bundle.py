@@ -0,0 +1,74 @@
+import io
+
+import click
+import pytest
+
+from utils.bundle import export_bundle, import_bundle
+from utils.cmds import publish_cmd, rebuild_utilities
+from utils.manifest import Manifest, reindex
+
+
+def _make_utils_dir(root):
+    root.mkdir()
+    tool = root / "tool"
+    tool.write_bytes(b"#!/bin/sh\necho tool\n")
+    tool.chmod(0o755)
+    manifest, _ = reindex(root)
+    entry = manifest.entries["tool"]
+    entry.origin = "/home/someone/src/tool"
+    entry.type = "c"
+    entry.build_dir = "/home/someone/.local/share/utils/builds/tool"
+    entry.pgo = "tool < input.txt"
+    manifest.save()
+    return root
+
+
+def _round_trip(source, target, fmt="xz"):
+    buffer = io.BytesIO()
+    export_bundle(source, buffer, fmt)
+    buffer.seek(0)
+    target.mkdir(exist_ok=True)
+    return import_bundle(io.BufferedReader(buffer), target)
+
+
+def test_import_drops_host_paths(tmp_path):
+    source = _make_utils_dir(tmp_path / "a")
+    result = _round_trip(source, tmp_path / "b")
+    assert result.added == ["tool"]
+    entry = Manifest.load(tmp_path / "b").entries["tool"]
+    assert entry.type == "c"
+    assert entry.origin is None
+    assert entry.build_dir is None
+    assert entry.pgo is None
+    assert (tmp_path / "b" / "tool").read_bytes() == (source / "tool").read_bytes()
+    assert (tmp_path / "b" / "tool").stat().st_mode & 0o777 == 0o755
+
+
+def test_import_again_is_unchanged(tmp_path):
+    source = _make_utils_dir(tmp_path / "a")
+    _round_trip(source, tmp_path / "b")
+    result = _round_trip(source, tmp_path / "b")
+    assert result.unchanged == ["tool"]
+    assert not result.added and not result.updated
+
+
+@pytest.mark.parametrize(
+    "command, message",
+    [
+        (lambda: rebuild_utilities([], all_=True), "No compiled utilities to rebuild."),
+        (
+            lambda: publish_cmd([], all_=True, store_location="/nonexistent"),
+            "No compiled utilities to publish.",
+        ),
+    ],
+    ids=["rebuild", "publish"],
+)
+def test_all_skips_imported_utilities(tmp_path, monkeypatch, command, message):
+    import utils.cmds
+
+    source = _make_utils_dir(tmp_path / "a")
+    _round_trip(source, tmp_path / "b")
+    monkeypatch.setattr(utils.cmds, "get_utils_dir", lambda: tmp_path / "b")
+    with pytest.raises(click.ClickException) as excinfo:
+        command()
+    assert message in excinfo.value.format_message()
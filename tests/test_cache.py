@@ -0,0 +1,109 @@
+import shutil
+import threading
+
+import pytest
+
+from utils.cache import BuildCache, hash_source_tree, record_generated, source_digests
+from utils.cmds import add_compiled_utility
+from utils.dir import get_builds_dir
+from utils.types import UtilityType
+
+
+def test_nested_build_dirs_are_sources(tmp_path):
+    (tmp_path / "src" / "build").mkdir(parents=True)
+    source = tmp_path / "src" / "build" / "gen.c"
+    source.write_text("int x;\n")
+    before = hash_source_tree(tmp_path)
+    source.write_text("int y;\n")
+    assert hash_source_tree(tmp_path) != before
+
+
+def test_top_level_vcs_metadata_is_skipped(tmp_path):
+    (tmp_path / "main.c").write_text("int main(void) { return 0; }\n")
+    (tmp_path / ".git").mkdir()
+    before = hash_source_tree(tmp_path)
+    (tmp_path / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    assert hash_source_tree(tmp_path) == before
+
+
+def test_managed_build_dir_is_skipped(tmp_path, monkeypatch):
+    import utils.cache
+
+    builds = tmp_path / "builds"
+    monkeypatch.setattr(utils.cache, "get_builds_dir", lambda: builds)
+    (tmp_path / "main.c").write_text("int main(void) { return 0; }\n")
+    before = hash_source_tree(tmp_path)
+    (builds / "main").mkdir(parents=True)
+    (builds / "main" / "main.o").write_bytes(b"\0")
+    assert hash_source_tree(tmp_path) == before
+    assert get_builds_dir() != builds
+
+
+def test_concurrent_puts_keep_every_entry(tmp_path):
+    cache = BuildCache(root=tmp_path / "cache", max_size=1024**3)
+    artifacts = []
+    for i in range(16):
+        artifact = tmp_path / f"tool{i}"
+        artifact.write_bytes(b"x" * (i + 1))
+        artifacts.append(artifact)
+    threads = [
+        threading.Thread(target=cache.put, args=(f"{i:064x}", artifact))
+        for i, artifact in enumerate(artifacts)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache.entries()) == len(artifacts)
+    for i, artifact in enumerate(artifacts):
+        cached = cache.get(f"{i:064x}")
+        assert cached is not None
+        assert cached.read_bytes() == artifact.read_bytes()
+
+
+def test_eviction_keeps_the_most_recently_used(tmp_path):
+    cache = BuildCache(root=tmp_path / "cache", max_size=10)
+    for i in range(3):
+        artifact = tmp_path / f"tool{i}"
+        artifact.write_bytes(b"x" * 6)
+        cache.put(f"{i:064x}", artifact)
+    assert [e.name for e in cache.entries()] == ["tool2"]
+
+
+MAKEFILE = """\
+tool: tool.o
+\t$(CC) -o $@ tool.o
+"""
+
+
+@pytest.mark.skipif(
+    shutil.which("make") is None or shutil.which("cc") is None, reason="needs make and cc"
+)
+def test_unchanged_make_project_hits_the_cache(tmp_path, utils_dir, capsys):
+    project = tmp_path / "tool"
+    project.mkdir()
+    (project / "Makefile").write_text(MAKEFILE)
+    (project / "tool.c").write_text("int main(void) { return 0; }\n")
+    before = hash_source_tree(project)
+    add_compiled_utility(project, UtilityType.MAKE, fetch=False)
+    assert (project / "tool.o").exists()
+    assert hash_source_tree(project) == before
+    capsys.readouterr()
+    add_compiled_utility(project, UtilityType.MAKE, fetch=False, update=True)
+    assert "Using the cached build" in capsys.readouterr().out
+    assert len(BuildCache().entries()) == 1
+    (project / "tool.c").write_text("int main(void) { return 1; }\n")
+    assert hash_source_tree(project) != before
+
+
+def test_edited_build_products_count_as_sources(tmp_path):
+    project = tmp_path / "tool"
+    project.mkdir()
+    (project / "main.rs").write_text("fn main() {}\n")
+    sources = source_digests(project)
+    (project / "Cargo.lock").write_text("# generated\n")
+    record_generated(project, sources)
+    generated = hash_source_tree(project)
+    assert generated == hash_source_tree(project, sources)
+    (project / "Cargo.lock").write_text("# edited\n")
+    assert hash_source_tree(project) != generated
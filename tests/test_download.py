@@ -0,0 +1,73 @@
+import hashlib
+
+import pytest
+
+from utils.download import CHUNK_SIZE, DownloadError, download
+
+BODY = bytes(range(256)) * 4096
+
+
+def test_cached_copy_is_revalidated_with_its_etag(http_server):
+    http_server.files["/tool.tar"] = BODY
+    url = f"{http_server.url}/tool.tar"
+    first = download(url)
+    second = download(url)
+    assert first == second
+    assert second.read_bytes() == BODY
+    methods = [(method, path) for method, path, _ in http_server.requests]
+    assert methods == [("GET", "/tool.tar")] * 2
+    headers = http_server.requests[1][2]
+    assert headers["If-None-Match"].startswith('"')
+
+
+def test_changed_file_is_downloaded_again(http_server):
+    http_server.files["/tool.tar"] = BODY
+    url = f"{http_server.url}/tool.tar"
+    download(url)
+    http_server.files["/tool.tar"] = BODY[::-1]
+    assert download(url).read_bytes() == BODY[::-1]
+
+
+def test_truncated_download_resumes_with_a_range_request(http_server):
+    # Only whole chunks reach the partial file, so send a few of them.
+    body = BODY * (4 * CHUNK_SIZE // len(BODY))
+    http_server.files["/tool.tar"] = body
+    http_server.truncate.add("/tool.tar")
+    url = f"{http_server.url}/tool.tar"
+    with pytest.raises(DownloadError, match="resume"):
+        download(url)
+    path = download(url, sha256=hashlib.sha256(body).hexdigest())
+    assert path.read_bytes() == body
+    headers = http_server.requests[-1][2]
+    start = int(headers["Range"].removeprefix("bytes=").rstrip("-"))
+    assert 0 < start <= len(body) // 2
+    assert "If-Range" in headers
+
+
+def test_checksum_mismatch_is_an_error(http_server):
+    http_server.files["/tool.tar"] = BODY
+    with pytest.raises(DownloadError, match="Checksum mismatch"):
+        download(f"{http_server.url}/tool.tar", sha256="0" * 64)
+
+
+def test_offline_mode_needs_a_cached_copy(http_server, monkeypatch):
+    http_server.files["/tool.tar"] = BODY
+    url = f"{http_server.url}/tool.tar"
+    monkeypatch.setenv("UTILS_OFFLINE", "1")
+    with pytest.raises(DownloadError, match="offline mode"):
+        download(url)
+    assert not http_server.requests
+    monkeypatch.delenv("UTILS_OFFLINE")
+    download(url)
+    monkeypatch.setenv("UTILS_OFFLINE", "1")
+    assert download(url).read_bytes() == BODY
+    assert len(http_server.requests) == 1
+
+
+def test_rustup_script_url_can_be_overridden(http_server, monkeypatch):
+    import utils.download
+    from utils.cmds import fetch_rustup_script
+
+    http_server.files["/rustup-init.sh"] = b"#!/bin/sh\necho rustup\n"
+    monkeypatch.setattr(utils.download, "RUSTUP_URL", f"{http_server.url}/rustup-init.sh")
+    assert fetch_rustup_script() == "#!/bin/sh\necho rustup\n"
@@ -0,0 +1,93 @@
+import os
+import shutil
+import subprocess
+import threading
+
+import pytest
+
+from utils.jobserver import Jobserver, SlotPool
+
+
+def test_single_job_steps_take_one_slot():
+    with Jobserver(jobs=4, parallel=False) as jobserver:
+        assert jobserver.slots == 1
+        assert "-j1 " in jobserver.env()["MAKEFLAGS"]
+
+
+def test_parallel_step_leaves_room_for_another_build():
+    with Jobserver(jobs=4, parallel=False) as first:
+        with Jobserver(jobs=4, parallel=True) as second:
+            assert first.slots == 1
+            assert second.slots == 3
+
+
+def test_second_build_waits_instead_of_overcommitting():
+    done = threading.Event()
+    slots = []
+
+    def other_build():
+        with Jobserver(jobs=2, parallel=True) as jobserver:
+            slots.append(jobserver.slots)
+        done.set()
+
+    with Jobserver(jobs=2, parallel=True) as first:
+        assert first.slots == 2
+        thread = threading.Thread(target=other_build)
+        thread.start()
+        assert not done.wait(0.3)
+    thread.join(timeout=5)
+    assert slots == [2]
+
+
+def test_pool_releases_slots():
+    pool = SlotPool(limit=2)
+    held = pool.acquire(2)
+    assert len(held) == 2
+    pool.release(held)
+    assert len(pool.acquire(2)) == 2
+
+
+MAKEFILE = """\
+JOBS := a b c d e f
+all: $(JOBS)
+$(JOBS):
+\t@touch $(RUNNING)/$@.$$PPID; ls $(RUNNING) | wc -l >> $(LOG); sleep 0.2; rm $(RUNNING)/$@.$$PPID
+.PHONY: all $(JOBS)
+"""
+
+
+@pytest.mark.skipif(shutil.which("make") is None, reason="needs make")
+def test_concurrent_builds_share_the_job_budget(tmp_path):
+    """Two make builds running at once never run more than --jobs jobs."""
+    limit = 3
+    running = tmp_path / "running"
+    running.mkdir()
+    log = tmp_path / "log"
+    (tmp_path / "Makefile").write_text(MAKEFILE)
+    errors = []
+
+    def build():
+        try:
+            with Jobserver(jobs=limit, parallel=True) as jobserver:
+                subprocess.run(
+                    ["make", f"RUNNING={running}", f"LOG={log}"],
+                    cwd=tmp_path,
+                    env=jobserver.env(),
+                    pass_fds=jobserver.pass_fds,
+                    stdin=subprocess.DEVNULL,
+                    capture_output=True,
+                    check=True,
+                )
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=build) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    assert not errors
+    counts = [int(line) for line in log.read_text().split()]
+    assert len(counts) == 12
+    assert max(counts) <= limit
+    assert max(counts) > 1, "make never used the extra jobserver tokens"
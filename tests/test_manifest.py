@@ -0,0 +1,24 @@
+import threading
+
+from utils.cmds import add_utility, remove_utility
+from utils.manifest import Manifest
+
+
+def _run_all(target, args):
+    threads = [threading.Thread(target=target, args=a) for a in args]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_adds_and_removes_keep_the_manifest_intact(tmp_path, utils_dir):
+    scripts = []
+    for i in range(16):
+        script = tmp_path / f"tool{i}"
+        script.write_text(f"#!/bin/sh\necho {i}\n")
+        scripts.append(script)
+    _run_all(add_utility, [(script, True, False) for script in scripts])
+    assert sorted(Manifest.load(utils_dir).entries) == sorted(s.name for s in scripts)
+    _run_all(remove_utility, [(script.name,) for script in scripts[::2]])
+    assert sorted(Manifest.load(utils_dir).entries) == sorted(s.name for s in scripts[1::2])
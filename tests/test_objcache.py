@@ -0,0 +1,43 @@
+import shutil
+
+import pytest
+
+from utils.objcache import CompilerCache
+from utils.types import UtilityType
+
+
+def test_cmake_gets_only_the_launcher_variables():
+    env = CompilerCache(ccache="/usr/bin/ccache").env(UtilityType.CMAKE)
+    assert env["CMAKE_C_COMPILER_LAUNCHER"] == "/usr/bin/ccache"
+    assert env["CMAKE_CXX_COMPILER_LAUNCHER"] == "/usr/bin/ccache"
+    assert "CC" not in env and "CXX" not in env and "FC" not in env
+
+
+@pytest.mark.parametrize("util_type", [UtilityType.MAKE, UtilityType.AUTOCONF])
+def test_make_builds_get_a_wrapped_compiler(util_type):
+    env = CompilerCache(ccache="/usr/bin/ccache").env(util_type)
+    assert env["CC"] == "/usr/bin/ccache gcc"
+    assert not any(name.startswith("CMAKE_") for name in env)
+
+
+def test_builtin_cache_only_serves_compile_steps():
+    cache = CompilerCache(mode="builtin")
+    assert cache.uses_builtin(["gcc", "-O2", "-c", "-o", "tool.o", "tool.c"])
+    assert not cache.uses_builtin(["gcc", "-O2", "-o", "tool", "tool.o"])
+    assert not cache.uses_builtin(["cargo", "build", "--release"])
+
+
+@pytest.mark.skipif(shutil.which("gcc") is None, reason="needs gcc")
+def test_builtin_cache_round_trips_objects(tmp_path):
+    (tmp_path / "tool.c").write_text("int answer(void) { return 42; }\n")
+    cache = CompilerCache(mode="builtin", root=tmp_path / "objects")
+    cmd = ["gcc", "-O2", "-c", "-o", str(tmp_path / "tool.o"), "tool.c"]
+    key = cache.key(cmd, tmp_path, "gcc 12")
+    assert key is not None
+    assert not cache.restore(key, tmp_path / "tool.o")
+    (tmp_path / "tool.o").write_bytes(b"object")
+    cache.store(key, tmp_path / "tool.o")
+    assert cache.restore(key, tmp_path / "restored.o")
+    assert (tmp_path / "restored.o").read_bytes() == b"object"
+    assert cache.stats()["builtin"]["hits"] == 1
+    assert cache.stats()["builtin"]["misses"] == 1
@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ("requests", "halo", "distro")
+
+SCRIPT = """\
+import json, sys
+from utils import utils
+try:
+    utils.main(sys.argv[1:], prog_name="utils")
+except SystemExit:
+    pass
+print(json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)), file=sys.stderr)
+"""
+
+
+@pytest.mark.parametrize("args", [["--help"], ["list"], ["ls", "-l"]])
+def test_fast_commands_skip_heavy_imports(tmp_path, args):
+    utils_dir = tmp_path / ".local" / "share" / "utils" / "bin"
+    env = {
+        **os.environ,
+        "HOME": str(tmp_path),
+        "PATH": os.pathsep.join([os.environ.get("PATH", ""), str(utils_dir)]),
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(heavy=HEAVY_MODULES), *args],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = json.loads(result.stderr.strip().splitlines()[-1])
+    assert loaded == []
@@ -0,0 +1,50 @@
+import os
+
+from utils.toolchains import detect_toolchain
+from utils.types import Compilers
+
+RUSTUP = """\
+#!/bin/sh
+if [ "$1" = which ]; then
+    cat "$(dirname "$0")/active"
+else
+    "$(cat "$(dirname "$0")/active")" "$@"
+fi
+"""
+
+
+def install_toolchain(root, name, version):
+    binary = root / "toolchains" / name / "bin" / "cargo"
+    binary.parent.mkdir(parents=True)
+    binary.write_text(f"#!/bin/sh\necho 'cargo {version}'\n")
+    binary.chmod(0o755)
+    return binary
+
+
+def test_rustup_proxy_is_stale_when_the_toolchain_behind_it_changes(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    rustup = bin_dir / "rustup"
+    rustup.write_text(RUSTUP)
+    rustup.chmod(0o755)
+    (bin_dir / "cargo").symlink_to("rustup")
+    monkeypatch.setenv("PATH", os.pathsep.join([str(bin_dir), os.environ["PATH"]]))
+
+    stable = install_toolchain(tmp_path, "stable", "1.80.0")
+    (bin_dir / "active").write_text(str(stable))
+    toolchain = detect_toolchain(Compilers.RUST)
+    assert toolchain.path == str(bin_dir / "cargo")
+    assert toolchain.binary == str(stable)
+    assert toolchain.version == "cargo 1.80.0"
+    assert not toolchain.is_stale()
+
+    # 'rustup update' replaces the toolchain but leaves the proxy alone.
+    stable.write_text("#!/bin/sh\necho 'cargo 1.81.0 (updated)'\n")
+    os.utime(stable, (1, 1))
+    assert toolchain.is_stale()
+
+    toolchain = detect_toolchain(Compilers.RUST)
+    assert toolchain.version == "cargo 1.81.0 (updated)"
+    nightly = install_toolchain(tmp_path, "nightly", "1.82.0-nightly")
+    (bin_dir / "active").write_text(str(nightly))
+    assert toolchain.is_stale()
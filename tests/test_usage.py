@@ -0,0 +1,35 @@
+import threading
+
+from utils.usage import BuildUsage
+
+
+def test_concurrent_records_are_all_kept(tmp_path):
+    build_dirs = []
+    for i in range(16):
+        build_dir = tmp_path / "builds" / f"tool{i}"
+        build_dir.mkdir(parents=True)
+        (build_dir / "tool.o").write_bytes(b"\0" * 4096)
+        build_dirs.append(build_dir)
+
+    def record(build_dir):
+        with BuildUsage.locked(tmp_path) as usage:
+            usage.record(build_dir.name, build_dir)
+
+    threads = [threading.Thread(target=record, args=(d,)) for d in build_dirs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    records = BuildUsage.load(tmp_path).records
+    assert sorted(records) == sorted(d.name for d in build_dirs)
+    assert all(r.size > 0 for r in records.values())
+
+
+def test_forget_removes_the_record(tmp_path):
+    build_dir = tmp_path / "tool"
+    build_dir.mkdir()
+    with BuildUsage.locked(tmp_path) as usage:
+        usage.record("tool", build_dir)
+    with BuildUsage.locked(tmp_path) as usage:
+        assert usage.forget("tool") is not None
+    assert BuildUsage.load(tmp_path).records == {}